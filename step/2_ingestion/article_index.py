@@ -0,0 +1,204 @@
+"""
+ARTICLE INDEX - Tra cứu trực tiếp (luật, số điều) → dòng trong index
+Query nêu rõ điều luật, ví dụ:
+    "Điều 12 Luật Thủy lợi"
+    "khoản 2 Điều 5 Luật Đê điều"
+    "dieu 3 luat khi tuong thuy van"        # không dấu
+được trả về đúng record của điều đó, không cần encode + vector search.
+
+Build 1 lần lúc ingestion, lưu article_index.json cạnh index.faiss:
+- laws    : {khóa luật: {"doc_name", "doc_ids", "articles": {số điều: dòng}}}
+- aliases : {tên đã chuẩn hóa: khóa luật} - tên luật (bỏ "Văn bản hợp nhất") và các doc_id
+
+Khóa luật lấy từ doc_name vì doc_id trong dữ liệu không thống nhất
+(cùng 1 luật có thể có "05/VBHN-VPQH" và "05/VBHN_VPQH").
+Mỗi record là 1 điều, nên "khoản N" được nhận diện nhưng vẫn trả về cả điều.
+"""
+
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ARTICLE_INDEX_FILE = "article_index.json"
+
+# Tiền tố bỏ đi khi lấy tên luật từ doc_name
+DOC_NAME_PREFIXES = ["van ban hop nhat "]
+
+# "khoản 2 Điều 5", "Điều 12" (trên query đã chuẩn hóa, không dấu)
+ARTICLE_PATTERN = re.compile(r"(?:\bkhoan\s+(\d+)\s+(?:cua\s+)?)?\bdieu\s+(\d+)\b")
+
+
+# Bảng byte: chữ hoa → chữ thường, chữ số giữ nguyên, ký tự khác → khoảng trắng
+_ASCII_FOLD = bytes(
+    ord(chr(c).lower()) if chr(c).isascii() and chr(c).isalnum() else ord(" ")
+    for c in range(256)
+)
+
+
+def fold_text(text: str) -> str:
+    """
+    Chuẩn hóa để so khớp: bỏ dấu, đ → d, chữ thường, dấu câu → khoảng trắng
+
+    Chữ tiếng Việt tách thành chữ Latin + dấu (NFD) nên bỏ dấu = bỏ ký tự ngoài ASCII.
+    Gọi ở mỗi query (domain gate, article index) nên chỉ dùng các phép toán trên cả chuỗi.
+    """
+    text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return " ".join(text.encode("ascii", "ignore").translate(_ASCII_FOLD).decode("ascii").split())
+
+
+def law_key(doc_name: str) -> str:
+    """Khóa luật từ doc_name: "Văn bản hợp nhất Luật Đê điều" → "luat de dieu" """
+    key = fold_text(doc_name)
+    for prefix in DOC_NAME_PREFIXES:
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    return key
+
+
+@dataclass(frozen=True)
+class ArticleRef:
+    """1 trích dẫn điều luật tìm thấy trong query"""
+    law: str
+    article_no: str
+    clause_no: Optional[str] = None
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def build_article_index(documents: List[Document], index_path: Path) -> Dict:
+    """
+    Build và lưu article_index.json
+
+    Args:
+        documents: Documents theo đúng thứ tự vector trong FAISS
+        index_path: Thư mục index
+
+    Returns:
+        Dict đã lưu
+    """
+    laws = {}
+    aliases = {}
+    for row, doc in enumerate(documents):
+        doc_name = doc.metadata.get("doc_name", "")
+        article_no = str(doc.metadata.get("article_no", ""))
+        if not doc_name or not article_no:
+            continue
+
+        key = law_key(doc_name)
+        law = laws.setdefault(key, {"doc_name": doc_name, "doc_ids": [], "articles": {}})
+        # Điều trùng (nếu có): giữ record đầu tiên
+        law["articles"].setdefault(article_no, row)
+
+        doc_id = str(doc.metadata.get("doc_id", ""))
+        if doc_id and doc_id not in law["doc_ids"]:
+            law["doc_ids"].append(doc_id)
+            aliases[fold_text(doc_id)] = key
+        aliases[key] = key
+
+    data = {"laws": laws, "aliases": aliases}
+    index_path = Path(index_path)
+    index_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path / f"{ARTICLE_INDEX_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, index_path / ARTICLE_INDEX_FILE)
+
+    return data
+
+
+# ============================================================================
+# PARSE + LOOKUP
+# ============================================================================
+
+class ArticleIndex:
+    """(luật, số điều) → dòng, kèm bộ nhận diện trích dẫn điều luật trong query"""
+
+    def __init__(self, data: Dict):
+        self.laws = data["laws"]
+        self.aliases = data["aliases"]
+        # Tên dài khớp trước ("luat phong chong thien tai" trước "luat ...")
+        alias_pattern = "|".join(re.escape(alias) for alias in sorted(self.aliases, key=len, reverse=True))
+        self._alias_re = re.compile(rf"\b(?:{alias_pattern})\b") if self.aliases else None
+
+    @classmethod
+    def open(cls, index_path: Path) -> Optional["ArticleIndex"]:
+        """Mở article_index.json trong thư mục index, None nếu index chưa có"""
+        path = Path(index_path) / ARTICLE_INDEX_FILE
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def parse(self, query: str) -> List[ArticleRef]:
+        """
+        Các trích dẫn điều luật trong query
+
+        Mỗi "Điều N" gắn với tên luật gần nhất phía sau ("Điều 5 và Điều 6 Luật Đê điều"),
+        không có thì phía trước ("Luật Thủy lợi, Điều 12"). Không nêu tên luật → bỏ qua
+        (số điều trùng giữa các luật).
+        """
+        if self._alias_re is None:
+            return []
+
+        folded = fold_text(query)
+        laws = [(match.start(), self.aliases[match.group(0)]) for match in self._alias_re.finditer(folded)]
+        if not laws:
+            return []
+
+        refs = []
+        for match in ARTICLE_PATTERN.finditer(folded):
+            after = [law for start, law in laws if start >= match.end()]
+            before = [law for start, law in laws if start < match.start()]
+            law = after[0] if after else (before[-1] if before else None)
+            if law is None:
+                continue
+            ref = ArticleRef(law=law, article_no=match.group(2), clause_no=match.group(1))
+            if ref not in refs:
+                refs.append(ref)
+        return refs
+
+    def rows_for(self, refs: List[ArticleRef]) -> List[int]:
+        """Dòng của các điều được trích dẫn (bỏ qua điều không tồn tại), theo thứ tự trong query"""
+        rows = []
+        for ref in refs:
+            row = self.laws.get(ref.law, {}).get("articles", {}).get(ref.article_no)
+            if row is not None and row not in rows:
+                rows.append(row)
+        return rows
+
+    def lookup(self, query: str) -> List[int]:
+        """Dòng của các điều được trích dẫn trong query ([] nếu query không nêu điều luật)"""
+        return self.rows_for(self.parse(query))
+
+
+# ============================================================================
+# BUILD CHO INDEX ĐÃ CÓ
+# ============================================================================
+
+if __name__ == "__main__":
+    import sys
+
+    from doc_store import ColumnarDocStore
+
+    # Build article_index.json cho index đã lưu mà không cần chạy lại ingestion
+    index_path = Path(sys.argv[1]) if len(sys.argv) > 1 else (
+        Path(__file__).parent / "output" / "law_documents_index"
+    )
+    store = ColumnarDocStore.open(index_path)
+    data = build_article_index(list(store.iter_documents()), index_path)
+    for key, law in data["laws"].items():
+        print(f"   {law['doc_name']}: {len(law['articles'])} điều")
+    print(f"✅ Đã build article index → {index_path / ARTICLE_INDEX_FILE}")
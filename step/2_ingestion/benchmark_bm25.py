@@ -0,0 +1,123 @@
+"""
+BENCHMARK - BM25: rank_bm25 (BM25Retriever) vs ma trận CSR
+So sánh latency mỗi query của:
+- rank_bm25.BM25Okapi.get_scores + argsort (cách BM25Retriever chấm điểm)
+- BM25Index, từng query 1 (Q @ W với Q 1 dòng)
+- BM25Index, batch query (1 phép nhân ma trận cho cả batch)
+
+Corpus giả lập bằng cách nhân bản các điều luật hiện có tới đủ số documents.
+
+Chạy:
+    python benchmark_bm25.py
+    python benchmark_bm25.py --sizes 250 25000 250000 --batch-size 64
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from bm25_index import BM25Index, tokenize
+from doc_store import ColumnarDocStore
+
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_INDEX_PATH = SCRIPT_DIR / "output" / "law_documents_index"
+
+QUERIES = [
+    "Quy định về bảo vệ đê điều",
+    "Trách nhiệm của Ủy ban nhân dân",
+    "Xử lý vi phạm pháp luật",
+    "Dự báo thiên tai và cảnh báo",
+    "Quản lý tài nguyên nước",
+    "Điều kiện cấp giấy phép khai thác nước",
+    "Quyền và nghĩa vụ của tổ chức, cá nhân",
+    "Hành vi bị nghiêm cấm trong phòng chống thiên tai",
+]
+
+
+def load_texts(index_path: Path) -> List[str]:
+    store = ColumnarDocStore.open(index_path)
+    return [store.get_field(row, "page_content") for row in range(len(store))]
+
+
+def time_per_query(func, queries: List[str]) -> float:
+    """Median ms / query"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run_size(texts: List[str], n_docs: int, queries: List[str], k: int, baseline: bool) -> dict:
+    corpus = [texts[i % len(texts)] for i in range(n_docs)]
+    result = {"n_docs": n_docs}
+
+    start = time.perf_counter()
+    index = BM25Index.from_texts(corpus)
+    index.matrix
+    result["build_s"] = time.perf_counter() - start
+
+    result["csr_ms"] = time_per_query(lambda query: index.top_k(query, k), queries)
+
+    start = time.perf_counter()
+    index.top_k_batch(queries, k)
+    result["batch_ms"] = (time.perf_counter() - start) * 1000 / len(queries)
+
+    if baseline:
+        okapi = BM25Okapi([tokenize(text) for text in corpus])
+        result["rank_bm25_ms"] = time_per_query(
+            lambda query: np.argsort(okapi.get_scores(tokenize(query)))[::-1][:k], queries
+        )
+
+        # Kiểm tra điểm số trùng với rank_bm25
+        diff = max(
+            float(np.abs(index.get_scores(query) - okapi.get_scores(tokenize(query))).max())
+            for query in queries[:4]
+        )
+        result["max_score_diff"] = diff
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25: rank_bm25 vs CSR")
+    parser.add_argument("--index-path", default=str(DEFAULT_INDEX_PATH))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 25000, 250000])
+    parser.add_argument("--batch-size", type=int, default=64, help="Số query trong batch")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--baseline-max", type=int, default=25000,
+                        help="Bỏ qua rank_bm25 với corpus lớn hơn (tốn RAM)")
+    args = parser.parse_args()
+
+    texts = load_texts(Path(args.index_path))
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.batch_size)]
+
+    rows = []
+    for n_docs in args.sizes:
+        print(f"⏱️  Đang đo {n_docs} documents...")
+        rows.append(run_size(texts, n_docs, queries, args.k, n_docs <= args.baseline_max))
+
+    print(f"\n{'Docs':<10} {'Build (s)':<10} {'rank_bm25':<12} {'CSR':<10} {'CSR batch':<10} {'Speedup':<8}")
+    print("-" * 64)
+    for row in rows:
+        baseline = row.get("rank_bm25_ms")
+        baseline_text = f"{baseline:.3f}" if baseline else "-"
+        speedup_text = f"{baseline / row['batch_ms']:.1f}x" if baseline else "-"
+        print(f"{row['n_docs']:<10} {row['build_s']:<10.2f} {baseline_text:<12} "
+              f"{row['csr_ms']:<10.3f} {row['batch_ms']:<10.3f} {speedup_text:<8}")
+
+    diffs = [row["max_score_diff"] for row in rows if "max_score_diff" in row]
+    if diffs:
+        print(f"\n🎯 Sai khác điểm tối đa so với rank_bm25: {max(diffs):.2e}")
+    print(f"(ms / query, median; batch = {args.batch_size} queries / lần, k = {args.k})")
+
+
+if __name__ == "__main__":
+    main()
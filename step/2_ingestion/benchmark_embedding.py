@@ -0,0 +1,116 @@
+"""
+BENCHMARK - Length bucketing cho embedding stage
+So sánh batch cố định (thứ tự file) với batch động theo token budget
+trên corpus hiện tại và corpus nhân bản (mặc định 1× và 100×)
+
+Chạy:
+    python benchmark_embedding.py
+    python benchmark_embedding.py --replicate 1 100 --workers 4 --token-budget 4096
+"""
+
+import argparse
+import json
+import time
+from typing import List
+
+from ingestion_pipeline import (
+    INPUT_DIR,
+    INPUT_FILES,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_DEVICE,
+    EMBEDDING_BATCH_SIZE
+)
+from parallel_embedding import (
+    SHARDS_PER_WORKER,
+    ShardedEmbeddingEngine,
+    build_length_buckets,
+    count_tokens,
+    fixed_batches,
+    load_tokenizer,
+    padding_efficiency
+)
+
+
+# Token budget của batch động khi benchmark (ingestion mặc định tắt bucketing)
+BENCHMARK_TOKEN_BUDGET = 4096
+
+
+def load_corpus() -> List[str]:
+    """Đọc content_for_embedding của tất cả INPUT_FILES"""
+    texts = []
+    for filename in INPUT_FILES:
+        file_path = INPUT_DIR / filename
+        if file_path.exists():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                texts.extend(record["content_for_embedding"] for record in json.load(f))
+    return texts
+
+
+def run_benchmark(texts: List[str], workers: int, batch_size: int, token_budget: int) -> dict:
+    """Đo throughput batch cố định vs batch động trên cùng 1 corpus"""
+    lengths = count_tokens(texts, load_tokenizer(EMBEDDING_MODEL_NAME))
+    buckets = build_length_buckets(lengths, token_budget)
+
+    print(f"\n📐 Padding efficiency (token thật / token sau padding):")
+    print(f"   Batch cố định ({batch_size}, thứ tự file): "
+          f"{padding_efficiency(lengths, fixed_batches(len(texts), batch_size)):.1%}")
+    print(f"   Batch động (budget {token_budget}): "
+          f"{padding_efficiency(lengths, buckets):.1%} ({len(buckets)} batches)")
+
+    results = {}
+    for name, budget in [("fixed", None), ("bucketed", token_budget)]:
+        with ShardedEmbeddingEngine(
+            model_name=EMBEDDING_MODEL_NAME,
+            device=EMBEDDING_DEVICE,
+            normalize=True,
+            num_workers=workers,
+            batch_size=batch_size,
+            token_budget=budget
+        ) as engine:
+            # Warm-up: load model (trong process hiện tại hoặc mọi worker của pool)
+            # trước để không tính vào thời gian đo
+            if workers == 1:
+                engine.embed_query("warm up")
+            else:
+                engine.embed_array(texts[:workers * SHARDS_PER_WORKER])
+
+            print(f"\n⏱️  {name}:")
+            start = time.perf_counter()
+            engine.embed_array(texts)
+            results[name] = len(texts) / (time.perf_counter() - start)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark length bucketing cho embedding")
+    parser.add_argument("--replicate", type=int, nargs="+", default=[1, 100],
+                        help="Hệ số nhân bản corpus")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--token-budget", type=int, default=BENCHMARK_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    summary = []
+
+    for factor in args.replicate:
+        texts = corpus * factor
+        print("\n" + "=" * 80)
+        print(f"📊 CORPUS ×{factor}: {len(texts)} documents")
+        print("=" * 80)
+
+        results = run_benchmark(texts, args.workers, args.batch_size, args.token_budget)
+        summary.append((factor, len(texts), results["fixed"], results["bucketed"]))
+
+    print("\n" + "=" * 80)
+    print("📈 KẾT QUẢ (docs/sec)")
+    print("=" * 80)
+    print(f"{'Corpus':<10} {'Docs':<10} {'Fixed':<12} {'Bucketed':<12} {'Speedup':<8}")
+    print("-" * 56)
+    for factor, n_docs, fixed, bucketed in summary:
+        print(f"×{factor:<9} {n_docs:<10} {fixed:<12.1f} {bucketed:<12.1f} {bucketed / fixed:<8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+BENCHMARK - Thời gian khởi động khi load FAISS index
+So sánh đọc toàn bộ index.faiss vào RAM (cách cũ) với memory-map
+Mỗi lần đo chạy trong 1 process mới để đo đúng cold start của process
+
+Chạy:
+    python benchmark_index_load.py                       # index đã lưu
+    python benchmark_index_load.py --synthetic 100000 1000000   # index giả lập
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from doc_store import read_faiss_index
+
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_INDEX_PATH = SCRIPT_DIR / "output" / "law_documents_index" / "index.faiss"
+REPEATS = 5
+
+
+def private_rss_mb() -> float:
+    """
+    Bộ nhớ riêng của process (MB) = RSS - trang dùng chung (file-backed, page cache)
+
+    Trang mmap của index.faiss được tính là dùng chung nên không nằm trong số này.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            fields = f.read().split()
+        return (int(fields[1]) - int(fields[2])) * 4096 / 1e6
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(mode: str, index_file: str):
+    """Chạy trong process con: load index 1 lần, in JSON kết quả"""
+    rss_before = private_rss_mb()
+    start = time.perf_counter()
+    index = read_faiss_index(Path(index_file), use_mmap=(mode == "mmap"))
+    elapsed = time.perf_counter() - start
+    # 1 query để chắc chắn index dùng được (và chạm tới toàn bộ vectors)
+    index.search(np.zeros((1, index.d), dtype=np.float32), 1)
+    print(json.dumps({"seconds": elapsed, "rss_mb": private_rss_mb() - rss_before}))
+
+
+def measure(mode: str, index_file: Path) -> dict:
+    """Median thời gian load và RSS tăng thêm qua REPEATS process"""
+    runs = []
+    for _ in range(REPEATS):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, str(index_file)],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "ms": statistics.median(run["seconds"] for run in runs) * 1000,
+        "rss_mb": statistics.median(run["rss_mb"] for run in runs),
+    }
+
+
+def build_synthetic_index(n_vectors: int, dim: int, directory: Path) -> Path:
+    """Tạo flat index với vector ngẫu nhiên để đo theo kích thước"""
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    for start in range(0, n_vectors, 100_000):
+        count = min(100_000, n_vectors - start)
+        index.add(rng.standard_normal((count, dim), dtype=np.float32))
+    path = directory / f"synthetic_{n_vectors}.faiss"
+    faiss.write_index(index, str(path))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark load FAISS index: đọc toàn bộ vs mmap")
+    parser.add_argument("--index-file", default=str(DEFAULT_INDEX_PATH))
+    parser.add_argument("--synthetic", type=int, nargs="*", default=[],
+                        help="Số vectors cho các index giả lập (dim 384)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "INDEX_FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    targets = [("saved index", Path(args.index_file))]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_vectors in args.synthetic:
+            print(f"🔧 Đang tạo index giả lập {n_vectors} vectors...")
+            targets.append((f"synthetic {n_vectors}", build_synthetic_index(n_vectors, 384, Path(tmp_dir))))
+
+        print(f"\n{'Index':<20} {'Size (MB)':<10} {'Full (ms)':<10} {'Full MB':<10} "
+              f"{'Mmap (ms)':<10} {'Mmap MB':<10}")
+        print("-" * 72)
+        for name, index_file in targets:
+            full = measure("full", index_file)
+            mapped = measure("mmap", index_file)
+            size_mb = index_file.stat().st_size / 1e6
+            print(f"{name:<20} {size_mb:<10.1f} {full['ms']:<10.2f} {full['rss_mb']:<10.1f} "
+                  f"{mapped['ms']:<10.2f} {mapped['rss_mb']:<10.1f}")
+
+    print("\n(ms = thời gian load; MB = bộ nhớ riêng tăng thêm sau load + 1 query, "
+          f"không tính page cache dùng chung; median của {REPEATS} lần chạy, mỗi lần 1 process mới)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+BM25 INDEX - Inverted index BM25 lưu sẵn trên đĩa, memory-mapped khi load
+Thay cho việc dựng lại BM25Retriever.from_documents (tokenize lại toàn bộ
+corpus) mỗi lần khởi động process
+
+Build 1 lần lúc ingestion, lưu trong thư mục bm25/ cạnh index.faiss:
+- bm25.json            : n_docs, avgdl, k1, b, epsilon, vocab_size
+- vocab.bin            : các term (UTF-8, đã sắp xếp) nối liên tiếp
+- vocab_offsets.npy    : int64 (vocab_size + 1) - offset của từng term
+- term_ptr.npy         : int64 (vocab_size + 1) - postings của term t nằm ở [term_ptr[t], term_ptr[t+1])
+- post_docs.npy        : int32 - dòng của document (khớp dòng doc store / vector FAISS)
+- post_tfs.npy         : int32 - term frequency
+- post_weights.npy     : float32 - trọng số BM25 của (term, document) = idf * tf-saturation
+- doc_len.npy          : int32 - số token của từng document
+- idf.npy              : float32 - IDF của từng term
+
+term_ptr / post_docs / post_weights chính là ma trận CSR term × document W.
+Điểm của 1 batch query = Q @ W, với Q là ma trận (query × term) đếm số lần
+term xuất hiện trong query → chấm điểm nhiều query cùng lúc bằng phép nhân
+ma trận thưa, top-k bằng argpartition.
+
+Công thức giống rank_bm25.BM25Okapi (BM25Retriever mặc định): tokenize bằng
+text.split(), IDF có sàn epsilon * average_idf cho term xuất hiện trong hơn
+nửa số documents.
+"""
+
+import json
+import mmap
+import os
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+from pydantic import ConfigDict
+from scipy import sparse
+
+from doc_store import ColumnarDocStore
+from metadata_index import MetadataFilter, MetadataIndex
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BM25_DIR = "bm25"
+BM25_META = "bm25.json"
+
+FORMAT_VERSION = 2
+
+# Tham số mặc định của rank_bm25.BM25Okapi
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+ARRAY_FILES = ["vocab_offsets", "term_ptr", "post_docs", "post_tfs", "post_weights", "doc_len", "idf"]
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenizer giống BM25Retriever mặc định (default_preprocessing_func)"""
+    return text.split()
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Ghi file tạm rồi rename: process đang mmap bản cũ vẫn đọc được"""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _save_array(path: Path, values: np.ndarray):
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def compute_bm25_arrays(
+    texts: List[str],
+    k1: float = BM25_K1,
+    b: float = BM25_B,
+    epsilon: float = BM25_EPSILON
+):
+    """
+    Tokenize corpus 1 lần và tính các mảng của inverted index
+
+    Returns:
+        (meta, arrays, vocab_blob)
+    """
+    # Postings gom vào array('i') (4 byte / phần tử) để build được corpus lớn
+    term_index = {}
+    post_terms, post_rows, post_counts = array('i'), array('i'), array('i')
+    doc_len = np.zeros(len(texts), dtype=np.int32)
+
+    for row, text in enumerate(texts):
+        freqs = Counter(tokenize(text))
+        doc_len[row] = sum(freqs.values())
+        for term, tf in freqs.items():
+            post_terms.append(term_index.setdefault(term, len(term_index)))
+            post_rows.append(row)
+            post_counts.append(tf)
+
+    # Sắp xếp vocab để tra cứu term bằng binary search
+    vocab = sorted(term_index)
+    rank = np.empty(len(vocab), dtype=np.int32)
+    rank[[term_index[term] for term in vocab]] = np.arange(len(vocab), dtype=np.int32)
+
+    term_ids = rank[np.frombuffer(post_terms, dtype=np.int32)]
+    # Stable sort: trong mỗi term, documents vẫn theo thứ tự dòng
+    order = np.argsort(term_ids, kind="stable")
+    post_docs = np.frombuffer(post_rows, dtype=np.int32)[order]
+    post_tfs = np.frombuffer(post_counts, dtype=np.int32)[order]
+
+    df = np.bincount(term_ids, minlength=len(vocab))
+    term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(df, out=term_ptr[1:])
+
+    # IDF như BM25Okapi: log(N - df + 0.5) - log(df + 0.5), IDF âm → epsilon * average_idf
+    n_docs = len(texts)
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    if len(idf):
+        idf[idf < 0] = epsilon * idf.mean()
+
+    # Trọng số BM25 của từng posting (không phụ thuộc query → tính sẵn)
+    avgdl = float(doc_len.mean()) if n_docs else 0.0
+    tf = post_tfs.astype(np.float64)
+    norm = k1 * (1 - b + b * doc_len[post_docs] / avgdl) if n_docs else tf
+    post_weights = np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm)
+
+    encoded_terms = [term.encode("utf-8") for term in vocab]
+    vocab_offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum([len(data) for data in encoded_terms], out=vocab_offsets[1:])
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "n_docs": n_docs,
+        "avgdl": avgdl,
+        "k1": k1,
+        "b": b,
+        "epsilon": epsilon,
+        "vocab_size": len(vocab),
+        "n_postings": int(term_ptr[-1]),
+    }
+    arrays = {
+        "vocab_offsets": vocab_offsets,
+        "term_ptr": term_ptr,
+        "post_docs": post_docs,
+        "post_tfs": post_tfs,
+        "post_weights": post_weights.astype(np.float32),
+        "doc_len": doc_len,
+        "idf": idf.astype(np.float32),
+    }
+    return meta, arrays, b"".join(encoded_terms)
+
+
+def build_bm25_index(
+    documents: List[Document],
+    index_path: Path,
+    k1: float = BM25_K1,
+    b: float = BM25_B,
+    epsilon: float = BM25_EPSILON
+) -> Dict:
+    """
+    Build và lưu inverted index vào index_path/bm25/
+
+    Args:
+        documents: Documents theo đúng thứ tự vector trong FAISS
+        index_path: Thư mục index (bm25/ được tạo bên trong)
+
+    Returns:
+        Dict meta đã lưu
+    """
+    bm25_path = Path(index_path) / BM25_DIR
+    bm25_path.mkdir(parents=True, exist_ok=True)
+
+    meta, arrays, vocab_blob = compute_bm25_arrays(
+        [doc.page_content for doc in documents], k1=k1, b=b, epsilon=epsilon
+    )
+
+    _write_atomic(bm25_path / "vocab.bin", vocab_blob)
+    for name in ARRAY_FILES:
+        _save_array(bm25_path / f"{name}.npy", arrays[name])
+    # bm25.json ghi sau cùng: có file này nghĩa là bộ mảng đã đầy đủ
+    _write_atomic(
+        bm25_path / BM25_META,
+        json.dumps(meta, indent=2, ensure_ascii=False).encode("utf-8")
+    )
+
+    return meta
+
+
+# ============================================================================
+# LOAD + SCORE
+# ============================================================================
+
+class BM25Index:
+    """
+    BM25 engine trên ma trận CSR term × document (chỉ đọc)
+
+    Tạo bằng BM25Index.open() (memory-map bm25/ đã lưu) hoặc
+    BM25Index.from_texts() (build trong RAM).
+    """
+
+    def __init__(self, meta: Dict, arrays: Dict[str, np.ndarray], vocab_blob):
+        self.meta = meta
+        self.n_docs = meta["n_docs"]
+        self.vocab_size = meta["vocab_size"]
+
+        self.vocab_offsets = arrays["vocab_offsets"]
+        self.term_ptr = arrays["term_ptr"]
+        self.post_docs = arrays["post_docs"]
+        self.post_weights = arrays["post_weights"]
+        self.doc_len = arrays["doc_len"]
+        self.idf = arrays["idf"]
+        self._vocab = vocab_blob
+
+        # Ma trận chỉ được dựng ở query đầu tiên (load không tốn thời gian)
+        self._matrix = None
+
+    @classmethod
+    def open(cls, index_path: Path) -> Optional["BM25Index"]:
+        """Memory-map bm25/ trong thư mục index, None nếu index chưa có BM25 (format hiện tại)"""
+        bm25_path = Path(index_path) / BM25_DIR
+        if not (bm25_path / BM25_META).exists():
+            return None
+
+        with open(bm25_path / BM25_META, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            return None
+
+        arrays = {
+            name: np.load(bm25_path / f"{name}.npy", mmap_mode='r')
+            for name in ARRAY_FILES
+        }
+
+        with open(bm25_path / "vocab.bin", 'rb') as f:
+            # mmap không hỗ trợ file rỗng
+            if f.seek(0, 2) == 0:
+                vocab_blob = b""
+            else:
+                vocab_blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(meta, arrays, vocab_blob)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], **params) -> "BM25Index":
+        """Build trong RAM (không lưu ra đĩa)"""
+        return cls(*compute_bm25_arrays(texts, **params))
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        """Ma trận CSR W (vocab_size × n_docs), W[t, d] = trọng số BM25"""
+        if self._matrix is None:
+            self._matrix = sparse.csr_matrix(
+                (self.post_weights, self.post_docs, self.term_ptr),
+                shape=(self.vocab_size, self.n_docs)
+            )
+        return self._matrix
+
+    def _term(self, term_id: int) -> str:
+        start = int(self.vocab_offsets[term_id])
+        end = int(self.vocab_offsets[term_id + 1])
+        return self._vocab[start:end].decode("utf-8")
+
+    def term_id(self, term: str) -> Optional[int]:
+        """Binary search trên vocab đã sắp xếp (không cần dựng dict khi load)"""
+        low, high = 0, self.vocab_size - 1
+        while low <= high:
+            mid = (low + high) // 2
+            current = self._term(mid)
+            if current == term:
+                return mid
+            if current < term:
+                low = mid + 1
+            else:
+                high = mid - 1
+        return None
+
+    def query_matrix(self, queries: List[str]) -> sparse.csr_matrix:
+        """
+        Ma trận Q (số query × vocab_size), Q[i, t] = số lần term t xuất hiện trong query i
+
+        Như BM25Okapi: term lặp lại trong query được cộng nhiều lần.
+        """
+        rows, cols = [], []
+        for row, query in enumerate(queries):
+            for term in tokenize(query):
+                term_id = self.term_id(term)
+                if term_id is not None:
+                    rows.append(row)
+                    cols.append(term_id)
+
+        # Phần tử trùng (row, col) được cộng dồn khi chuyển sang CSR
+        return sparse.coo_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(len(queries), self.vocab_size)
+        ).tocsr()
+
+    def get_scores_batch(self, queries: List[str]) -> np.ndarray:
+        """Điểm BM25 (số query × n_docs) = Q @ W"""
+        return (self.query_matrix(queries) @ self.matrix).toarray()
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """Điểm BM25 của query với mọi document (giống BM25Okapi.get_scores)"""
+        return self.get_scores_batch([query])[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int,
+        rows: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        (dòng, điểm) của k documents có điểm cao nhất cho từng query
+
+        Args:
+            rows: Chỉ xét các dòng này (metadata filter), None = tất cả
+        """
+        k = min(k, self.n_docs if rows is None else len(rows))
+        if k <= 0 or not queries:
+            return [[] for _ in queries]
+
+        scores = self.query_matrix(queries) @ self.matrix
+        if rows is not None:
+            # Chỉ giữ cột của các dòng được chọn (trên ma trận điểm thưa, trước khi chọn top-k)
+            scores = scores[:, rows]
+        scores = scores.toarray()
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        if rows is not None:
+            top = np.asarray(rows)[top]
+        values = np.take_along_axis(top_scores, order, axis=1).tolist()
+        return [list(zip(row, value)) for row, value in zip(top.tolist(), values)]
+
+    def top_k_batch(self, queries: List[str], k: int) -> List[List[int]]:
+        """Dòng của k documents có điểm cao nhất cho từng query"""
+        return [[row for row, _ in hits] for hits in self.search_batch(queries, k)]
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Dòng của k documents có điểm cao nhất"""
+        return self.top_k_batch([query], k)[0]
+
+
+# ============================================================================
+# RETRIEVER
+# ============================================================================
+
+class PersistedBM25Retriever(BaseRetriever):
+    """
+    BM25 retriever dùng inverted index đã lưu + columnar doc store
+
+    Chỉ tạo Document cho các kết quả trả về, điểm BM25 gắn vào metadata["score"].
+    batch() chấm điểm tất cả query bằng 1 phép nhân ma trận thưa thay vì từng query một.
+    filter (metadata) giới hạn các dòng được chấm điểm, xem metadata_index.py.
+    """
+
+    index: BM25Index
+    docstore: ColumnarDocStore
+    k: int = 4
+    metadata_index: Optional[MetadataIndex] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun = None,
+        filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        hits = self.index.search_batch([query], self.k, rows=self._filter_rows(filter))[0]
+        return self._to_documents(hits)
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun = None,
+        filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        # Mặc định của BaseRetriever không chuyển filter xuống bản sync
+        return await run_in_executor(
+            None, self._get_relevant_documents, query,
+            run_manager=run_manager.get_sync() if run_manager else None, filter=filter
+        )
+
+    def batch(self, inputs: List[str], config=None, **kwargs) -> List[List[Document]]:
+        """Tìm kiếm nhiều query cùng lúc (vectorized), filter qua kwargs["filter"]"""
+        rows = self._filter_rows(kwargs.get("filter"))
+        return [self._to_documents(hits) for hits in self.index.search_batch(list(inputs), self.k, rows=rows)]
+
+    def _filter_rows(self, metadata_filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        if not metadata_filter:
+            return None
+        if self.metadata_index is None:
+            raise ValueError("Index chưa có metadata_index/ - chạy python metadata_index.py để build")
+        return self.metadata_index.rows_for(metadata_filter)
+
+    def _to_documents(self, hits: List[Tuple[int, float]]) -> List[Document]:
+        documents = []
+        for row, score in hits:
+            doc = self.docstore.get(row)
+            doc.metadata["score"] = score
+            documents.append(doc)
+        return documents
+
+
+# ============================================================================
+# BUILD CHO INDEX ĐÃ CÓ
+# ============================================================================
+
+if __name__ == "__main__":
+    import sys
+
+    # Build bm25/ cho index đã lưu mà không cần chạy lại ingestion
+    index_path = Path(sys.argv[1]) if len(sys.argv) > 1 else (
+        Path(__file__).parent / "output" / "law_documents_index"
+    )
+    store = ColumnarDocStore.open(index_path)
+    meta = build_bm25_index(list(store.iter_documents()), index_path)
+    print(f"✅ Đã build BM25 index: {meta['n_docs']} documents, {meta['vocab_size']} terms, "
+          f"{meta['n_postings']} postings → {index_path / BM25_DIR}")
@@ -3,10 +3,12 @@ DEMO SCRIPT - Test FAISS Vector Store
 Kiểm tra khả năng retrieval của hệ thống
 """
 
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from pathlib import Path
 
+from doc_store import load_vector_store
+from embedding_cache import create_cached_embeddings
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -35,19 +37,15 @@ print("=" * 80)
 
 print("\n📦 Đang load FAISS index...")
 
-# Khởi tạo embedding model
-embeddings = HuggingFaceEmbeddings(
+# Khởi tạo embedding model (có cache trên đĩa)
+embeddings = create_cached_embeddings(
     model_name=EMBEDDING_MODEL,
-    model_kwargs={'device': 'cpu'},
-    encode_kwargs={'normalize_embeddings': True}
+    device='cpu',
+    normalize=True
 )
 
-# Load vector store
-vectorstore = FAISS.load_local(
-    str(INDEX_PATH),
-    embeddings,
-    allow_dangerous_deserialization=True
-)
+# Load vector store (doc store memory-mapped, không cần pickle)
+vectorstore = load_vector_store(INDEX_PATH, embeddings)
 
 print(f"✅ Đã load thành công!")
 print(f"📊 Tổng số vectors: {vectorstore.index.ntotal}")
@@ -0,0 +1,391 @@
+"""
+COLUMNAR DOC STORE - Lưu page_content + metadata dạng cột, memory-mapped
+Thay cho index.pkl (pickle docstore của LangChain):
+- Không cần pickle / allow_dangerous_deserialization khi load
+- Load gần như tức thì (chỉ mmap file, không dựng lại object Python)
+- Document chỉ được tạo cho các kết quả mà query thực sự trả về
+
+Format trong thư mục index (cạnh index.faiss):
+- docstore.json         : danh sách cột, số dòng, version
+- docstore_offsets.npy  : int64 (số cột, số dòng + 1) - offset byte của từng ô
+- docstore.bin          : UTF-8 blob của tất cả các ô, nối liên tiếp theo cột
+
+Dòng i của doc store tương ứng vector thứ i trong index.faiss.
+
+index.faiss cũng được memory-map (IO_FLAG_MMAP_IFC / IO_FLAG_MMAP) khi load:
+nhiều process trên cùng máy dùng chung page cache, thời gian khởi động không
+tăng theo kích thước index. File luôn được ghi qua file tạm + rename để
+các process đang mmap bản cũ không bị ảnh hưởng.
+
+Chạy trực tiếp để chuyển index cũ (index.pkl) sang format mới:
+    python doc_store.py [đường_dẫn_index]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from index_factory import apply_search_params
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+DOCSTORE_META = "docstore.json"
+DOCSTORE_OFFSETS = "docstore_offsets.npy"
+DOCSTORE_BLOB = "docstore.bin"
+FAISS_INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE = "index.pkl"
+
+FORMAT_VERSION = 1
+
+# Cột đầu tiên luôn là nội dung, các cột sau là metadata (giữ nguyên thứ tự)
+CONTENT_COLUMN = "page_content"
+
+# Các cách mmap index.faiss, thử lần lượt:
+# - IO_FLAG_MMAP_IFC: codes của IndexFlatCodes (flat, sq8, storage của HNSW), IVF
+# - IO_FLAG_MMAP: inverted lists của IVF (FAISS cũ chưa có IO_FLAG_MMAP_IFC)
+MMAP_IO_FLAGS = [
+    flag | faiss.IO_FLAG_READ_ONLY
+    for flag in (getattr(faiss, "IO_FLAG_MMAP_IFC", None), faiss.IO_FLAG_MMAP)
+    if flag is not None
+]
+
+
+# ============================================================================
+# COLUMNAR DOC STORE
+# ============================================================================
+
+class ColumnarDocStore(Docstore):
+    """
+    Docstore chỉ đọc, memory-mapped, tra cứu theo record id hoặc theo dòng
+    """
+
+    def __init__(self, columns: List[str], offsets: np.ndarray, blob: mmap.mmap):
+        self.columns = columns
+        self._column_idx = {name: idx for idx, name in enumerate(columns)}
+        self._offsets = offsets
+        self._blob = blob
+        self._row_by_id = None
+        # id → dòng của các record vừa được RowIdMapping trả ra (tránh dựng bảng id đầy đủ)
+        self._resolved = {}
+
+    # ---------------------------------------------------------------- write
+
+    @staticmethod
+    def write(index_path: Path, documents: List[Document]):
+        """
+        Ghi documents (theo đúng thứ tự vector trong FAISS) ra format cột
+
+        Args:
+            index_path: Thư mục index
+            documents: Documents, dòng i ↔ vector i
+        """
+        index_path = Path(index_path)
+        index_path.mkdir(parents=True, exist_ok=True)
+
+        metadata_columns = list(documents[0].metadata.keys()) if documents else []
+        columns = [CONTENT_COLUMN] + metadata_columns
+
+        offsets = np.zeros((len(columns), len(documents) + 1), dtype=np.int64)
+        position = 0
+
+        blob_tmp = index_path / f"{DOCSTORE_BLOB}.tmp"
+        with open(blob_tmp, 'wb') as f:
+            for col_idx, column in enumerate(columns):
+                offsets[col_idx, 0] = position
+                for row, doc in enumerate(documents):
+                    value = doc.page_content if column == CONTENT_COLUMN else doc.metadata.get(column, "")
+                    data = str(value).encode("utf-8")
+                    f.write(data)
+                    position += len(data)
+                    offsets[col_idx, row + 1] = position
+
+        offsets_tmp = index_path / f"{DOCSTORE_OFFSETS}.tmp"
+        with open(offsets_tmp, 'wb') as f:
+            np.save(f, offsets)
+
+        meta_tmp = index_path / f"{DOCSTORE_META}.tmp"
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(
+                {"version": FORMAT_VERSION, "columns": columns, "count": len(documents)},
+                f,
+                indent=2,
+                ensure_ascii=False
+            )
+
+        # Rename (atomic) thay vì ghi đè: process đang mmap bản cũ vẫn đọc được
+        os.replace(blob_tmp, index_path / DOCSTORE_BLOB)
+        os.replace(offsets_tmp, index_path / DOCSTORE_OFFSETS)
+        os.replace(meta_tmp, index_path / DOCSTORE_META)
+
+    # ----------------------------------------------------------------- read
+
+    @classmethod
+    def open(cls, index_path: Path) -> "ColumnarDocStore":
+        """Memory-map doc store đã lưu (không đọc toàn bộ vào RAM)"""
+        index_path = Path(index_path)
+
+        with open(index_path / DOCSTORE_META, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        offsets = np.load(index_path / DOCSTORE_OFFSETS, mmap_mode='r')
+
+        with open(index_path / DOCSTORE_BLOB, 'rb') as f:
+            # mmap không hỗ trợ file rỗng
+            if f.seek(0, 2) == 0:
+                blob = b""
+            else:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(meta["columns"], offsets, blob)
+
+    def __len__(self) -> int:
+        return self._offsets.shape[1] - 1
+
+    def get_field(self, row: int, column: str) -> str:
+        """Đọc 1 ô (decode UTF-8 đúng phần cần thiết)"""
+        col_idx = self._column_idx[column]
+        start = int(self._offsets[col_idx, row])
+        end = int(self._offsets[col_idx, row + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    def get(self, row: int) -> Document:
+        """Tạo Document cho dòng row"""
+        metadata = {column: self.get_field(row, column) for column in self.columns[1:]}
+        return Document(
+            id=metadata.get("id"),
+            page_content=self.get_field(row, CONTENT_COLUMN),
+            metadata=metadata
+        )
+
+    def iter_documents(self) -> Iterator[Document]:
+        for row in range(len(self)):
+            yield self.get(row)
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        """Dòng của record id (bảng id → dòng đầy đủ chỉ được dựng khi thật sự cần)"""
+        if doc_id in self._resolved:
+            return self._resolved[doc_id]
+        if self._row_by_id is None:
+            self._row_by_id = {self.get_field(row, "id"): row for row in range(len(self))}
+        return self._row_by_id.get(doc_id)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Docstore interface cho FAISS: tra cứu theo record id"""
+        row = self.row_of(search)
+        if row is None:
+            return f"ID {search} not found."
+        return self.get(row)
+
+
+class RowIdMapping(Mapping):
+    """index_to_docstore_id cho FAISS: vị trí vector → record id, đọc lazy từ doc store"""
+
+    def __init__(self, store: ColumnarDocStore):
+        self._store = store
+
+    def __getitem__(self, row) -> str:
+        row = int(row)
+        if not 0 <= row < len(self._store):
+            raise KeyError(row)
+        doc_id = self._store.get_field(row, "id")
+        # FAISS gọi docstore.search(id) ngay sau đó → ghi nhớ dòng để tra O(1)
+        self._store._resolved[doc_id] = row
+        return doc_id
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __iter__(self):
+        return iter(range(len(self._store)))
+
+
+# ============================================================================
+# SAVE / LOAD VECTOR STORE
+# ============================================================================
+
+def read_faiss_index(path: Path, use_mmap: bool = True):
+    """
+    Đọc index.faiss, ưu tiên memory-map (read-only)
+
+    Args:
+        path: Đường dẫn index.faiss
+        use_mmap: False → đọc toàn bộ vào RAM (cần khi muốn sửa index)
+    """
+    if use_mmap:
+        for flags in MMAP_IO_FLAGS:
+            try:
+                return faiss.read_index(str(path), flags)
+            except RuntimeError:
+                # Loại index / bản FAISS này không hỗ trợ cách mmap này
+                continue
+    return faiss.read_index(str(path))
+
+
+def index_version(index_path: Path) -> str:
+    """
+    Version của index đã lưu: đổi mỗi khi ingestion ghi lại index
+
+    Dựa trên kích thước + mtime của index.faiss và docstore.json (file được
+    ghi bằng rename nên mỗi lần lưu là 1 inode / mtime mới).
+    """
+    index_path = Path(index_path)
+    parts = []
+    for name in (FAISS_INDEX_FILE, DOCSTORE_META, LEGACY_DOCSTORE):
+        path = index_path / name
+        if path.exists():
+            stat = path.stat()
+            parts.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def index_fingerprint(index_path: Path) -> str:
+    """
+    Fingerprint nội dung index đã lưu (sha256 của index.faiss + doc store)
+
+    Ghi vào config JSON lúc ingestion; các cache kết quả dùng làm 1 phần của key.
+    """
+    index_path = Path(index_path)
+    digest = hashlib.sha256()
+    for name in (FAISS_INDEX_FILE, DOCSTORE_OFFSETS, DOCSTORE_BLOB):
+        with open(index_path / name, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def get_ordered_documents(vectorstore: FAISS) -> List[Document]:
+    """Documents theo đúng thứ tự vector trong FAISS index"""
+    return [
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[row])
+        for row in range(vectorstore.index.ntotal)
+    ]
+
+
+def save_vector_store_files(vectorstore: FAISS, index_path: Path):
+    """
+    Lưu index.faiss + columnar doc store (không dùng pickle)
+
+    Args:
+        vectorstore: FAISS vector store
+        index_path: Thư mục output
+    """
+    index_path = Path(index_path)
+    index_path.mkdir(parents=True, exist_ok=True)
+
+    index_tmp = index_path / f"{FAISS_INDEX_FILE}.tmp"
+    faiss.write_index(vectorstore.index, str(index_tmp))
+    os.replace(index_tmp, index_path / FAISS_INDEX_FILE)
+    ColumnarDocStore.write(index_path, get_ordered_documents(vectorstore))
+
+    # Xóa docstore pickle cũ để không còn bản metadata lệch với index
+    legacy_path = index_path / LEGACY_DOCSTORE
+    if legacy_path.exists():
+        legacy_path.unlink()
+
+
+def load_vector_store(
+    index_path: Path,
+    embeddings: Embeddings,
+    materialize: bool = False,
+    use_mmap: bool = True
+) -> FAISS:
+    """
+    Load FAISS vector store đã lưu
+
+    Args:
+        index_path: Thư mục index
+        embeddings: Embedding model cho query
+        materialize: True → nạp toàn bộ documents và index vào RAM
+            (cần khi muốn thêm/xóa vector, ví dụ incremental ingestion)
+        use_mmap: Memory-map index.faiss (chỉ đọc, dùng chung page cache)
+
+    Returns:
+        FAISS vector store
+    """
+    index_path = Path(index_path)
+
+    # Index cũ (trước khi có columnar doc store) vẫn load được qua pickle
+    if not (index_path / DOCSTORE_META).exists():
+        return FAISS.load_local(
+            str(index_path),
+            embeddings,
+            allow_dangerous_deserialization=True
+        )
+
+    # Index mmap là read-only → không mmap khi cần sửa (materialize)
+    index = read_faiss_index(index_path / FAISS_INDEX_FILE, use_mmap=use_mmap and not materialize)
+    store = ColumnarDocStore.open(index_path)
+
+    # nprobe / efSearch theo config JSON của lần build (cạnh thư mục index)
+    config_path = index_path.parent / f"{index_path.name}_config.json"
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            apply_search_params(index, json.load(f).get("faiss_index", {}).get("params", {}))
+
+    if materialize:
+        documents = list(store.iter_documents())
+        docstore = InMemoryDocstore({doc.id: doc for doc in documents})
+        index_to_docstore_id = {row: doc.id for row, doc in enumerate(documents)}
+    else:
+        docstore = store
+        index_to_docstore_id = RowIdMapping(store)
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
+
+
+def get_all_documents(vectorstore: FAISS) -> List[Document]:
+    """Toàn bộ documents của vector store (theo thứ tự vector)"""
+    if isinstance(vectorstore.docstore, ColumnarDocStore):
+        return list(vectorstore.docstore.iter_documents())
+    return get_ordered_documents(vectorstore)
+
+
+# ============================================================================
+# MIGRATION: index.pkl → columnar doc store
+# ============================================================================
+
+def migrate_legacy_index(index_path: Path):
+    """Chuyển index dùng index.pkl sang columnar doc store (giữ nguyên index.faiss)"""
+    index_path = Path(index_path)
+    print(f"🔄 Đang chuyển {index_path / LEGACY_DOCSTORE} sang columnar doc store...")
+
+    # Chỉ cần docstore, không cần embedding model
+    vectorstore = FAISS.load_local(
+        str(index_path),
+        embeddings=None,
+        allow_dangerous_deserialization=True
+    )
+    documents = [
+        Document(id=doc.metadata["id"], page_content=doc.page_content, metadata=doc.metadata)
+        for doc in get_ordered_documents(vectorstore)
+    ]
+    ColumnarDocStore.write(index_path, documents)
+    (index_path / LEGACY_DOCSTORE).unlink()
+
+    print(f"   ✓ Đã ghi {len(documents)} documents ({DOCSTORE_BLOB}, {DOCSTORE_OFFSETS}, {DOCSTORE_META})")
+
+
+if __name__ == "__main__":
+    default_path = Path(__file__).parent / "output" / "law_documents_index"
+    migrate_legacy_index(Path(sys.argv[1]) if len(sys.argv) > 1 else default_path)
@@ -0,0 +1,369 @@
+"""
+EMBEDDING CACHE - Cache embeddings trên đĩa (SQLite)
+Tránh embed lại cùng một đoạn text khi chạy lại ingestion, rebuild index
+với cấu hình FAISS khác hoặc chạy lại các query đánh giá
+
+Key: (tên embedding model, cờ normalize, sha256(text))
+
+Query embeddings còn có thêm 1 tầng LRU trong RAM (QueryEmbeddingLRU), dùng
+chung trong process giữa hybrid retrieval và RAG chain, key là query đã chuẩn
+hóa (NFC + gộp khoảng trắng). Mỗi (model, normalize) có 1 LRU riêng: query
+embedding chỉ phụ thuộc model, không phụ thuộc index → build lại index không
+cần xóa cache.
+"""
+
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_CACHE_PATH = SCRIPT_DIR / "output" / "embedding_cache.sqlite"
+
+# SQLite giới hạn số biến trong 1 câu lệnh → tra cứu theo từng lô
+LOOKUP_CHUNK_SIZE = 500
+
+# LRU query embeddings trong RAM (TTL None = không hết hạn)
+QUERY_CACHE_MAX_ENTRIES = 1024
+QUERY_CACHE_TTL_SECONDS = None
+
+
+def text_hash(text: str) -> str:
+    """sha256 hex digest của text (UTF-8)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """Chuẩn hóa query: Unicode NFC (dấu tiếng Việt dựng sẵn) + gộp khoảng trắng"""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+# ============================================================================
+# SQLITE STORE
+# ============================================================================
+
+class EmbeddingCache:
+    """
+    Bảng SQLite lưu vector float32 theo (model, normalize, text_hash)
+
+    Dùng chung được giữa nhiều thread (desktop app chạy query trong thread riêng)
+    """
+
+    def __init__(self, cache_path: Path = DEFAULT_CACHE_PATH):
+        self.cache_path = Path(cache_path)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                normalize INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, normalize, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, normalize: bool, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Tra cứu nhiều vector cùng lúc
+
+        Returns:
+            Dict text_hash -> vector (chỉ chứa các hash đã có trong cache)
+        """
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+
+        with self._lock:
+            for start in range(0, len(unique_hashes), LOOKUP_CHUNK_SIZE):
+                chunk = unique_hashes[start:start + LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND normalize = ? AND text_hash IN ({placeholders})",
+                    [model, int(normalize), *chunk]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+        return found
+
+    def put_many(self, model: str, normalize: bool, items: Dict[str, np.ndarray]):
+        """Ghi nhiều vector vào cache"""
+        if not items:
+            return
+
+        rows = [
+            (model, int(normalize), key, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, normalize, text_hash, vector) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================================
+# QUERY EMBEDDING LRU (RAM)
+# ============================================================================
+
+class QueryEmbeddingLRU:
+    """
+    LRU (+ TTL tùy chọn) cho query embeddings của 1 (model, normalize), thread-safe
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        ttl_seconds: Optional[float] = QUERY_CACHE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None and self.ttl_seconds is not None:
+                if time.monotonic() - entry[1] > self.ttl_seconds:
+                    del self._entries[query]
+                    entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[query] = (np.asarray(vector, dtype=np.float32), time.monotonic())
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit ratio và bộ nhớ (vector + key) của cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            memory_bytes = sum(
+                vector.nbytes + sys.getsizeof(query)
+                for query, (vector, _) in self._entries.items()
+            )
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_bytes": memory_bytes,
+            }
+
+
+# LRU dùng chung trong process theo (model, normalize)
+_QUERY_CACHES: Dict[tuple, QueryEmbeddingLRU] = {}
+_QUERY_CACHES_LOCK = threading.Lock()
+
+
+def get_query_cache(model_name: str, normalize: bool) -> QueryEmbeddingLRU:
+    """LRU query embeddings dùng chung cho mọi CachedEmbeddings cùng model"""
+    with _QUERY_CACHES_LOCK:
+        key = (model_name, normalize)
+        if key not in _QUERY_CACHES:
+            _QUERY_CACHES[key] = QueryEmbeddingLRU()
+        return _QUERY_CACHES[key]
+
+
+def print_query_cache_stats(embeddings: Embeddings):
+    """In hit ratio + bộ nhớ của LRU query embeddings (nếu embeddings có)"""
+    query_cache = getattr(embeddings, "query_cache", None)
+    if query_cache is None:
+        return
+    stats = query_cache.stats()
+    print(f"🧠 Query embedding cache: {stats['hits']} hits / {stats['misses']} misses "
+          f"(hit ratio {stats['hit_ratio']:.1%}) | {stats['entries']}/{stats['max_entries']} entries, "
+          f"{stats['memory_bytes'] / 1024:.1f} KB")
+
+
+# ============================================================================
+# EMBEDDINGS WRAPPER
+# ============================================================================
+
+class CachedEmbeddings(Embeddings):
+    """
+    Bọc một Embeddings model với cache trên đĩa
+
+    Model thật chỉ được khởi tạo (lazy) khi có cache miss, nên các lần chạy
+    lại toàn hit không phải load model. embed_query tra LRU trong RAM
+    (query_cache) trước cache SQLite.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        normalize: bool,
+        embeddings_factory: Callable[[], Embeddings],
+        cache: Optional[EmbeddingCache] = None,
+        query_cache: Optional[QueryEmbeddingLRU] = None
+    ):
+        self.model_name = model_name
+        self.normalize = normalize
+        self._embeddings_factory = embeddings_factory
+        self._embeddings = None
+        self._model_lock = threading.Lock()
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.query_cache = query_cache
+
+        # Cùng 1 instance được gọi từ thread pool retrieval và aquery_rag → đếm dưới lock riêng
+        # (không dùng _model_lock: lock đó bị giữ suốt lúc load model)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Model embedding thật (khởi tạo ở lần miss đầu tiên)"""
+        with self._model_lock:
+            if self._embeddings is None:
+                self._embeddings = self._embeddings_factory()
+        return self._embeddings
+
+    def _embed(self, texts: List[str], embed_fn: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self.cache.get_many(self.model_name, self.normalize, hashes)
+
+        # Text trùng nhau trong cùng batch chỉ embed 1 lần
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        n_misses = sum(1 for key in hashes if key in missing)
+        with self._stats_lock:
+            self.hits += len(texts) - n_misses
+            self.misses += n_misses
+
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            computed = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing.keys(), vectors)
+            }
+            self.cache.put_many(self.model_name, self.normalize, computed)
+            found.update(computed)
+
+        return [found[key].tolist() for key in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, lambda batch: self.embeddings.embed_documents(batch))
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self._embed([text], lambda batch: [self.embeddings.embed_query(batch[0])])[0]
+
+        query = normalize_query(text)
+        vector = self.query_cache.get(query)
+        if vector is None:
+            vector = self._embed([query], lambda batch: [self.embeddings.embed_query(batch[0])])[0]
+            self.query_cache.put(query, vector)
+            return vector
+        return vector.tolist()
+
+    def stats(self) -> Dict:
+        """Bộ đếm hit/miss của cache"""
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        """Giải phóng model thật (VD: tắt process pool của ShardedEmbeddingEngine)"""
+        with self._model_lock:
+            close = getattr(self._embeddings, "close", None)
+            if close is not None:
+                close()
+            self._embeddings = None
+
+
+def create_cached_embeddings(
+    model_name: str,
+    device: str = "cpu",
+    normalize: bool = True,
+    cache_path: Path = DEFAULT_CACHE_PATH,
+    embeddings_factory: Optional[Callable[[], Embeddings]] = None,
+    query_cache: bool = True
+) -> CachedEmbeddings:
+    """
+    Tạo HuggingFaceEmbeddings có cache trên đĩa
+
+    Args:
+        model_name: Tên model sentence-transformers
+        device: "cpu" hoặc "cuda"
+        normalize: Chuẩn hóa vector (phải khớp với lúc build index)
+        cache_path: File SQLite của cache
+        embeddings_factory: Factory tạo model thật cho cache miss
+            (mặc định: HuggingFaceEmbeddings chạy trong process hiện tại)
+        query_cache: Dùng LRU query embeddings trong RAM (chung cả process)
+
+    Returns:
+        CachedEmbeddings (model chỉ được load khi có cache miss)
+    """
+    def _default_factory():
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': device},
+            encode_kwargs={'normalize_embeddings': normalize}
+        )
+
+    return CachedEmbeddings(
+        model_name=model_name,
+        normalize=normalize,
+        embeddings_factory=embeddings_factory or _default_factory,
+        cache=EmbeddingCache(cache_path),
+        query_cache=get_query_cache(model_name, normalize) if query_cache else None
+    )
@@ -0,0 +1,264 @@
+"""
+INDEX FACTORY - Các loại FAISS index + báo cáo recall/latency
+Hỗ trợ: flat (exact), ivf_flat, ivf_pq, sq8, hnsw
+
+Sau khi build, index được đo recall@k so với flat index (exact search)
+và latency mỗi query để chọn loại index dựa trên số liệu.
+
+Chạy trực tiếp để so sánh tất cả loại index trên vectors của index đã lưu:
+    python index_factory.py [--k 10]
+"""
+
+import argparse
+import math
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+INDEX_TYPES = ["flat", "ivf_flat", "ivf_pq", "sq8", "hnsw"]
+
+# Tham số mặc định cho từng loại index (có thể ghi đè qua params)
+DEFAULT_INDEX_PARAMS = {
+    "flat": {},
+    "ivf_flat": {"nlist": 1024, "nprobe": 16},
+    "ivf_pq": {"nlist": 1024, "nprobe": 16, "pq_m": 48, "pq_nbits": 8},
+    "sq8": {},
+    "hnsw": {"hnsw_m": 32, "ef_construction": 200, "ef_search": 64},
+}
+
+# Loại index cập nhật incremental được (xóa + thêm vector tại chỗ). FAISS.delete của
+# LangChain đánh số lại label sau remove_ids như thể các vector phía sau dồn lên:
+# đúng với flat / sq8 (lưu vector liên tục), sai với IVF (label giữ nguyên trong
+# inverted list → label trỏ nhầm document). HNSW không hỗ trợ xóa.
+INCREMENTAL_INDEX_TYPES = ["flat", "sq8"]
+
+# FAISS khuyến nghị tối thiểu ~39 điểm train cho mỗi centroid
+MIN_POINTS_PER_CENTROID = 39
+
+# PQ dưới 8 bit/sub-vector (≤ 128 centroid / codebook) mất quá nhiều recall
+# → IVF-PQ cần ≥ 2^8 × 39 = 9984 vectors, corpus nhỏ hơn dùng flat / sq8 / hnsw
+MIN_PQ_NBITS = 8
+
+# Số query tối đa (lấy mẫu từ corpus) khi đo recall/latency
+EVAL_MAX_QUERIES = 500
+EVAL_K = 10
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def max_pq_nbits(n_vectors: int) -> int:
+    """Số bit PQ lớn nhất mà codebook còn đủ điểm train"""
+    return int(math.log2(max(2, n_vectors // MIN_POINTS_PER_CENTROID)))
+
+
+def check_index_type(index_type: str, n_vectors: int):
+    """
+    Kiểm tra loại index dùng được cho corpus n_vectors (gọi được trước khi embed)
+
+    Raises:
+        ValueError: Loại index không hỗ trợ, hoặc IVF-PQ trên corpus quá nhỏ
+            (pq_nbits bị giới hạn dưới MIN_PQ_NBITS → recall thấp)
+    """
+    if index_type not in DEFAULT_INDEX_PARAMS:
+        raise ValueError(f"Loại index không hỗ trợ: {index_type} (chọn trong {INDEX_TYPES})")
+
+    if index_type == "ivf_pq" and max_pq_nbits(n_vectors) < MIN_PQ_NBITS:
+        raise ValueError(
+            f"IVF-PQ cần ≥ {2 ** MIN_PQ_NBITS * MIN_POINTS_PER_CENTROID} vectors để train "
+            f"codebook {MIN_PQ_NBITS} bit (hiện có {n_vectors} → chỉ {max_pq_nbits(n_vectors)} bit, "
+            f"recall thấp); dùng flat, sq8 hoặc hnsw"
+        )
+
+
+def resolve_params(index_type: str, n_vectors: int, dim: int, params: Optional[Dict] = None) -> Dict:
+    """
+    Gộp tham số mặc định với params và điều chỉnh theo kích thước corpus
+
+    - nlist giới hạn để mỗi centroid có đủ điểm train
+    - pq_m phải chia hết dim, pq_nbits giới hạn để codebook có đủ điểm train
+
+    Raises:
+        ValueError: Xem check_index_type
+    """
+    check_index_type(index_type, n_vectors)
+    resolved = {**DEFAULT_INDEX_PARAMS[index_type], **(params or {})}
+
+    if "nlist" in resolved:
+        resolved["nlist"] = max(1, min(resolved["nlist"], n_vectors // MIN_POINTS_PER_CENTROID))
+        resolved["nprobe"] = max(1, min(resolved["nprobe"], resolved["nlist"]))
+
+    if index_type == "ivf_pq":
+        while dim % resolved["pq_m"] != 0:
+            resolved["pq_m"] -= 1
+        resolved["pq_nbits"] = max(1, min(resolved["pq_nbits"], max_pq_nbits(n_vectors)))
+
+    return resolved
+
+
+def build_faiss_index(vectors: np.ndarray, index_type: str, params: Optional[Dict] = None):
+    """
+    Tạo (và train nếu cần) FAISS index, metric L2 như index mặc định của LangChain
+
+    Args:
+        vectors: float32 (n, dim)
+        index_type: Một trong INDEX_TYPES
+        params: Tham số ghi đè DEFAULT_INDEX_PARAMS
+
+    Returns:
+        (index, resolved_params, train_seconds)
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    resolved = resolve_params(index_type, n_vectors, dim, params)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, resolved["nlist"], faiss.METRIC_L2)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(
+            faiss.IndexFlatL2(dim), dim, resolved["nlist"], resolved["pq_m"], resolved["pq_nbits"]
+        )
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexHNSWFlat(dim, resolved["hnsw_m"], faiss.METRIC_L2)
+        index.hnsw.efConstruction = resolved["ef_construction"]
+
+    start = time.perf_counter()
+    if not index.is_trained:
+        index.train(vectors)
+    train_seconds = time.perf_counter() - start
+
+    index.add(vectors)
+    apply_search_params(index, resolved)
+
+    return index, resolved, train_seconds
+
+
+def apply_search_params(index, params: Dict):
+    """Đặt tham số lúc search (nprobe cho IVF, efSearch cho HNSW)"""
+    if "nprobe" in params and hasattr(index, "nprobe"):
+        index.nprobe = params["nprobe"]
+    if "ef_search" in params and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = params["ef_search"]
+
+
+# ============================================================================
+# EVALUATION
+# ============================================================================
+
+def evaluate_index(index, vectors: np.ndarray, k: int = EVAL_K, max_queries: int = EVAL_MAX_QUERIES) -> Dict:
+    """
+    Đo recall@k so với exact flat search và latency từng query
+
+    Query = mẫu ngẫu nhiên (cố định seed) các vector trong corpus
+
+    Returns:
+        Dict: recall_at_k, latency_ms_{mean,p50,p95}, n_queries, k
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+
+    rng = np.random.default_rng(0)
+    n_queries = min(max_queries, len(vectors))
+    queries = vectors[rng.choice(len(vectors), n_queries, replace=False)]
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    latencies = []
+    hits = 0
+    for row in range(n_queries):
+        start = time.perf_counter()
+        _, found = index.search(queries[row:row + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found[0]) & set(truth[row]))
+
+    latencies = np.asarray(latencies)
+    return {
+        "k": k,
+        "n_queries": n_queries,
+        "recall_at_k": hits / (n_queries * k),
+        "latency_ms_mean": float(latencies.mean()),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def index_size_bytes(index) -> int:
+    """Kích thước index khi serialize ra đĩa"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def describe_index(index_type: str, params: Dict, index, train_seconds: float, report: Optional[Dict]) -> Dict:
+    """Thông tin index để ghi vào config JSON"""
+    return {
+        "index_type": index_type,
+        "faiss_class": type(index).__name__,
+        "metric": "L2",
+        "params": params,
+        "is_trained": bool(index.is_trained),
+        "train_seconds": round(train_seconds, 4),
+        "ntotal": int(index.ntotal),
+        "size_bytes": index_size_bytes(index),
+        "evaluation": report,
+    }
+
+
+def print_report(index_type: str, info: Dict):
+    """In báo cáo recall/latency"""
+    report = info.get("evaluation")
+    print(f"   📐 Index: {index_type} ({info['faiss_class']}) | params: {info['params']}")
+    print(f"   💽 Size: {info['size_bytes'] / 1024:.1f} KB | Train: {info['train_seconds']:.2f}s")
+    if report:
+        print(f"   🎯 Recall@{report['k']}: {report['recall_at_k']:.3f} "
+              f"({report['n_queries']} queries)")
+        print(f"   ⏱️  Latency/query: mean {report['latency_ms_mean']:.3f} ms | "
+              f"p50 {report['latency_ms_p50']:.3f} ms | p95 {report['latency_ms_p95']:.3f} ms")
+
+
+# ============================================================================
+# SO SÁNH CÁC LOẠI INDEX
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh recall/latency các loại FAISS index")
+    parser.add_argument(
+        "--index-path",
+        default=str(Path(__file__).parent / "output" / "law_documents_index"),
+        help="Thư mục chứa index.faiss (flat) để lấy vectors"
+    )
+    parser.add_argument("--k", type=int, default=EVAL_K)
+    args = parser.parse_args()
+
+    flat = faiss.read_index(str(Path(args.index_path) / "index.faiss"))
+    vectors = flat.reconstruct_n(0, flat.ntotal)
+    print(f"📊 {flat.ntotal} vectors, dim {flat.d}\n")
+
+    print(f"{'Index':<10} {'Recall@' + str(args.k):<10} {'p50 (ms)':<10} {'p95 (ms)':<10} {'Size (KB)':<10}")
+    print("-" * 52)
+    for index_type in INDEX_TYPES:
+        try:
+            index, params, train_seconds = build_faiss_index(vectors, index_type)
+        except ValueError as e:
+            print(f"{index_type:<10} bỏ qua: {e}")
+            continue
+        report = evaluate_index(index, vectors, k=args.k)
+        print(f"{index_type:<10} {report['recall_at_k']:<10.3f} {report['latency_ms_p50']:<10.3f} "
+              f"{report['latency_ms_p95']:<10.3f} {index_size_bytes(index) / 1024:<10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,16 +6,35 @@ Author: AI Engineer
 Date: 2026-01-31
 """
 
+import argparse
+import hashlib
 import json
 import os
-import pickle
-from typing import List, Dict
+import time
+from typing import List, Dict, Tuple
 from pathlib import Path
 
+import numpy as np
 from langchain_core.documents import Document
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 
+from article_index import build_article_index
+from bm25_index import build_bm25_index
+from doc_store import get_ordered_documents, index_fingerprint, load_vector_store, save_vector_store_files
+from embedding_cache import CachedEmbeddings, create_cached_embeddings
+from metadata_index import build_metadata_index
+from index_factory import (
+    INCREMENTAL_INDEX_TYPES,
+    INDEX_TYPES,
+    build_faiss_index,
+    check_index_type,
+    describe_index,
+    evaluate_index,
+    print_report
+)
+from parallel_embedding import ShardedEmbeddingEngine
+from sentence_index import build_sentence_index
+
 
 # ============================================================================
 # CONFIGURATION
@@ -39,9 +58,28 @@ INPUT_FILES = [
 EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 EMBEDDING_DEVICE = "cpu"  # Đổi thành "cuda" nếu có GPU
 
+# Embedding song song: số worker process (mỗi worker load model 1 lần) và batch size
+EMBEDDING_NUM_WORKERS = 1  # Tăng lên theo số core trên máy ingestion
+EMBEDDING_BATCH_SIZE = 32
+
+# Length bucketing: tổng số token (kể cả padding) tối đa mỗi batch động
+# (0 = tắt, dùng batch cố định EMBEDDING_BATCH_SIZE)
+# Tắt mặc định: ~85% điều luật dài hơn 128 token (bị cắt) nên batch cố định đã
+# ~95% hiệu quả padding (ước lượng); bật khi benchmark_embedding.py cho thấy lợi ích
+EMBEDDING_TOKEN_BUDGET = 0
+
 # FAISS index configuration
 FAISS_INDEX_NAME = "law_documents_index"
 
+# Loại index: "flat" (exact), "ivf_flat", "ivf_pq", "sq8", "hnsw"
+FAISS_INDEX_TYPE = "flat"
+# Ghi đè tham số mặc định của index_factory.DEFAULT_INDEX_PARAMS
+# (VD: {"nlist": 4096, "nprobe": 32} hoặc {"hnsw_m": 32, "ef_search": 128})
+FAISS_INDEX_PARAMS = {}
+
+# Manifest cho incremental ingestion: id -> hash(content_for_embedding + metadata)
+MANIFEST_SUFFIX = "_manifest.json"
+
 
 # ============================================================================
 # STEP 1: ĐỌC DỮ LIỆU TỪ JSON FILES
@@ -103,8 +141,9 @@ def create_documents(json_data: List[Dict]) -> List[Document]:
             "citation": record["citation"]
         }
         
-        # Tạo Document object
+        # Tạo Document object (id của record dùng làm id trong docstore)
         doc = Document(
+            id=record["id"],
             page_content=record["content_for_embedding"],
             metadata=metadata
         )
@@ -123,27 +162,56 @@ def create_documents(json_data: List[Dict]) -> List[Document]:
 # STEP 3: TẠO EMBEDDINGS VÀ LƯU VÀO FAISS
 # ============================================================================
 
-def create_vector_store(documents: List[Document]) -> FAISS:
+def create_embeddings() -> CachedEmbeddings:
     """
-    Tạo embeddings cho documents và lưu vào FAISS vector store
+    Khởi tạo embedding model (có cache trên đĩa) dùng chung cho build, update và test
+    
+    Model thật chỉ được load khi có text chưa nằm trong cache
     
-    Args:
-        documents: List các LangChain Document objects
-        
     Returns:
-        FAISS vector store đã được tạo
+        CachedEmbeddings đã cấu hình
     """
     print(f"\n🧠 Đang khởi tạo Embedding Model: {EMBEDDING_MODEL_NAME}")
     print(f"   (Model sẽ được tải về lần đầu tiên, có thể mất vài phút...)")
     
-    # Khởi tạo embedding model
-    embeddings = HuggingFaceEmbeddings(
+    embeddings = create_cached_embeddings(
         model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': EMBEDDING_DEVICE},
-        encode_kwargs={'normalize_embeddings': True}  # Chuẩn hóa để tính cosine similarity
+        device=EMBEDDING_DEVICE,
+        normalize=True,  # Chuẩn hóa để tính cosine similarity
+        embeddings_factory=lambda: ShardedEmbeddingEngine(
+            model_name=EMBEDDING_MODEL_NAME,
+            device=EMBEDDING_DEVICE,
+            normalize=True,
+            num_workers=EMBEDDING_NUM_WORKERS,
+            batch_size=EMBEDDING_BATCH_SIZE,
+            token_budget=EMBEDDING_TOKEN_BUDGET or None
+        )
     )
     
-    print(f"   ✓ Model đã sẵn sàng!")
+    print(f"   ✓ Embedding cache: {embeddings.cache.cache_path.name}")
+    print(f"   ✓ Workers: {EMBEDDING_NUM_WORKERS} | Batch size: {EMBEDDING_BATCH_SIZE} "
+          f"| Token budget: {EMBEDDING_TOKEN_BUDGET or 'off'}")
+    return embeddings
+
+
+def print_cache_stats(embeddings: CachedEmbeddings):
+    """In bộ đếm hit/miss của embedding cache"""
+    stats = embeddings.stats()
+    print(f"   💾 Embedding cache: {stats['hits']} hits / {stats['misses']} misses "
+          f"(hit ratio {stats['hit_ratio']:.1%})")
+
+
+def create_vector_store(documents: List[Document]) -> FAISS:
+    """
+    Tạo embeddings cho documents và lưu vào FAISS vector store
+    
+    Args:
+        documents: List các LangChain Document objects
+        
+    Returns:
+        FAISS vector store đã được tạo
+    """
+    embeddings = create_embeddings()
     
     print(f"\n🔢 Đang tạo embeddings cho {len(documents)} documents...")
     print(f"   (Quá trình này có thể mất vài phút...)")
@@ -153,42 +221,323 @@ def create_vector_store(documents: List[Document]) -> FAISS:
     # 1. Tạo embeddings cho tất cả documents
     # 2. Xây dựng index để tìm kiếm nhanh
     # 3. Lưu trữ metadata kèm theo
+    # Dùng record id làm docstore id để incremental update xóa/thay được từng điều
     vectorstore = FAISS.from_documents(
         documents=documents,
-        embedding=embeddings
+        embedding=embeddings,
+        ids=[doc.metadata["id"] for doc in documents]
     )
     
     print(f"   ✓ Hoàn thành! Vector store đã được tạo")
     print(f"   📊 Số lượng vectors: {vectorstore.index.ntotal}")
     print(f"   📐 Vector dimension: {vectorstore.index.d}")
+    print_cache_stats(embeddings)
     
     return vectorstore
 
 
+# ============================================================================
+# STEP 3b: BUILD LOẠI INDEX ĐÃ CHỌN + ĐO RECALL/LATENCY
+# ============================================================================
+
+def build_index(vectorstore: FAISS, index_type: str, params: Dict) -> Dict:
+    """
+    Thay flat index mặc định của LangChain bằng loại index đã chọn,
+    rồi đo recall@k so với exact flat index và latency mỗi query
+    
+    Args:
+        vectorstore: FAISS vector store vừa tạo (IndexFlatL2)
+        index_type: Một trong index_factory.INDEX_TYPES
+        params: Tham số ghi đè cho index
+        
+    Returns:
+        Dict thông tin index (type, params, train, size, evaluation) cho config JSON
+    """
+    print(f"\n📐 Đang build FAISS index: {index_type}")
+    
+    # Thứ tự vector giữ nguyên → index_to_docstore_id vẫn đúng
+    vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    index, resolved_params, train_seconds = build_faiss_index(vectors, index_type, params)
+    
+    print(f"   🧪 Đang đo recall/latency so với exact flat index...")
+    report = evaluate_index(index, vectors)
+    
+    info = describe_index(index_type, resolved_params, index, train_seconds, report)
+    print_report(index_type, info)
+    
+    vectorstore.index = index
+    return info
+
+
+# ============================================================================
+# STEP 3c: INCREMENTAL UPDATE DỰA TRÊN MANIFEST
+# ============================================================================
+
+def compute_record_hash(doc: Document) -> str:
+    """
+    Tính hash cho 1 record từ nội dung embedding và metadata
+    
+    Args:
+        doc: LangChain Document
+        
+    Returns:
+        sha256 hex digest
+    """
+    payload = json.dumps(
+        {"content": doc.page_content, "metadata": doc.metadata},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_manifest(documents: List[Document]) -> Dict[str, str]:
+    """Tạo mapping id -> hash cho toàn bộ documents"""
+    return {doc.metadata["id"]: compute_record_hash(doc) for doc in documents}
+
+
+def get_manifest_path(base_name: str) -> Path:
+    """Đường dẫn file manifest của index"""
+    return OUTPUT_DIR / f"{base_name}{MANIFEST_SUFFIX}"
+
+
+def load_manifest(base_name: str) -> Dict:
+    """
+    Đọc manifest của lần ingestion trước
+    
+    Returns:
+        Dict manifest, hoặc None nếu chưa có
+    """
+    manifest_path = get_manifest_path(base_name)
+    if not manifest_path.exists():
+        return None
+    
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(records: Dict[str, str], base_name: str):
+    """Lưu manifest id -> hash cạnh FAISS index"""
+    manifest = {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "normalize_embeddings": True,
+        "records": records
+    }
+    
+    with open(get_manifest_path(base_name), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    
+    print(f"      - {base_name}{MANIFEST_SUFFIX}: Manifest cho incremental ingestion")
+
+
+def diff_manifest(
+    old_records: Dict[str, str],
+    new_records: Dict[str, str]
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    So sánh 2 manifest
+    
+    Returns:
+        (added_ids, changed_ids, removed_ids)
+    """
+    added = [doc_id for doc_id in new_records if doc_id not in old_records]
+    changed = [
+        doc_id for doc_id in new_records
+        if doc_id in old_records and old_records[doc_id] != new_records[doc_id]
+    ]
+    removed = [doc_id for doc_id in old_records if doc_id not in new_records]
+    return added, changed, removed
+
+
+def plan_incremental_update(documents: List[Document], base_name: str):
+    """
+    Xác định các record cần embed lại / xóa so với index đã lưu
+    
+    Args:
+        documents: Toàn bộ documents hiện tại
+        base_name: Tên cơ sở của index đã lưu
+        
+    Returns:
+        (added, changed, removed), hoặc None nếu phải full rebuild
+        (chưa có manifest, đổi embedding model / loại index, thiếu index,
+        hoặc loại index không cập nhật tại chỗ được)
+    """
+    print(f"\n🔁 Đang so sánh với manifest của lần ingestion trước...")
+    
+    manifest = load_manifest(base_name)
+    index_path = OUTPUT_DIR / base_name
+    
+    if manifest is None or not (index_path / "index.faiss").exists():
+        print(f"   ⚠️ Chưa có manifest hoặc index → full rebuild")
+        return None
+    
+    if manifest.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        print(f"   ⚠️ Embedding model đã đổi → full rebuild")
+        return None
+    
+    index_type = load_index_info(base_name).get("index_type", "flat")
+    if index_type != FAISS_INDEX_TYPE:
+        print(f"   ⚠️ Loại index đã đổi ({index_type} → {FAISS_INDEX_TYPE}) → full rebuild")
+        return None
+    
+    if index_type not in INCREMENTAL_INDEX_TYPES:
+        # HNSW không xóa được vector, IVF xóa xong thì label lệch khỏi docstore
+        # (xem index_factory.INCREMENTAL_INDEX_TYPES); embedding cache giúp rebuild vẫn nhanh
+        print(f"   ⚠️ {index_type} không cập nhật tại chỗ được → full rebuild")
+        return None
+    
+    added, changed, removed = diff_manifest(manifest["records"], build_manifest(documents))
+    print(f"   ✓ Thêm mới: {len(added)} | Thay đổi: {len(changed)} | Đã xóa: {len(removed)}")
+    return added, changed, removed
+
+
+def apply_incremental_update(
+    documents: List[Document],
+    base_name: str,
+    added: List[str],
+    changed: List[str],
+    removed: List[str]
+) -> FAISS:
+    """
+    Cập nhật FAISS index đã lưu: xóa record cũ/đã đổi, chỉ embed record mới/đã đổi
+    
+    Args:
+        documents: Toàn bộ documents hiện tại
+        base_name: Tên cơ sở của index đã lưu
+        added, changed, removed: Kết quả từ plan_incremental_update
+        
+    Returns:
+        FAISS vector store đã cập nhật
+    """
+    embeddings = create_embeddings()
+    
+    # Nạp docstore vào RAM để có thể xóa/thêm vector
+    vectorstore = load_vector_store(OUTPUT_DIR / base_name, embeddings, materialize=True)
+    
+    start = time.perf_counter()
+    
+    # Xóa record đã bị xóa hoặc đã thay đổi nội dung
+    stale_ids = removed + changed
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+    
+    # Chỉ embed lại record mới hoặc đã thay đổi
+    to_embed_ids = set(added + changed)
+    to_embed = [doc for doc in documents if doc.metadata["id"] in to_embed_ids]
+    if to_embed:
+        vectors = embeddings.embed_documents([doc.page_content for doc in to_embed])
+        vectorstore.add_embeddings(
+            text_embeddings=zip([doc.page_content for doc in to_embed], vectors),
+            metadatas=[doc.metadata for doc in to_embed],
+            ids=[doc.metadata["id"] for doc in to_embed]
+        )
+    
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"   ✓ Đã cập nhật index: -{len(stale_ids)} / +{len(to_embed)} vectors ({elapsed_ms:.1f} ms)")
+    print(f"   📊 Số lượng vectors: {vectorstore.index.ntotal}")
+    print_cache_stats(embeddings)
+    
+    return vectorstore
+
+
+def evaluate_updated_index(vectorstore: FAISS, base_name: str) -> Dict:
+    """
+    Đo lại recall/latency cho index vừa cập nhật incremental (số liệu của lần build
+    trước không còn đúng sau khi xóa / thêm vector)
+    
+    Vector gốc lấy lại từ embedding cache (toàn hit, không gọi model) thay vì
+    reconstruct từ index - với sq8 vector reconstruct đã bị lượng tử hóa
+    
+    Returns:
+        Dict thông tin index cho config JSON (giữ params / train_seconds của lần build trước)
+    """
+    previous = load_index_info(base_name)
+    index_type = previous.get("index_type", FAISS_INDEX_TYPE)
+    
+    print(f"\n🧪 Đang đo lại recall/latency của index đã cập nhật...")
+    documents = get_ordered_documents(vectorstore)
+    vectors = np.asarray(
+        vectorstore.embeddings.embed_documents([doc.page_content for doc in documents]),
+        dtype=np.float32
+    )
+    report = evaluate_index(vectorstore.index, vectors)
+    
+    info = describe_index(
+        index_type, previous.get("params", {}), vectorstore.index, previous.get("train_seconds", 0.0), report
+    )
+    info["updated_incrementally"] = True
+    print_report(index_type, info)
+    return info
+
+
 # ============================================================================
 # STEP 4: LƯU FAISS INDEX VÀ METADATA
 # ============================================================================
 
-def save_vector_store(vectorstore: FAISS, base_name: str):
+def load_index_info(base_name: str) -> Dict:
+    """Thông tin FAISS index (mục "faiss_index") trong config JSON đã lưu"""
+    config_path = OUTPUT_DIR / f"{base_name}_config.json"
+    if not config_path.exists():
+        return {}
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("faiss_index", {})
+
+
+def save_vector_store(
+    vectorstore: FAISS,
+    base_name: str,
+    index_info: Dict,
+    stale_ids: List[str] = None
+):
     """
     Lưu FAISS vector store ra file để sử dụng lại
     
     Args:
         vectorstore: FAISS vector store cần lưu
         base_name: Tên cơ sở cho các file output
+        index_info: Thông tin loại index, tham số và báo cáo recall/latency
+        stale_ids: Incremental update - id thêm mới/thay đổi; câu của các record khác
+            lấy lại vector từ sentence_index/ cũ thay vì embed lại (None = full rebuild)
     """
     print(f"\n💾 Đang lưu FAISS index vào {OUTPUT_DIR}")
     
     # Đường dẫn lưu index
     index_path = OUTPUT_DIR / base_name
+    start = time.perf_counter()
+    
+    # Lưu FAISS index + columnar doc store (không dùng pickle)
+    save_vector_store_files(vectorstore, index_path)
+    
+    # Inverted index BM25 (build lại mỗi lần lưu, cùng thứ tự dòng với FAISS)
+    documents = get_ordered_documents(vectorstore)
+    bm25_meta = build_bm25_index(documents, index_path)
+    
+    # Tập dòng theo giá trị metadata (lọc trước khi search)
+    build_metadata_index(documents, index_path)
+    
+    # (luật, số điều) → dòng, cho query trích dẫn điều luật cụ thể
+    build_article_index(documents, index_path)
+    
+    # Embedding từng câu / khoản (qua embedding cache), giai đoạn 4 dùng để cắt context
+    sentence_meta = build_sentence_index(
+        documents, vectorstore.embeddings, index_path, EMBEDDING_MODEL_NAME, stale_ids=stale_ids
+    )
     
-    # Lưu FAISS index (bao gồm vectors và metadata)
-    vectorstore.save_local(str(index_path))
+    fingerprint = index_fingerprint(index_path)
+    elapsed_ms = (time.perf_counter() - start) * 1000
     
-    print(f"   ✓ Đã lưu index tại: {index_path}")
+    print(f"   ✓ Đã lưu index tại: {index_path} ({elapsed_ms:.1f} ms)")
     print(f"   📁 Files được tạo:")
     print(f"      - index.faiss: FAISS vector index")
-    print(f"      - index.pkl: Document metadata và docstore")
+    print(f"      - docstore.bin / docstore_offsets.npy / docstore.json: "
+          f"page_content + metadata dạng cột (memory-mapped khi load)")
+    print(f"      - bm25/: BM25 inverted index ({bm25_meta['vocab_size']} terms, "
+          f"{bm25_meta['n_postings']} postings, memory-mapped khi load)")
+    print(f"      - metadata_index/: tập dòng theo doc_id / chapter_no / article_no / ... (metadata filter)")
+    print(f"      - article_index.json: (luật, số điều) → dòng (tra cứu trực tiếp \"Điều N Luật ...\")")
+    print(f"      - sentence_index/: embedding {sentence_meta['n_sentences']} câu / khoản "
+          f"(float16, memory-mapped khi load, {sentence_meta['n_embedded']} câu vừa embed)")
     
     # Lưu thông tin cấu hình để reference
     config = {
@@ -196,7 +545,9 @@ def save_vector_store(vectorstore: FAISS, base_name: str):
         "total_documents": vectorstore.index.ntotal,
         "vector_dimension": vectorstore.index.d,
         "input_files": INPUT_FILES,
-        "created_at": "2026-01-31"
+        "created_at": "2026-01-31",
+        "index_fingerprint": fingerprint,
+        "faiss_index": index_info
     }
     
     config_path = OUTPUT_DIR / f"{base_name}_config.json"
@@ -220,19 +571,11 @@ def test_vector_store(base_name: str):
     print(f"\n🧪 Test load vector store và retrieval...")
     
     # Khởi tạo lại embedding model
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': EMBEDDING_DEVICE},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    embeddings = create_embeddings()
     
-    # Load FAISS index từ disk
+    # Load FAISS index từ disk (doc store memory-mapped, không cần pickle)
     index_path = OUTPUT_DIR / base_name
-    vectorstore = FAISS.load_local(
-        str(index_path),
-        embeddings,
-        allow_dangerous_deserialization=True  # Cần thiết để load pickle
-    )
+    vectorstore = load_vector_store(index_path, embeddings)
     
     print(f"   ✓ Đã load thành công vector store")
     print(f"   📊 Số vectors: {vectorstore.index.ntotal}")
@@ -258,7 +601,49 @@ def test_vector_store(base_name: str):
 def main():
     """
     Main function - Chạy toàn bộ ingestion pipeline
+    
+    Dùng `--incremental` để chỉ embed lại các record thêm mới/thay đổi
+    so với manifest của lần chạy trước (tự động full rebuild nếu chưa có manifest)
     """
+    global EMBEDDING_NUM_WORKERS, EMBEDDING_BATCH_SIZE, EMBEDDING_TOKEN_BUDGET, FAISS_INDEX_TYPE
+    
+    parser = argparse.ArgumentParser(description="Ingestion pipeline: JSON → FAISS")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Chỉ cập nhật các record thay đổi dựa trên manifest"
+    )
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        default=FAISS_INDEX_TYPE,
+        help="Loại FAISS index cần build"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=EMBEDDING_NUM_WORKERS,
+        help="Số worker process dùng để embed song song"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBEDDING_BATCH_SIZE,
+        help="Batch size khi embed trong mỗi worker"
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=EMBEDDING_TOKEN_BUDGET,
+        help="Số token tối đa mỗi batch động khi bucketing theo độ dài (0 = tắt)"
+    )
+    args = parser.parse_args()
+    
+    EMBEDDING_NUM_WORKERS = args.workers
+    EMBEDDING_BATCH_SIZE = args.batch_size
+    EMBEDDING_TOKEN_BUDGET = args.token_budget
+    FAISS_INDEX_TYPE = args.index_type
+    
     print("=" * 80)
     print("INGESTION PIPELINE - GIAI ĐOẠN 2")
     print("Đưa dữ liệu luật pháp vào Vector Database")
@@ -285,11 +670,34 @@ def main():
         print("   Vui lòng kiểm tra lại đường dẫn files và nội dung dữ liệu.")
         return
     
-    # Bước 3: Tạo embeddings và vector store
-    vectorstore = create_vector_store(documents)
+    # Loại index phải dùng được với kích thước corpus (VD: IVF-PQ cần corpus lớn) - kiểm tra trước khi embed
+    try:
+        check_index_type(FAISS_INDEX_TYPE, len(documents))
+    except ValueError as e:
+        print(f"\n❌ Lỗi: {e}")
+        return
+    
+    # Bước 3: Tạo embeddings và vector store (incremental nếu có manifest)
+    plan = plan_incremental_update(documents, FAISS_INDEX_NAME) if args.incremental else None
+    
+    if plan is not None and not any(plan):
+        print("\n✅ Index đã khớp với dữ liệu đầu vào, không cần cập nhật!")
+        return
+    
+    if plan is not None:
+        vectorstore = apply_incremental_update(documents, FAISS_INDEX_NAME, *plan)
+        index_info = evaluate_updated_index(vectorstore, FAISS_INDEX_NAME)
+    else:
+        vectorstore = create_vector_store(documents)
+        index_info = build_index(vectorstore, FAISS_INDEX_TYPE, FAISS_INDEX_PARAMS)
+    
+    # Bước 4: Lưu vector store + manifest
+    stale_ids = plan[0] + plan[1] if plan is not None else None
+    save_vector_store(vectorstore, FAISS_INDEX_NAME, index_info, stale_ids=stale_ids)
+    save_manifest(build_manifest(documents), FAISS_INDEX_NAME)
     
-    # Bước 4: Lưu vector store
-    save_vector_store(vectorstore, FAISS_INDEX_NAME)
+    # Tắt process pool embedding (mỗi worker đang giữ 1 bản model trong RAM)
+    vectorstore.embeddings.close()
     
     # Bước 5: Test load và retrieval
     test_vector_store(FAISS_INDEX_NAME)
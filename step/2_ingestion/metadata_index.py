@@ -0,0 +1,208 @@
+"""
+METADATA INDEX - Tập dòng (row id) theo từng giá trị metadata, để lọc trước khi search
+Ví dụ filter:
+    {"doc_name": "Luật Thủy lợi"}                           # ==
+    {"doc_id": ["05/VBHN-VPQH", "04/VBHN-VPQH"]}            # in {...}
+    {"doc_id": "VBHN_06_2020", "chapter_no": "III"}         # AND giữa các cột
+
+Build 1 lần lúc ingestion, lưu trong thư mục metadata_index/ cạnh index.faiss:
+- metadata_index.json     : giá trị (đã sắp xếp) của từng cột
+- {cột}_ptr.npy           : int64 (số giá trị + 1) - dòng của giá trị v nằm ở [ptr[v], ptr[v+1])
+- {cột}_rows.npy          : int64 - các dòng (tăng dần trong từng giá trị)
+
+Tập dòng của filter được dùng trực tiếp trong FAISS (IDSelector) và BM25
+(chỉ chấm điểm các dòng được chọn), không phải lọc sau khi search.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+METADATA_INDEX_DIR = "metadata_index"
+METADATA_INDEX_META = "metadata_index.json"
+
+# Các cột metadata có thể dùng để lọc
+FILTER_COLUMNS = ["doc_id", "doc_name", "chapter_no", "article_no", "type"]
+
+# Số filter đã resolve được giữ lại (filter lặp lại không phải tính lại)
+RESOLVED_CACHE_SIZE = 128
+
+MetadataFilter = Dict[str, Union[str, Iterable[str]]]
+
+
+def normalize_filter(metadata_filter: Optional[MetadataFilter]) -> Optional[Dict[str, List[str]]]:
+    """
+    Chuẩn hóa filter: {cột: [giá trị, ...]} (giá trị dạng str, đã sắp xếp)
+
+    Returns:
+        None nếu không có filter
+    """
+    if not metadata_filter:
+        return None
+
+    normalized = {}
+    for column, values in metadata_filter.items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Không lọc được theo cột: {column} (chọn trong {FILTER_COLUMNS})")
+        if isinstance(values, (str, int)):
+            values = [values]
+        normalized[column] = sorted({str(value) for value in values})
+    return dict(sorted(normalized.items()))
+
+
+def matches_filter(metadata: Dict, metadata_filter: Optional[MetadataFilter]) -> bool:
+    """Document có thỏa filter không (dùng cho retriever không hỗ trợ lọc trước)"""
+    normalized = normalize_filter(metadata_filter)
+    if normalized is None:
+        return True
+    return all(str(metadata.get(column, "")) in values for column, values in normalized.items())
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def _save_array(path: Path, values: np.ndarray):
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+
+def build_metadata_index(documents: List[Document], index_path: Path) -> Dict:
+    """
+    Build và lưu tập dòng theo giá trị cho FILTER_COLUMNS
+
+    Args:
+        documents: Documents theo đúng thứ tự vector trong FAISS
+        index_path: Thư mục index (metadata_index/ được tạo bên trong)
+
+    Returns:
+        Dict meta đã lưu
+    """
+    out_path = Path(index_path) / METADATA_INDEX_DIR
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    columns = {}
+    for column in FILTER_COLUMNS:
+        values = np.asarray([str(doc.metadata.get(column, "")) for doc in documents], dtype=object)
+        unique, inverse = np.unique(values, return_inverse=True)
+
+        # Stable sort: dòng trong mỗi giá trị vẫn tăng dần
+        rows = np.argsort(inverse, kind="stable").astype(np.int64)
+        ptr = np.zeros(len(unique) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(inverse, minlength=len(unique)), out=ptr[1:])
+
+        _save_array(out_path / f"{column}_ptr.npy", ptr)
+        _save_array(out_path / f"{column}_rows.npy", rows)
+        columns[column] = unique.tolist()
+
+    meta = {"count": len(documents), "columns": columns}
+    meta_tmp = out_path / f"{METADATA_INDEX_META}.tmp"
+    with open(meta_tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    os.replace(meta_tmp, out_path / METADATA_INDEX_META)
+
+    return meta
+
+
+# ============================================================================
+# LOAD + RESOLVE
+# ============================================================================
+
+class MetadataIndex:
+    """Tập dòng theo giá trị metadata (memory-mapped, chỉ đọc)"""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        with open(path / METADATA_INDEX_META, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        self.count = meta["count"]
+        self.values = meta["columns"]
+        self._value_idx = {
+            column: {value: idx for idx, value in enumerate(values)}
+            for column, values in self.values.items()
+        }
+        self._ptr = {column: np.load(path / f"{column}_ptr.npy", mmap_mode='r') for column in self.values}
+        self._rows = {column: np.load(path / f"{column}_rows.npy", mmap_mode='r') for column in self.values}
+
+        self._resolved = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, index_path: Path) -> Optional["MetadataIndex"]:
+        """Mở metadata_index/ trong thư mục index, None nếu index chưa có"""
+        path = Path(index_path) / METADATA_INDEX_DIR
+        if not (path / METADATA_INDEX_META).exists():
+            return None
+        return cls(path)
+
+    def _rows_for_value(self, column: str, value: str) -> np.ndarray:
+        idx = self._value_idx[column].get(value)
+        if idx is None:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self._rows[column][self._ptr[column][idx]:self._ptr[column][idx + 1]])
+
+    def rows_for(self, metadata_filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        """
+        Các dòng (int64, tăng dần) thỏa filter
+
+        Trong 1 cột: OR giữa các giá trị; giữa các cột: AND.
+
+        Returns:
+            None nếu không có filter (= tất cả các dòng)
+        """
+        normalized = normalize_filter(metadata_filter)
+        if normalized is None:
+            return None
+
+        key = json.dumps(normalized, ensure_ascii=False)
+        with self._lock:
+            if key in self._resolved:
+                self._resolved.move_to_end(key)
+                return self._resolved[key]
+
+        rows = None
+        for column, values in normalized.items():
+            if column not in self.values:
+                raise ValueError(f"Index chưa có metadata cho cột: {column}")
+            column_rows = np.unique(np.concatenate([self._rows_for_value(column, value) for value in values]))
+            rows = column_rows if rows is None else np.intersect1d(rows, column_rows, assume_unique=True)
+
+        with self._lock:
+            self._resolved[key] = rows
+            while len(self._resolved) > RESOLVED_CACHE_SIZE:
+                self._resolved.popitem(last=False)
+        return rows
+
+
+# ============================================================================
+# BUILD CHO INDEX ĐÃ CÓ
+# ============================================================================
+
+if __name__ == "__main__":
+    import sys
+
+    from doc_store import ColumnarDocStore
+
+    # Build metadata_index/ cho index đã lưu mà không cần chạy lại ingestion
+    index_path = Path(sys.argv[1]) if len(sys.argv) > 1 else (
+        Path(__file__).parent / "output" / "law_documents_index"
+    )
+    store = ColumnarDocStore.open(index_path)
+    meta = build_metadata_index(list(store.iter_documents()), index_path)
+    for column, values in meta["columns"].items():
+        print(f"   {column}: {len(values)} giá trị")
+    print(f"✅ Đã build metadata index cho {meta['count']} documents → {index_path / METADATA_INDEX_DIR}")
@@ -0,0 +1,334 @@
+"""
+PARALLEL EMBEDDING - Embed corpus bằng nhiều process
+Chia documents thành các shard, mỗi worker load model 1 lần rồi embed
+các shard được giao; kết quả được ghép lại đúng thứ tự ban đầu
+
+Process pool được tạo ở lần embed đầu tiên và giữ lại cho các lần embed sau
+của cùng engine (documents, câu cho sentence index, ...) → model chỉ load
+1 lần mỗi worker; gọi close() (hoặc dùng with) để tắt pool.
+
+Length bucketing: khi có token_budget, texts được sắp theo số token và gom
+thành các batch có kích thước động (số text × độ dài dài nhất ≤ token_budget)
+để giảm tính toán lãng phí cho padding
+"""
+
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Mỗi worker nhận khoảng SHARDS_PER_WORKER shard để cân bằng tải
+SHARDS_PER_WORKER = 4
+
+# Độ dài tối đa (token) mà model xử lý, phần dư bị cắt
+# (paraphrase-multilingual-MiniLM-L12-v2: max_seq_length = 128)
+MAX_SEQ_LENGTH = 128
+
+
+# ============================================================================
+# MODEL HELPERS
+# ============================================================================
+
+def _load_model(model_name: str, device: str):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name, device=device)
+
+
+def _encode(model, texts: List[str], batch_size: int, normalize: bool) -> np.ndarray:
+    """Encode giống HuggingFaceEmbeddings (thay "\\n" bằng khoảng trắng)"""
+    texts = [text.replace("\n", " ") for text in texts]
+    vectors = model.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=normalize,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+    return np.asarray(vectors, dtype=np.float32)
+
+
+# ============================================================================
+# LENGTH BUCKETING
+# ============================================================================
+
+def load_tokenizer(model_name: str):
+    """
+    Tokenizer của model (chỉ cần để đếm token, không load model)
+
+    Returns:
+        Tokenizer, hoặc None nếu không load được (thiếu transformers / không tải được)
+    """
+    try:
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(model_name)
+    except (ImportError, OSError):
+        return None
+
+
+def count_tokens(texts: List[str], tokenizer=None, max_seq_length: int = MAX_SEQ_LENGTH) -> np.ndarray:
+    """
+    Đếm số token (đã tính special tokens, cắt ở max_seq_length) cho mỗi text
+
+    Dùng tokenizer của model (load_tokenizer); tokenizer None → ước lượng theo số từ.
+    """
+    if tokenizer is not None:
+        encoded = tokenizer(
+            [text.replace("\n", " ") for text in texts],
+            add_special_tokens=True,
+            truncation=False
+        )["input_ids"]
+        lengths = np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(texts))
+    else:
+        # ~1.5 subword token / từ tiếng Việt với tokenizer XLM-R + 2 special tokens
+        lengths = np.fromiter(
+            (int(len(text.split()) * 1.5) + 2 for text in texts),
+            dtype=np.int64,
+            count=len(texts)
+        )
+
+    return np.minimum(lengths, max_seq_length)
+
+
+def build_length_buckets(lengths: np.ndarray, token_budget: int) -> List[np.ndarray]:
+    """
+    Sắp các text theo số token và gom thành batch động
+
+    Mỗi batch thỏa: len(batch) × max(lengths trong batch) ≤ token_budget
+    (tối thiểu 1 text / batch)
+
+    Args:
+        lengths: Số token của từng text
+        token_budget: Tổng số token (kể cả padding) tối đa của 1 batch
+
+    Returns:
+        List mảng chỉ số (theo thứ tự gốc) của từng batch
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches = []
+    current = []
+
+    for idx in order:
+        # order tăng dần → text mới luôn là text dài nhất của batch
+        if current and (len(current) + 1) * lengths[idx] > token_budget:
+            batches.append(np.asarray(current, dtype=np.int64))
+            current = []
+        current.append(idx)
+
+    if current:
+        batches.append(np.asarray(current, dtype=np.int64))
+
+    return batches
+
+
+def padding_efficiency(lengths: np.ndarray, batches: List[np.ndarray]) -> float:
+    """Tỷ lệ token thật / token sau khi padding theo từng batch"""
+    real = sum(int(lengths[batch].sum()) for batch in batches)
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in batches)
+    return real / padded if padded else 1.0
+
+
+def fixed_batches(n_texts: int, batch_size: int) -> List[np.ndarray]:
+    """Batch cố định theo thứ tự file (để so sánh với length bucketing)"""
+    return [
+        np.arange(start, min(start + batch_size, n_texts))
+        for start in range(0, n_texts, batch_size)
+    ]
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+# Model được load 1 lần cho mỗi worker process (trong initializer)
+_WORKER_MODEL = None
+_WORKER_NORMALIZE = True
+_WORKER_BATCH_SIZE = 32
+
+
+def _init_worker(model_name: str, device: str, normalize: bool, batch_size: int, num_threads: int):
+    """Initializer của worker: giới hạn số thread torch và load model"""
+    global _WORKER_MODEL, _WORKER_NORMALIZE, _WORKER_BATCH_SIZE
+
+    # Tránh oversubscription: tổng số thread của các worker ≈ số core
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+
+    _WORKER_MODEL = _load_model(model_name, device)
+    _WORKER_NORMALIZE = normalize
+    _WORKER_BATCH_SIZE = batch_size
+
+
+def _embed_shard(shard: Tuple[int, List[List[str]], bool]) -> Tuple[int, List[np.ndarray]]:
+    """
+    Embed 1 shard trong worker, trả về kèm chỉ số shard để ghép lại
+
+    Shard = (chỉ số, list các batch, dynamic). Với batch động mỗi batch được
+    encode đúng 1 lượt; ngược lại dùng batch_size cố định.
+    """
+    shard_idx, batches, dynamic = shard
+    outputs = [
+        _encode(_WORKER_MODEL, texts, len(texts) if dynamic else _WORKER_BATCH_SIZE, _WORKER_NORMALIZE)
+        for texts in batches
+    ]
+    return shard_idx, outputs
+
+
+# ============================================================================
+# ENGINE
+# ============================================================================
+
+class ShardedEmbeddingEngine(Embeddings):
+    """
+    Embeddings chạy song song trên process pool
+
+    - num_workers = 1: embed ngay trong process hiện tại (không tạo pool)
+    - token_budget: bật length bucketing với batch động (None = batch cố định)
+    - embed_query luôn chạy trong process hiện tại
+    - Pool được giữ giữa các lần embed, tắt bằng close() / with
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cpu",
+        normalize: bool = True,
+        num_workers: int = 1,
+        batch_size: int = 32,
+        token_budget: Optional[int] = None
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.normalize = normalize
+        self.num_workers = max(1, num_workers)
+        self.batch_size = batch_size
+        self.token_budget = token_budget
+        self._local_model = None
+        self._pool = None
+        self._tokenizer = None
+        self._tokenizer_loaded = False
+
+    def __enter__(self) -> "ShardedEmbeddingEngine":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Tắt process pool (nếu đã tạo)"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """Process pool, tạo ở lần dùng đầu tiên (mỗi worker load model trong initializer)"""
+        if self._pool is None:
+            num_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.device, self.normalize, self.batch_size, num_threads)
+            )
+        return self._pool
+
+    @property
+    def tokenizer(self):
+        """Tokenizer cho length bucketing, load 1 lần mỗi engine (None → ước lượng theo số từ)"""
+        if not self._tokenizer_loaded:
+            self._tokenizer = load_tokenizer(self.model_name)
+            self._tokenizer_loaded = True
+        return self._tokenizer
+
+    @property
+    def local_model(self):
+        if self._local_model is None:
+            self._local_model = _load_model(self.model_name, self.device)
+        return self._local_model
+
+    def split_shards(self, texts: List[str]) -> List[Tuple[int, List[List[str]], bool]]:
+        """Chia texts thành các shard liên tiếp (giữ thứ tự), mỗi shard 1 batch"""
+        n_shards = min(len(texts), self.num_workers * SHARDS_PER_WORKER)
+        shard_size = math.ceil(len(texts) / n_shards)
+        return [
+            (shard_idx, [texts[start:start + shard_size]], False)
+            for shard_idx, start in enumerate(range(0, len(texts), shard_size))
+        ]
+
+    def split_bucketed_shards(
+        self,
+        texts: List[str],
+        batches: List[np.ndarray]
+    ) -> List[Tuple[int, List[List[str]], bool]]:
+        """Gom các batch động thành shard (mỗi shard vài batch liên tiếp)"""
+        n_shards = min(len(batches), self.num_workers * SHARDS_PER_WORKER)
+        per_shard = math.ceil(len(batches) / n_shards)
+        return [
+            (shard_idx, [[texts[i] for i in batch] for batch in batches[start:start + per_shard]], True)
+            for shard_idx, start in enumerate(range(0, len(batches), per_shard))
+        ]
+
+    def _run_shards(self, shards: List[Tuple[int, List[List[str]], bool]]) -> List[np.ndarray]:
+        """Chạy các shard (song song nếu có nhiều worker), trả về output theo thứ tự"""
+        if self.num_workers == 1 or len(shards) == 1:
+            model = self.local_model
+            return [
+                _encode(model, texts, len(texts) if dynamic else self.batch_size, self.normalize)
+                for _, batches, dynamic in shards
+                for texts in batches
+            ]
+
+        results = dict(self.pool.map(_embed_shard, shards))
+
+        # Ghép theo thứ tự shard → thứ tự xác định, không phụ thuộc worker nào xong trước
+        return [output for idx in range(len(shards)) for output in results[idx]]
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, trả về ma trận float32 (n, dim) theo đúng thứ tự đầu vào
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        start = time.perf_counter()
+
+        if self.token_budget:
+            lengths = count_tokens(texts, self.tokenizer)
+            batches = build_length_buckets(lengths, self.token_budget)
+            outputs = self._run_shards(self.split_bucketed_shards(texts, batches))
+
+            # Trả vector về đúng vị trí gốc
+            vectors = np.empty((len(texts), outputs[0].shape[1]), dtype=np.float32)
+            for batch, output in zip(batches, outputs):
+                vectors[batch] = output
+            mode = f"token_budget={self.token_budget}, {len(batches)} batches"
+        else:
+            vectors = np.concatenate(self._run_shards(self.split_shards(texts)))
+            mode = f"batch_size={self.batch_size}"
+
+        elapsed = time.perf_counter() - start
+        print(f"   ⚡ Embedded {len(texts)} docs trong {elapsed:.2f}s "
+              f"({len(texts) / elapsed:.1f} docs/sec, {self.num_workers} workers, {mode})")
+
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return _encode(self.local_model, [text], 1, self.normalize)[0].tolist()
@@ -0,0 +1,220 @@
+"""
+SENTENCE INDEX - Embedding từng câu / khoản của mỗi điều, tính sẵn lúc ingestion
+Giai đoạn 4 dùng để chọn các câu liên quan nhất tới query khi điều luật quá dài cho prompt
+(cosine với embedding query đã có từ bước retrieval → không gọi model thêm lúc query).
+
+Build 1 lần lúc ingestion, lưu trong thư mục sentence_index/ cạnh index.faiss:
+- sentence_index.json : embedding model, số câu, id của từng dòng (thứ tự FAISS)
+- vectors.npy         : float16 (số câu, dim), đã chuẩn hóa L2 - memory-mapped khi load
+- offsets.npy         : int64 (số dòng + 1) - câu của dòng r nằm ở [offsets[r], offsets[r+1])
+
+Nội dung câu không lưu: lúc query tách lại page_content bằng cùng split_sentences
+(số câu không khớp → bỏ qua vector của dòng đó).
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SENTENCE_INDEX_DIR = "sentence_index"
+SENTENCE_INDEX_META = "sentence_index.json"
+FORMAT_VERSION = 1
+
+# Tách câu sau . ; : ! ? (mỗi khoản "1. ...", điểm "a) ...;" thành 1 câu)
+SENTENCE_SPLIT = re.compile(r"(?<=[.;:!?])\s+")
+# Mảnh chỉ là số khoản / tiêu đề điều ("1.", "Điều 6.") → gộp với câu sau
+SENTENCE_LEAD = re.compile(r"^(?:Điều\s+)?\d+[a-zđ]?\.$")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Tách 1 điều thành các câu / khoản / điểm"""
+    sentences = []
+    lead = ""
+    for piece in SENTENCE_SPLIT.split(text.strip()):
+        if not piece:
+            # page_content rỗng: không có câu nào (không embed chuỗi rỗng)
+            continue
+        if SENTENCE_LEAD.match(piece):
+            lead = f"{lead}{piece} "
+            continue
+        sentences.append(lead + piece)
+        lead = ""
+    if lead:
+        sentences.append(lead.strip())
+    return sentences
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def build_sentence_index(
+    documents: List[Document],
+    embeddings: Embeddings,
+    index_path: Path,
+    embedding_model: str = "",
+    stale_ids: Optional[Iterable[str]] = None
+) -> Dict:
+    """
+    Embed và lưu các câu của mọi document
+
+    Args:
+        documents: Documents theo đúng thứ tự vector trong FAISS
+        embeddings: Embedding model (cùng model với index, nên đi qua embedding cache)
+        index_path: Thư mục index
+        embedding_model: Tên model (ghi vào meta để kiểm tra lúc load)
+        stale_ids: Incremental update - chỉ embed câu của các id này, các dòng khác
+            lấy lại vector từ sentence_index/ đã lưu (None = embed lại toàn bộ)
+
+    Returns:
+        Meta đã lưu (kèm "n_embedded": số câu vừa embed)
+    """
+    previous = SentenceIndex.open(index_path, embedding_model) if stale_ids is not None else None
+    stale_ids = set(stale_ids or ())
+
+    sentences = []
+    offsets = [0]
+    # Mỗi dòng: vector cũ (reuse) hoặc None (cần embed)
+    blocks = []
+    to_embed = []
+    for doc in documents:
+        doc_sentences = split_sentences(doc.page_content)
+        sentences.extend(doc_sentences)
+        offsets.append(len(sentences))
+        reused = None
+        if previous is not None and str(doc.metadata.get("id", "")) not in stale_ids:
+            reused = previous.vectors_for(doc, len(doc_sentences))
+        blocks.append(reused)
+        if reused is None:
+            to_embed.extend(doc_sentences)
+    if not sentences:
+        # dim = 0 → vectors.npy (0, 0), lúc query nhân với embedding sẽ lỗi shape
+        raise ValueError("Không có câu nào để build sentence index (documents rỗng)")
+
+    dim = previous.vectors.shape[1] if previous is not None else 0
+    embedded = np.zeros((0, dim), dtype=np.float32)
+    if to_embed:
+        embedded = np.asarray(embeddings.embed_documents(to_embed), dtype=np.float32)
+        embedded /= np.maximum(np.linalg.norm(embedded, axis=1, keepdims=True), 1e-12)
+        dim = embedded.shape[1]
+
+    # Ghép lại theo thứ tự dòng (vector reuse là float16 → float32 → float16 không mất gì)
+    vectors = np.zeros((len(sentences), dim), dtype=np.float32)
+    cursor = 0
+    for row, reused in enumerate(blocks):
+        start, end = offsets[row], offsets[row + 1]
+        if reused is None:
+            vectors[start:end] = embedded[cursor:cursor + end - start]
+            cursor += end - start
+        else:
+            vectors[start:end] = reused
+
+    out_dir = Path(index_path) / SENTENCE_INDEX_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name, array in (("vectors", vectors.astype(np.float16)), ("offsets", np.asarray(offsets, dtype=np.int64))):
+        tmp_path = out_dir / f"{name}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, out_dir / f"{name}.npy")
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "embedding_model": embedding_model,
+        "n_sentences": len(sentences),
+        "dim": int(dim),
+        "ids": [str(doc.metadata.get("id", "")) for doc in documents],
+    }
+    tmp_path = out_dir / f"{SENTENCE_INDEX_META}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, out_dir / SENTENCE_INDEX_META)
+
+    return {**meta, "n_embedded": len(to_embed)}
+
+
+# ============================================================================
+# LOAD
+# ============================================================================
+
+class SentenceIndex:
+    """Vector câu (memory-mapped) theo id document"""
+
+    def __init__(self, vectors: np.ndarray, offsets: np.ndarray, ids: List[str]):
+        self.vectors = vectors
+        self.offsets = offsets
+        self.rows = {doc_id: row for row, doc_id in enumerate(ids) if doc_id}
+
+    @classmethod
+    def open(cls, index_path: Path, embedding_model: str = "") -> Optional["SentenceIndex"]:
+        """
+        Mở sentence_index/ trong thư mục index
+
+        Returns:
+            None nếu chưa build, khác format hoặc build bằng embedding model khác
+            (in cảnh báo: context packing khi đó chỉ chấm câu bằng trùng từ)
+        """
+        index_dir = Path(index_path) / SENTENCE_INDEX_DIR
+        meta_path = index_dir / SENTENCE_INDEX_META
+        if not meta_path.exists():
+            print(f"⚠️  Chưa có {index_dir} - build: python step/2_ingestion/sentence_index.py")
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            print(f"⚠️  {index_dir} khác format (version {meta.get('version')} ≠ {FORMAT_VERSION}) "
+                  f"- build lại: python step/2_ingestion/sentence_index.py")
+            return None
+        if embedding_model and meta.get("embedding_model") and meta["embedding_model"] != embedding_model:
+            print(f"⚠️  Sentence index dành cho {meta['embedding_model']}, không dùng cho {embedding_model}")
+            return None
+        return cls(
+            np.load(index_dir / "vectors.npy", mmap_mode="r"),
+            np.load(index_dir / "offsets.npy", mmap_mode="r"),
+            meta["ids"]
+        )
+
+    def vectors_for(self, doc: Document, n_sentences: int) -> Optional[np.ndarray]:
+        """
+        Vector (float32, đã chuẩn hóa) các câu của doc
+
+        Returns:
+            None nếu doc không có trong index hoặc số câu khác n_sentences (nội dung đã đổi)
+        """
+        row = self.rows.get(str(doc.metadata.get("id", "")))
+        if row is None:
+            return None
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        if end - start != n_sentences:
+            return None
+        return np.asarray(self.vectors[start:end], dtype=np.float32)
+
+
+# ============================================================================
+# BUILD CHO INDEX ĐÃ CÓ
+# ============================================================================
+
+if __name__ == "__main__":
+    import sys
+
+    from doc_store import ColumnarDocStore
+    from ingestion_pipeline import EMBEDDING_MODEL_NAME, create_embeddings
+
+    # Build sentence_index/ cho index đã lưu mà không cần chạy lại ingestion
+    index_path = Path(sys.argv[1]) if len(sys.argv) > 1 else (
+        Path(__file__).parent / "output" / "law_documents_index"
+    )
+    store = ColumnarDocStore.open(index_path)
+    meta = build_sentence_index(
+        list(store.iter_documents()), create_embeddings(), index_path, EMBEDDING_MODEL_NAME
+    )
+    print(f"✅ Đã build sentence index: {meta['n_sentences']} câu → {index_path / SENTENCE_INDEX_DIR}")
@@ -0,0 +1,96 @@
+"""
+TEST - Incremental update: xóa + thêm vector tại chỗ rồi search
+Không cần embedding model: dùng DeterministicFakeEmbedding
+
+Chạy:
+    python -m pytest -q test_incremental_update.py
+    python test_incremental_update.py
+"""
+
+import json
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import ingestion_pipeline
+from index_factory import INCREMENTAL_INDEX_TYPES, build_faiss_index
+
+
+N_DOCS = 80
+DOCS = [
+    Document(page_content=f"Điều {i}. Nội dung điều {i}", metadata={"id": f"id{i}"})
+    for i in range(N_DOCS)
+]
+
+
+def delete_and_search(index_type: str) -> list:
+    """
+    Xóa 1 record ở đầu index, thêm lại với nội dung mới (như apply_incremental_update),
+    rồi search bằng chính vector của từng record
+
+    Returns:
+        Các (id mong đợi, id tìm được) không khớp
+    """
+    embeddings = DeterministicFakeEmbedding(size=16)
+    vectorstore = FAISS.from_documents(DOCS, embeddings, ids=[doc.metadata["id"] for doc in DOCS])
+    vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    vectorstore.index, _, _ = build_faiss_index(vectors, index_type, {"nprobe": 1024})
+
+    vectorstore.delete(ids=["id0"])
+    changed = "Điều 0. Nội dung đã sửa"
+    vectorstore.add_texts([changed], [{"id": "id0"}], ids=["id0"])
+
+    mismatches = []
+    for doc in DOCS[1:] + [Document(page_content=changed, metadata={"id": "id0"})]:
+        found = vectorstore.similarity_search_by_vector(embeddings.embed_query(doc.page_content), k=1)
+        if found[0].metadata["id"] != doc.metadata["id"]:
+            mismatches.append((doc.metadata["id"], found[0].metadata["id"]))
+    return mismatches
+
+
+def test_incremental_delete_search_keeps_labels():
+    for index_type in INCREMENTAL_INDEX_TYPES:
+        assert delete_and_search(index_type) == [], index_type
+
+
+def test_ivf_flat_delete_search_breaks_labels():
+    # Lý do IVF phải full rebuild: remove_ids không dồn label, LangChain vẫn đánh số lại
+    assert delete_and_search("ivf_flat") != []
+
+
+def test_plan_forces_full_rebuild_except_flat_storage(tmp_path):
+    saved = ingestion_pipeline.OUTPUT_DIR, ingestion_pipeline.FAISS_INDEX_TYPE
+    ingestion_pipeline.OUTPUT_DIR = tmp_path
+    try:
+        (tmp_path / "index").mkdir()
+        faiss.write_index(faiss.IndexFlatL2(16), str(tmp_path / "index" / "index.faiss"))
+        ingestion_pipeline.save_manifest(ingestion_pipeline.build_manifest(DOCS), "index")
+
+        for index_type in ["flat", "sq8", "ivf_flat", "ivf_pq", "hnsw"]:
+            with open(tmp_path / "index_config.json", 'w', encoding='utf-8') as f:
+                json.dump({"faiss_index": {"index_type": index_type}}, f)
+            ingestion_pipeline.FAISS_INDEX_TYPE = index_type
+            plan = ingestion_pipeline.plan_incremental_update(DOCS[1:], "index")
+            if index_type in INCREMENTAL_INDEX_TYPES:
+                assert plan == ([], [], ["id0"]), index_type
+            else:
+                assert plan is None, index_type
+    finally:
+        ingestion_pipeline.OUTPUT_DIR, ingestion_pipeline.FAISS_INDEX_TYPE = saved
+
+
+if __name__ == "__main__":
+    import inspect
+    import tempfile
+    from pathlib import Path
+
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            if "tmp_path" in inspect.signature(test).parameters:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    test(Path(tmp_dir))
+            else:
+                test()
+            print(f"✅ {name}")
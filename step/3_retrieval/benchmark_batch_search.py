@@ -0,0 +1,81 @@
+"""
+BENCHMARK - Hybrid retrieval: từng query (invoke) vs batch_search
+Queries lấy từ câu đầu các điều luật (khác nhau, không trùng cache).
+Embedding model dùng trực tiếp (không qua embedding cache) để đo đúng
+chi phí encode.
+
+Chạy:
+    python benchmark_batch_search.py --n-queries 1000
+"""
+
+import argparse
+import time
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from hybrid_retrieval import (
+    EMBEDDING_DEVICE,
+    EMBEDDING_MODEL,
+    FAISS_INDEX_PATH,
+    TOP_K,
+    batch_search,
+    create_bm25_retriever,
+    create_dense_retriever,
+    create_hybrid_retriever,
+    load_vector_store
+)
+
+
+def build_queries(vectorstore, n_queries: int, n_words: int = 12):
+    """n_queries câu hỏi khác nhau từ đầu nội dung các điều luật"""
+    store = vectorstore.docstore
+    queries = []
+    for i in range(n_queries):
+        row = i % len(store)
+        words = store.get_field(row, "page_content").split()
+        offset = (i // len(store)) * n_words
+        queries.append(" ".join(words[offset:offset + n_words]) or words[0])
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid retrieval: invoke vs batch_search")
+    parser.add_argument("--n-queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': EMBEDDING_DEVICE}
+    )
+    vectorstore = load_vector_store(FAISS_INDEX_PATH, embeddings)
+    hybrid_retriever = create_hybrid_retriever(
+        create_bm25_retriever(vectorstore),
+        create_dense_retriever(vectorstore)
+    )
+    queries = build_queries(vectorstore, args.n_queries)
+
+    # Warm-up (load model, build ma trận BM25)
+    hybrid_retriever.invoke(queries[0])
+
+    start = time.perf_counter()
+    sequential = [hybrid_retriever.invoke(query) for query in queries]
+    sequential_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = batch_search(hybrid_retriever, queries, TOP_K)
+    batch_seconds = time.perf_counter() - start
+
+    same = sum(
+        [doc.id for doc in a] == [doc.id for doc in b]
+        for a, b in zip(sequential, batched)
+    )
+
+    print(f"\n📊 {len(queries)} queries")
+    print(f"   invoke từng query: {len(queries) / sequential_seconds:.1f} queries/sec")
+    print(f"   batch_search:      {len(queries) / batch_seconds:.1f} queries/sec "
+          f"({sequential_seconds / batch_seconds:.1f}x)")
+    print(f"   Kết quả giống nhau: {same}/{len(queries)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+FUSION - Gộp kết quả của nhiều retrievers theo record id
+- rrf    : Reciprocal Rank Fusion, score = Σ weight / (rrf_k + rank)
+- minmax : chuẩn hóa điểm gốc của từng retriever về [0, 1] rồi cộng theo weight
+- zscore : chuẩn hóa (x - mean) / std rồi cộng theo weight
+
+Điểm gốc (càng lớn càng liên quan) đọc từ metadata[SCORE_KEY] do retriever gắn;
+retriever không gắn điểm thì dùng thứ hạng. Chỉ top-k được lấy ra (heap), điểm
+fused gắn vào metadata[FUSED_SCORE_KEY] của documents trả về.
+"""
+
+import heapq
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+FUSION_METHODS = ["rrf", "minmax", "zscore"]
+
+# Hằng số k của RRF (Cormack et al., 2009)
+RRF_K = 60
+
+SCORE_KEY = "score"
+FUSED_SCORE_KEY = "fused_score"
+
+
+def doc_key(doc: Document) -> str:
+    """Khóa merge: record id (Document.id hoặc metadata id), nội dung nếu không có id"""
+    return doc.id or doc.metadata.get("id") or doc.page_content
+
+
+def _raw_scores(docs: List[Document]) -> np.ndarray:
+    """Điểm gốc của 1 danh sách kết quả (không có điểm → dùng -rank)"""
+    return np.asarray(
+        [doc.metadata.get(SCORE_KEY, -rank) for rank, doc in enumerate(docs)],
+        dtype=np.float64
+    )
+
+
+def _normalize(scores: np.ndarray, method: str) -> np.ndarray:
+    if method == "minmax":
+        span = scores.max() - scores.min()
+        return (scores - scores.min()) / span if span > 0 else np.ones_like(scores)
+    std = scores.std()
+    return (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+
+
+def fuse(
+    result_lists: List[List[Document]],
+    weights: List[float],
+    k: Optional[int] = None,
+    method: str = "rrf",
+    rrf_k: int = RRF_K
+) -> List[Document]:
+    """
+    Gộp kết quả của các retrievers
+
+    Args:
+        result_lists: Kết quả (đã xếp hạng) của từng retriever
+        weights: Weight của từng retriever
+        k: Số documents trả về (None = tất cả)
+        method: Một trong FUSION_METHODS
+        rrf_k: Hằng số k của RRF
+
+    Returns:
+        Documents theo điểm fused giảm dần, metadata có FUSED_SCORE_KEY
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Fusion không hỗ trợ: {method} (chọn trong {FUSION_METHODS})")
+
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+
+    for result, weight in zip(result_lists, weights):
+        if not result:
+            continue
+
+        if method == "rrf":
+            contributions = [weight / (rrf_k + rank + 1) for rank in range(len(result))]
+        else:
+            contributions = (weight * _normalize(_raw_scores(result), method)).tolist()
+
+        for doc, contribution in zip(result, contributions):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + contribution
+            docs.setdefault(key, doc)
+
+    n_results = len(scores) if k is None else k
+    top = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    return [
+        docs[key].model_copy(update={"metadata": {**docs[key].metadata, FUSED_SCORE_KEY: score}})
+        for key, score in top
+    ]
@@ -4,16 +4,35 @@ Kết hợp BM25 (keyword search) và Dense Embedding (semantic search)
 để tìm kiếm thông minh hơn trên dữ liệu văn bản luật
 """
 
+import asyncio
+import json
 import os
-from typing import List
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional
 from pathlib import Path
-from langchain_huggingface import HuggingFaceEmbeddings
+import faiss
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.callbacks import CallbackManagerForRetrieverRun
-from pydantic import Field
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun
+)
+from pydantic import ConfigDict, Field
+
+# Dùng chung các module của giai đoạn 2 (embedding cache, ...)
+sys.path.insert(0, str(Path(__file__).parent.parent / "2_ingestion"))
+
+from bm25_index import BM25Index, PersistedBM25Retriever
+from doc_store import ColumnarDocStore, get_all_documents, index_version, load_vector_store
+from embedding_cache import create_cached_embeddings, print_query_cache_stats
+from metadata_index import MetadataFilter, MetadataIndex, matches_filter, normalize_filter
+from fusion import RRF_K, SCORE_KEY, fuse
+from result_cache import DEFAULT_RESULT_CACHE_PATH, HybridResultCache, result_cache_key
 
 
 # ==================== ENSEMBLE RETRIEVER IMPLEMENTATION ====================
@@ -22,39 +41,350 @@ class EnsembleRetriever(BaseRetriever):
     """
     Custom Ensemble Retriever kết hợp nhiều retrievers với weights
     Thay thế cho langchain.retrievers.EnsembleRetriever (không còn tồn tại trong version mới)
+    
+    Các retrievers chạy song song (thread pool cho sync, asyncio cho async)
+    → latency hybrid ≈ retriever chậm nhất thay vì tổng các retriever.
+    Retriever nào quá `timeout` giây hoặc raise exception (VD: lỗi IO của FAISS / BM25)
+    bị bỏ qua, kết quả chỉ gồm các retriever còn lại.
+    
+    Kết quả gộp theo record id bằng RRF (hoặc chuẩn hóa điểm minmax / zscore),
+    chỉ trả về top `k`, điểm fused nằm trong metadata["fused_score"].
+    
+    Có `result_cache`: query lặp lại (cùng tham số, cùng index) trả kết quả từ
+    cache, không chạy retriever nào. Kết quả bị thiếu do timeout / lỗi không được cache.
+    
+    `filter` (metadata, xem metadata_index.py) được chuyển xuống từng retriever để lọc
+    trước khi search; kết quả vẫn được kiểm tra lại cho retriever không hỗ trợ lọc.
     """
     
     retrievers: List[BaseRetriever] = Field(description="List of retrievers to ensemble")
     weights: List[float] = Field(description="Weights for each retriever")
+    timeout: Optional[float] = Field(default=None, description="Timeout (giây) cho mỗi retriever")
+    k: Optional[int] = Field(default=None, description="Số documents trả về (None = tất cả)")
+    fusion: str = Field(default="rrf", description="Cách gộp: rrf, minmax, zscore")
+    rrf_k: int = Field(default=RRF_K, description="Hằng số k của RRF")
+    result_cache: Optional[HybridResultCache] = Field(default=None, description="Cache kết quả top-k")
+    index_fingerprint: str = Field(default="", description="Fingerprint index (thuộc key cache)")
+    
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun = None,
+        filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        """Lấy documents từ tất cả retrievers (song song) và gộp theo weights"""
+        
+        key = self._cache_key(query, self.k, filter)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        futures = [
+            _get_executor().submit(
+                retriever.invoke,
+                query,
+                _child_config(run_manager, i),
+                **_filter_kwargs(filter)
+            )
+            for i, retriever in enumerate(self.retrievers)
+        ]
+        
+        # Các retriever chạy cùng lúc → 1 deadline chung = timeout cho từng retriever
+        wait(futures, timeout=self.timeout)
+        
+        results = []
+        complete = True
+        for i, future in enumerate(futures):
+            if not future.done():
+                # Retriever chậm vẫn chạy nền, kết quả của nó bị bỏ qua
+                future.cancel()
+                _warn_timeout(self.retrievers[i], self.timeout)
+                results.append([])
+                complete = False
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                _warn_error(self.retrievers[i], e)
+                results.append([])
+                complete = False
+        
+        merged = self._merge(results, metadata_filter=filter)
+        if complete:
+            self._cache_put(key, merged)
+        return merged
+    
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun = None,
+        filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        """Async: chạy các retrievers cùng lúc bằng asyncio"""
+        
+        key = self._cache_key(query, self.k, filter)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        incomplete = []
+        
+        async def run(i, retriever):
+            try:
+                return await asyncio.wait_for(
+                    retriever.ainvoke(query, _child_config(run_manager, i), **_filter_kwargs(filter)),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                _warn_timeout(retriever, self.timeout)
+                incomplete.append(i)
+                return []
+            except Exception as e:
+                _warn_error(retriever, e)
+                incomplete.append(i)
+                return []
+        
+        results = await asyncio.gather(
+            *(run(i, retriever) for i, retriever in enumerate(self.retrievers))
+        )
+        
+        merged = self._merge(results, metadata_filter=filter)
+        if not incomplete:
+            self._cache_put(key, merged)
+        return merged
+    
+    def _cache_key(
+        self, query: str, k: Optional[int], metadata_filter: Optional[MetadataFilter] = None
+    ) -> Optional[str]:
+        """Key cache: query chuẩn hóa + mọi tham số ảnh hưởng tới kết quả + fingerprint index"""
+        if self.result_cache is None:
+            return None
+        return result_cache_key(query, {
+            "k": k,
+            "filter": normalize_filter(metadata_filter),
+            "weights": self.weights,
+            "fusion": self.fusion,
+            "rrf_k": self.rrf_k,
+            "retriever_k": [getattr(retriever, "k", None) for retriever in self.retrievers],
+            "index": self.index_fingerprint,
+        })
+    
+    def _cache_get(self, key: Optional[str]) -> Optional[List[Document]]:
+        if key is None:
+            return None
+        return self.result_cache.get(key)
+    
+    def _cache_put(self, key: Optional[str], documents: List[Document]):
+        if key is not None:
+            self.result_cache.put(key, documents)
+    
+    def _merge(
+        self,
+        results: List[List[Document]],
+        k: Optional[int] = None,
+        metadata_filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        """Gộp kết quả theo record id (xem fusion.py), chỉ giữ top-k"""
+        if metadata_filter:
+            # Retriever đã lọc trước thì không bỏ gì; retriever không hỗ trợ filter
+            # (vd. BM25Retriever dựng lại khi index chưa có bm25/) được lọc tại đây
+            results = [[doc for doc in result if matches_filter(doc.metadata, metadata_filter)]
+                       for result in results]
+        return fuse(
+            results,
+            self.weights,
+            k=self.k if k is None else k,
+            method=self.fusion,
+            rrf_k=self.rrf_k
+        )
+    
+    def batch_search(
+        self,
+        queries: List[str],
+        k: Optional[int] = None,
+        filter: Optional[MetadataFilter] = None
+    ) -> List[List[Document]]:
+        """
+        Tìm kiếm nhiều query cùng lúc
+        
+        Mỗi retriever xử lý cả batch 1 lần (Dense: 1 lần encode + 1 lần index.search,
+        BM25: 1 phép nhân ma trận thưa), sau đó gộp kết quả theo từng query.
+        Không áp dụng timeout (dùng cho job offline).
+        
+        Args:
+            queries: Danh sách câu hỏi
+            k: Số documents mỗi query (None = self.k)
+            filter: Metadata filter áp dụng cho mọi query
+        
+        Returns:
+            Danh sách kết quả, cùng thứ tự với queries
+        """
+        queries = list(queries)
+        k = self.k if k is None else k
+        
+        keys = [self._cache_key(query, k, filter) for query in queries]
+        outputs = [self._cache_get(key) for key in keys]
+        
+        # Chỉ chạy retrievers cho các query chưa có trong cache
+        pending = [i for i, output in enumerate(outputs) if output is None]
+        if not pending:
+            return outputs
+        pending_queries = [queries[i] for i in pending]
+        
+        futures = [
+            _get_executor().submit(retriever.batch, pending_queries, **_filter_kwargs(filter))
+            for retriever in self.retrievers
+        ]
+        per_retriever = [future.result() for future in futures]
+        
+        for position, i in enumerate(pending):
+            outputs[i] = self._merge([results[position] for results in per_retriever], k, filter)
+            self._cache_put(keys[i], outputs[i])
+        
+        return outputs
+    
+    def batch(self, inputs: List[str], config=None, **kwargs) -> List[List[Document]]:
+        """Runnable.batch → batch_search (vectorized)"""
+        return self.batch_search(inputs, filter=kwargs.get("filter"))
+
+
+class DenseRetriever(BaseRetriever):
+    """
+    Dense retriever trên FAISS vector store, gắn điểm vào metadata["score"]
+    (= -L2 distance, càng lớn càng gần) để fusion chuẩn hóa được điểm
+    
+    filter (metadata) được đưa vào FAISS qua IDSelector → top-k luôn nằm trong
+    tập dòng được chọn, không bị hụt như khi lọc sau.
+    """
+    
+    vectorstore: FAISS
+    k: int = 4
+    metadata_index: Optional[MetadataIndex] = None
+    
+    model_config = ConfigDict(arbitrary_types_allowed=True)
     
     def _get_relevant_documents(
-        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun = None,
+        filter: Optional[MetadataFilter] = None
     ) -> List[Document]:
-        """Lấy documents từ tất cả retrievers và merge theo weights"""
-        
-        # Lấy kết quả từ mỗi retriever
-        all_results = []
-        for retriever, weight in zip(self.retrievers, self.weights):
-            docs = retriever.invoke(query)
-            # Gán score dựa trên position và weight
-            for i, doc in enumerate(docs):
-                score = weight * (1.0 / (i + 1))  # Reciprocal rank
-                all_results.append((doc, score))
-        
-        # Merge documents với cùng content
-        doc_scores = {}
-        for doc, score in all_results:
-            doc_id = doc.page_content[:100]  # Dùng 100 ký tự đầu làm key
-            if doc_id in doc_scores:
-                doc_scores[doc_id] = (doc, doc_scores[doc_id][1] + score)
-            else:
-                doc_scores[doc_id] = (doc, score)
-        
-        # Sort theo score giảm dần
-        sorted_docs = sorted(doc_scores.values(), key=lambda x: x[1], reverse=True)
-        
-        # Trả về documents (không có score)
-        return [doc for doc, _ in sorted_docs]
+        rows = self._filter_rows(filter)
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        return self.search_by_vectors([embedding], rows=rows)[0]
+    
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun = None,
+        filter: Optional[MetadataFilter] = None
+    ) -> List[Document]:
+        # Mặc định của BaseRetriever không chuyển filter xuống bản sync
+        return await run_in_executor(
+            None, self._get_relevant_documents, query,
+            run_manager=run_manager.get_sync() if run_manager else None, filter=filter
+        )
+    
+    def batch(self, inputs: List[str], config=None, **kwargs) -> List[List[Document]]:
+        """Encode tất cả queries trong 1 lần gọi model, 1 lần index.search cho cả batch"""
+        inputs = list(inputs)
+        if not inputs:
+            return []
+        rows = self._filter_rows(kwargs.get("filter"))
+        return self.search_by_vectors(self.vectorstore.embeddings.embed_documents(inputs), rows=rows)
+    
+    def _filter_rows(self, metadata_filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        if not metadata_filter:
+            return None
+        if self.metadata_index is None:
+            raise ValueError("Index chưa có metadata_index/ - chạy python metadata_index.py để build")
+        return self.metadata_index.rows_for(metadata_filter)
+    
+    def search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        rows: Optional[np.ndarray] = None
+    ) -> List[List[Document]]:
+        """
+        Tìm k documents gần nhất cho từng vector query (1 lần index.search)
+        
+        Args:
+            rows: Chỉ tìm trong các dòng (FAISS id) này, None = tất cả
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vectors)
+        
+        if rows is None:
+            distances, indices = self.vectorstore.index.search(vectors, self.k)
+        elif len(rows) == 0:
+            return [[] for _ in vectors]
+        else:
+            params = _search_params(self.vectorstore.index, rows)
+            distances, indices = self.vectorstore.index.search(vectors, self.k, params=params)
+        
+        results = []
+        for row_distances, row_indices in zip(distances, indices):
+            docs = []
+            for distance, i in zip(row_distances, row_indices):
+                # FAISS trả -1 khi không đủ k kết quả
+                if i == -1:
+                    continue
+                doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[i])
+                docs.append(
+                    doc.model_copy(update={"metadata": {**doc.metadata, SCORE_KEY: -float(distance)}})
+                )
+            results.append(docs)
+        return results
+
+
+# Thread pool dùng chung cho các lần query (tạo 1 lần, không tạo lại mỗi query)
+_EXECUTOR = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(max_workers=RETRIEVER_THREADS, thread_name_prefix="retriever")
+    return _EXECUTOR
+
+
+def _child_config(run_manager, i: int) -> Optional[dict]:
+    """Callbacks con cho retriever thứ i (để tracing thấy từng retriever)"""
+    if run_manager is None:
+        return None
+    return {"callbacks": run_manager.get_child(tag=f"retriever_{i + 1}")}
+
+
+def _filter_kwargs(metadata_filter: Optional[MetadataFilter]) -> dict:
+    """Chỉ truyền filter khi có (retriever không nhận filter vẫn gọi được như cũ)"""
+    return {"filter": metadata_filter} if metadata_filter else {}
+
+
+def _search_params(index, rows: np.ndarray):
+    """SearchParameters của FAISS chỉ xét các id trong rows, giữ nprobe / efSearch của index"""
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(rows, dtype=np.int64))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def _warn_timeout(retriever: BaseRetriever, timeout: float):
+    print(f"⚠️  {type(retriever).__name__} quá {timeout}s - bỏ qua kết quả của retriever này")
+
+
+def _warn_error(retriever: BaseRetriever, error: Exception):
+    print(f"⚠️  {type(retriever).__name__} lỗi ({type(error).__name__}: {error}) "
+          f"- bỏ qua kết quả của retriever này")
 
 # ==================== CẤU HÌNH ====================
 
@@ -70,27 +400,38 @@ EMBEDDING_DEVICE = "cpu"
 BM25_WEIGHT = 0.5  # 50% BM25
 DENSE_WEIGHT = 0.5  # 50% Dense embedding
 
+# Cách gộp kết quả: "rrf" (Reciprocal Rank Fusion), "minmax" hoặc "zscore" (chuẩn hóa điểm)
+FUSION_METHOD = "rrf"
+
 # Số kết quả trả về
 TOP_K = 5
 
+# Timeout (giây) cho mỗi retriever trong hybrid; None = chờ đến khi xong
+RETRIEVER_TIMEOUT = 10.0
+
+# Số thread chạy song song các retrievers
+RETRIEVER_THREADS = 4
+
+# Cache kết quả hybrid: RAM luôn bật khi RESULT_CACHE = True,
+# RESULT_CACHE_DISK = True → lưu thêm ra SQLite (giữ qua các lần khởi động)
+RESULT_CACHE = True
+RESULT_CACHE_DISK = True
+
 # ==================== KHỞI TẠO RETRIEVERS ====================
 
 def load_faiss_vectorstore():
     """Load FAISS vector store từ giai đoạn 2"""
     print("📂 Đang load FAISS index...")
     
-    # Khởi tạo embedding model
-    embeddings = HuggingFaceEmbeddings(
+    # Khởi tạo embedding model (có cache trên đĩa cho các query lặp lại)
+    embeddings = create_cached_embeddings(
         model_name=EMBEDDING_MODEL,
-        model_kwargs={'device': EMBEDDING_DEVICE}
+        device=EMBEDDING_DEVICE,
+        normalize=False
     )
     
-    # Load FAISS index
-    vectorstore = FAISS.load_local(
-        str(FAISS_INDEX_PATH),
-        embeddings,
-        allow_dangerous_deserialization=True
-    )
+    # Load FAISS index (doc store memory-mapped, không cần pickle)
+    vectorstore = load_vector_store(FAISS_INDEX_PATH, embeddings)
     
     print(f"✅ Đã load {vectorstore.index.ntotal} documents từ FAISS")
     return vectorstore
@@ -103,8 +444,20 @@ def create_bm25_retriever(vectorstore):
     """
     print("\n🔍 Đang tạo BM25 Retriever...")
     
-    # Lấy tất cả documents từ FAISS docstore
-    documents = list(vectorstore.docstore._dict.values())
+    # Ưu tiên inverted index đã build lúc ingestion (memory-mapped, không tokenize lại corpus)
+    bm25_index = BM25Index.open(FAISS_INDEX_PATH)
+    if bm25_index is not None and isinstance(vectorstore.docstore, ColumnarDocStore):
+        bm25_retriever = PersistedBM25Retriever(
+            index=bm25_index,
+            docstore=vectorstore.docstore,
+            k=TOP_K,
+            metadata_index=MetadataIndex.open(FAISS_INDEX_PATH)
+        )
+        print(f"✅ BM25 Retriever đã sẵn sàng với {bm25_index.n_docs} documents (index đã lưu)")
+        return bm25_retriever
+    
+    # Index cũ chưa có bm25/: dựng lại từ documents trong FAISS docstore
+    documents = get_all_documents(vectorstore)
     
     # Tạo BM25 retriever
     bm25_retriever = BM25Retriever.from_documents(documents)
@@ -121,25 +474,66 @@ def create_dense_retriever(vectorstore):
     """
     print("\n🧠 Đang tạo Dense Retriever...")
     
-    # Convert FAISS vectorstore thành retriever
-    dense_retriever = vectorstore.as_retriever(
-        search_kwargs={"k": TOP_K}
+    # FAISS retriever có gắn điểm (cần cho fusion chuẩn hóa điểm)
+    dense_retriever = DenseRetriever(
+        vectorstore=vectorstore,
+        k=TOP_K,
+        metadata_index=MetadataIndex.open(FAISS_INDEX_PATH)
     )
     
     print(f"✅ Dense Retriever đã sẵn sàng")
     return dense_retriever
 
 
-def create_hybrid_retriever(bm25_retriever, dense_retriever):
+def load_index_fingerprint(index_path=FAISS_INDEX_PATH):
+    """
+    Fingerprint của lần build index, đọc từ law_documents_index_config.json
+    (config cũ chưa có fingerprint → dựa trên kích thước + mtime của file index)
+    """
+    index_path = Path(index_path)
+    config_path = index_path.parent / f"{index_path.name}_config.json"
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            fingerprint = json.load(f).get("index_fingerprint")
+        if fingerprint:
+            return fingerprint
+    return index_version(index_path)
+
+
+def create_result_cache(index_fingerprint=""):
+    """
+    Cache kết quả hybrid theo cấu hình RESULT_CACHE / RESULT_CACHE_DISK
+    
+    Args:
+        index_fingerprint: Fingerprint index hiện tại (dòng trên đĩa của index khác bị xóa)
+    """
+    if not RESULT_CACHE:
+        return None
+    return HybridResultCache(
+        disk_path=DEFAULT_RESULT_CACHE_PATH if RESULT_CACHE_DISK else None,
+        index_fingerprint=index_fingerprint
+    )
+
+
+def create_hybrid_retriever(bm25_retriever, dense_retriever, result_cache=None):
     """
     Kết hợp BM25 và Dense retriever thành Ensemble Retriever
     Hybrid = BM25 + Dense để tận dụng ưu điểm của cả hai
+    
+    Args:
+        result_cache: Cache kết quả (None → tạo theo RESULT_CACHE / RESULT_CACHE_DISK)
     """
     print("\n🔗 Đang tạo Hybrid Retriever...")
     
+    fingerprint = load_index_fingerprint()
     ensemble_retriever = EnsembleRetriever(
         retrievers=[bm25_retriever, dense_retriever],
-        weights=[BM25_WEIGHT, DENSE_WEIGHT]
+        weights=[BM25_WEIGHT, DENSE_WEIGHT],
+        timeout=RETRIEVER_TIMEOUT,
+        k=TOP_K,
+        fusion=FUSION_METHOD,
+        result_cache=result_cache if result_cache is not None else create_result_cache(fingerprint),
+        index_fingerprint=fingerprint
     )
     
     print(f"✅ Hybrid Retriever đã sẵn sàng (BM25: {BM25_WEIGHT*100}%, Dense: {DENSE_WEIGHT*100}%)")
@@ -160,12 +554,23 @@ def search_with_dense(dense_retriever, query):
     return results
 
 
-def search_with_hybrid(hybrid_retriever, query):
-    """Tìm kiếm với Hybrid (kết hợp BM25 + Dense)"""
-    results = hybrid_retriever.invoke(query)
+def search_with_hybrid(hybrid_retriever, query, filter=None):
+    """
+    Tìm kiếm với Hybrid (kết hợp BM25 + Dense)
+    
+    Args:
+        filter: Metadata filter, vd. {"doc_name": "Luật Thủy lợi"}
+                hoặc {"doc_id": [...], "chapter_no": "III"}
+    """
+    results = hybrid_retriever.invoke(query, filter=filter)
     return results
 
 
+def batch_search(hybrid_retriever, queries, k=TOP_K, filter=None):
+    """Tìm kiếm Hybrid cho nhiều queries cùng lúc (job đánh giá, bulk QA)"""
+    return hybrid_retriever.batch_search(queries, k, filter=filter)
+
+
 def format_results(results, query):
     """Format và hiển thị kết quả tìm kiếm"""
     print(f"\n{'='*80}")
@@ -238,6 +643,11 @@ def main():
     print("\n" + "="*80)
     print("✅ HOÀN THÀNH DEMO")
     print("="*80)
+    print_query_cache_stats(vectorstore.embeddings)
+    if hybrid_retriever.result_cache is not None:
+        stats = hybrid_retriever.result_cache.stats()
+        print(f"📦 Result cache: {stats['memory_hits']} hits RAM / {stats['disk_hits']} hits đĩa / "
+              f"{stats['misses']} misses (hit ratio {stats['hit_ratio']:.1%}) | {stats['disk_entries']} dòng trên đĩa")
     
     return hybrid_retriever, vectorstore
 
@@ -0,0 +1,185 @@
+"""
+RESULT CACHE - Cache kết quả top-k cuối cùng của hybrid retrieval
+Query lặp lại bỏ qua toàn bộ encode, FAISS, BM25 và fusion.
+
+Key: sha256(query đã chuẩn hóa, k, weights, cách fusion, k của từng retriever,
+fingerprint của index) → index được build lại thì key tự đổi.
+
+2 tầng:
+- RAM: LRU (mặc định RESULT_CACHE_MAX_ENTRIES entries)
+- Đĩa (tùy chọn): SQLite, giữ lại qua các lần khởi động desktop app / CLI;
+  tối đa RESULT_CACHE_MAX_DISK_ENTRIES dòng (bỏ dòng lâu không dùng nhất),
+  dòng của index cũ (fingerprint khác) bị xóa khi mở cache
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from embedding_cache import normalize_query
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_RESULT_CACHE_PATH = SCRIPT_DIR / "output" / "result_cache.sqlite"
+
+RESULT_CACHE_MAX_ENTRIES = 512
+RESULT_CACHE_MAX_DISK_ENTRIES = 5000
+
+
+def result_cache_key(query: str, params: Dict) -> str:
+    """Key cache từ query đã chuẩn hóa + tham số retrieval + fingerprint index"""
+    payload = json.dumps(
+        {"query": normalize_query(query), **params},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _serialize(documents: List[Document]) -> str:
+    return json.dumps(
+        [{"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata} for doc in documents],
+        ensure_ascii=False
+    )
+
+
+def _deserialize(data: str) -> List[Document]:
+    return [Document(**item) for item in json.loads(data)]
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class HybridResultCache:
+    """
+    Cache 2 tầng (RAM + SQLite tùy chọn) cho danh sách documents đã fuse
+
+    Lưu dạng JSON (page_content + metadata), mỗi lần get trả về Documents mới
+    nên caller sửa metadata không ảnh hưởng cache.
+
+    Tầng đĩa: last_used được cập nhật khi ghi và khi đọc từ đĩa (hit trong RAM
+    không ghi xuống SQLite), quá max_disk_entries → xóa dòng có last_used cũ nhất.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        disk_path: Optional[Path] = None,
+        index_fingerprint: str = "",
+        max_disk_entries: int = RESULT_CACHE_MAX_DISK_ENTRIES
+    ):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.index_fingerprint = index_fingerprint
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        if disk_path is not None:
+            disk_path = Path(disk_path)
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(results)")]
+            if columns and "last_used" not in columns:
+                # Bảng của bản cũ (không có fingerprint / last_used) → bỏ, cache tự đầy lại
+                self._conn.execute("DROP TABLE results")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    documents TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            # Kết quả của index cũ không bao giờ được dùng lại (key chứa fingerprint)
+            self._conn.execute("DELETE FROM results WHERE fingerprint != ?", (index_fingerprint,))
+            self._evict_disk()
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return _deserialize(data)
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT documents FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return _deserialize(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, documents: List[Document]):
+        data = _serialize(documents)
+        with self._lock:
+            self._remember(key, data)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, documents, fingerprint, last_used) VALUES (?, ?, ?, ?)",
+                    (key, data, self.index_fingerprint, time.time())
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def _evict_disk(self):
+        """Giữ tối đa max_disk_entries dòng trên đĩa (bỏ dòng last_used cũ nhất)"""
+        self._conn.execute(
+            "DELETE FROM results WHERE key IN "
+            "(SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def _remember(self, key: str, data: str):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM results")
+                self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "entries": len(self._memory),
+                "disk_entries": (
+                    self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                    if self._conn is not None else 0
+                ),
+            }
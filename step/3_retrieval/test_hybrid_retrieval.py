@@ -0,0 +1,125 @@
+"""
+TEST - EnsembleRetriever khi 1 retriever lỗi hoặc quá timeout
+Không cần embedding model / index: dùng retriever giả
+
+Chạy:
+    python -m pytest -q test_hybrid_retrieval.py
+    python test_hybrid_retrieval.py
+"""
+
+import asyncio
+import time
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from hybrid_retrieval import EnsembleRetriever
+from result_cache import HybridResultCache
+
+
+class StaticRetriever(BaseRetriever):
+    """Luôn trả về cùng danh sách documents"""
+
+    documents: List[Document]
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return list(self.documents)
+
+
+class FailingRetriever(BaseRetriever):
+    """Giả lập lỗi IO của FAISS / BM25"""
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        raise OSError("index.faiss: Input/output error")
+
+
+class SlowRetriever(BaseRetriever):
+    """Chậm hơn timeout của ensemble"""
+
+    delay: float = 0.5
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        time.sleep(self.delay)
+        return []
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        await asyncio.sleep(self.delay)
+        return []
+
+
+DOCS = [
+    Document(id=f"D{i}", page_content=f"Điều {i}", metadata={"id": f"D{i}"})
+    for i in range(1, 4)
+]
+
+
+def make_ensemble(broken: BaseRetriever) -> EnsembleRetriever:
+    return EnsembleRetriever(
+        retrievers=[StaticRetriever(documents=DOCS), broken],
+        weights=[0.5, 0.5],
+        timeout=0.1,
+        k=3,
+        result_cache=HybridResultCache()
+    )
+
+
+def test_failing_retriever_degrades_sync():
+    ensemble = make_ensemble(FailingRetriever())
+    results = ensemble.invoke("đê điều")
+    assert [doc.id for doc in results] == ["D1", "D2", "D3"]
+    # Kết quả thiếu 1 retriever → không được cache
+    assert ensemble.result_cache.stats()["entries"] == 0
+
+
+def test_failing_retriever_degrades_async():
+    ensemble = make_ensemble(FailingRetriever())
+    results = asyncio.run(ensemble.ainvoke("đê điều"))
+    assert [doc.id for doc in results] == ["D1", "D2", "D3"]
+    assert ensemble.result_cache.stats()["entries"] == 0
+
+
+def test_slow_retriever_degrades():
+    ensemble = make_ensemble(SlowRetriever())
+    assert [doc.id for doc in ensemble.invoke("đê điều")] == ["D1", "D2", "D3"]
+    assert [doc.id for doc in asyncio.run(ensemble.ainvoke("đê điều"))] == ["D1", "D2", "D3"]
+    assert ensemble.result_cache.stats()["entries"] == 0
+
+
+def test_complete_result_is_cached():
+    ensemble = make_ensemble(StaticRetriever(documents=DOCS[:1]))
+    ensemble.invoke("đê điều")
+    assert ensemble.result_cache.stats()["entries"] == 1
+
+
+def test_disk_cache_bounded_and_purged_on_new_index(tmp_path):
+    path = tmp_path / "result_cache.sqlite"
+    cache = HybridResultCache(max_entries=2, disk_path=path, index_fingerprint="v1", max_disk_entries=3)
+    for i in range(5):
+        cache.put(f"q{i}", DOCS[:1])
+        time.sleep(0.001)
+    assert cache.stats()["disk_entries"] == 3
+    # Đọc q2 từ đĩa → q2 mới dùng gần nhất, lần ghi sau bỏ q3
+    assert cache.get("q2") is not None
+    cache.put("q5", DOCS[:1])
+    assert cache.get("q3") is None and cache.get("q2") is not None
+
+    reopened = HybridResultCache(disk_path=path, index_fingerprint="v1")
+    assert reopened.stats()["disk_entries"] == 3
+    rebuilt = HybridResultCache(disk_path=path, index_fingerprint="v2")
+    assert rebuilt.stats()["disk_entries"] == 0
+
+
+if __name__ == "__main__":
+    import inspect
+    import tempfile
+    from pathlib import Path
+
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            if "tmp_path" in inspect.signature(test).parameters:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    test(Path(tmp_dir))
+            else:
+                test()
+            print(f"✅ {name}")
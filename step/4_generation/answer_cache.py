@@ -0,0 +1,268 @@
+"""
+Semantic answer cache - Dùng lại câu trả lời cho câu hỏi gần trùng
+
+Cùng 1 câu hỏi pháp luật được hỏi theo nhiều cách ("Phạt bao nhiêu khi lấn chiếm đê?",
+"lấn chiếm đê bị xử phạt thế nào"), mỗi cách trước đây tốn 1 lần gọi Gemini.
+Cache lưu (embedding câu hỏi, câu trả lời, id các source, version index) và trả lại
+câu trả lời cũ khi cả 2 điều kiện đúng:
+1. cosine distance giữa 2 câu hỏi ≤ ANSWER_CACHE_MAX_DISTANCE
+2. tập source vừa retrieve trùng đủ với tập source của câu trả lời cũ
+   (Jaccard ≥ ANSWER_CACHE_MIN_SOURCE_OVERLAP) → câu trả lời dựa trên cùng các điều luật
+
+- Lưu trên đĩa (SQLite), vector của version index hiện tại nằm trong 1 ma trận RAM
+  (≤ ANSWER_CACHE_MAX_ENTRIES dòng) → tra cứu = 1 phép nhân ma trận
+- Quá ANSWER_CACHE_MAX_ENTRIES → xóa entry dùng lâu nhất (LRU)
+- Index đổi version (ingestion lại) → xóa các entry của version cũ
+
+Báo cáo hit rate + thời gian LLM tiết kiệm được (cộng dồn trên đĩa):
+    python step/4_generation/answer_cache.py
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SCRIPT_DIR = Path(__file__).parent
+ANSWER_CACHE_PATH = SCRIPT_DIR / "output" / "answer_cache.sqlite"
+
+ANSWER_CACHE_MAX_ENTRIES = 2000
+# Cosine distance (1 - cos) tối đa giữa câu hỏi mới và câu hỏi đã cache
+ANSWER_CACHE_MAX_DISTANCE = 0.08
+# Jaccard tối thiểu giữa tập source mới và tập source của câu trả lời đã cache
+ANSWER_CACHE_MIN_SOURCE_OVERLAP = 0.6
+
+
+def source_ids(docs) -> List[str]:
+    """Id (không trùng, giữ thứ tự) của các source documents"""
+    ids = []
+    for doc in docs:
+        doc_id = str(doc.metadata.get("id", ""))
+        if doc_id and doc_id not in ids:
+            ids.append(doc_id)
+    return ids
+
+
+def source_overlap(a: List[str], b: List[str]) -> float:
+    """Jaccard của 2 tập source id"""
+    a, b = set(a), set(b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo embedding câu hỏi, thread-safe
+
+    Dùng chung được giữa nhiều thread (desktop app, aquery_rag chạy retrieval trên thread pool)
+    """
+
+    def __init__(
+        self,
+        index_version: str,
+        cache_path: Path = ANSWER_CACHE_PATH,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_distance: float = ANSWER_CACHE_MAX_DISTANCE,
+        min_source_overlap: float = ANSWER_CACHE_MIN_SOURCE_OVERLAP
+    ):
+        self.index_version = index_version
+        self.cache_path = Path(cache_path)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.min_source_overlap = min_source_overlap
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                index_version TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                source_ids TEXT NOT NULL,
+                llm_seconds REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        # Entry của index cũ không còn đúng (điều luật / id có thể đã đổi)
+        self._conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,))
+        self._conn.commit()
+
+        # Thống kê của process hiện tại
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        self._load()
+
+    def _load(self):
+        """Nạp vector + source ids của version hiện tại vào RAM"""
+        rows = self._conn.execute(
+            "SELECT id, vector, source_ids FROM answers WHERE index_version = ? ORDER BY id",
+            (self.index_version,)
+        ).fetchall()
+        self._ids = [row[0] for row in rows]
+        self._sources = [json.loads(row[2]) for row in rows]
+        self._vectors = (
+            np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            if rows else None
+        )
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, embedding, docs) -> Optional[str]:
+        """
+        Câu trả lời đã cache cho câu hỏi (embedding) + các source vừa retrieve
+
+        Returns:
+            None nếu không có câu hỏi đủ gần với cùng tập source
+        """
+        query = self._unit(embedding)
+        sources = source_ids(docs)
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+
+            distances = 1.0 - self._vectors @ query
+            for position in np.argsort(distances):
+                if distances[position] > self.max_distance:
+                    break
+                if source_overlap(sources, self._sources[position]) < self.min_source_overlap:
+                    continue
+
+                entry_id = self._ids[position]
+                answer, llm_seconds = self._conn.execute(
+                    "SELECT answer, llm_seconds FROM answers WHERE id = ?", (entry_id,)
+                ).fetchone()
+                self._conn.execute(
+                    "UPDATE answers SET hits = hits + 1, last_used = ? WHERE id = ?",
+                    (time.time(), entry_id)
+                )
+                self._conn.commit()
+                self.hits += 1
+                self.saved_seconds += llm_seconds
+                return answer
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, embedding, docs, answer: str, llm_seconds: float):
+        """Lưu câu trả lời vừa sinh (llm_seconds = thời gian gọi LLM, dùng để tính thời gian tiết kiệm)"""
+        vector = self._unit(embedding)
+        sources = source_ids(docs)
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO answers (index_version, question, vector, answer, source_ids, llm_seconds, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (self.index_version, question, vector.tobytes(), answer,
+                 json.dumps(sources), float(llm_seconds), time.time())
+            )
+            self._ids.append(cursor.lastrowid)
+            self._sources.append(sources)
+            self._vectors = vector[None, :] if self._vectors is None else np.vstack([self._vectors, vector])
+
+            overflow = len(self._ids) - self.max_entries
+            if overflow > 0:
+                evicted = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM answers WHERE index_version = ? ORDER BY last_used LIMIT ?",
+                    (self.index_version, overflow)
+                )]
+                self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in evicted])
+                evicted = set(evicted)
+                keep = [position for position, entry_id in enumerate(self._ids) if entry_id not in evicted]
+                self._ids = [self._ids[position] for position in keep]
+                self._sources = [self._sources[position] for position in keep]
+                self._vectors = self._vectors[keep] if keep else None
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._ids, self._sources, self._vectors = [], [], None
+
+    def stats(self) -> Dict:
+        """Hit rate + thời gian tiết kiệm của process hiện tại, kèm số liệu cộng dồn trên đĩa"""
+        with self._lock:
+            total = self.hits + self.misses
+            stored_hits, stored_saved = self._conn.execute(
+                "SELECT COALESCE(SUM(hits), 0), COALESCE(SUM(hits * llm_seconds), 0) FROM answers"
+            ).fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "entries": len(self._ids),
+                "max_entries": self.max_entries,
+                "stored_hits": stored_hits,
+                "stored_saved_seconds": stored_saved,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def print_answer_cache_stats(answer_cache: Optional[SemanticAnswerCache]):
+    """In hit rate + thời gian LLM tiết kiệm được (nếu chain có cache)"""
+    if answer_cache is None:
+        return
+    stats = answer_cache.stats()
+    print(f"💾 Answer cache: {stats['hits']} hits / {stats['misses']} misses "
+          f"(hit rate {stats['hit_ratio']:.1%}) | tiết kiệm {stats['saved_seconds']:.1f}s gọi LLM | "
+          f"{stats['entries']}/{stats['max_entries']} entries")
+
+
+# ============================================================================
+# BÁO CÁO
+# ============================================================================
+
+if __name__ == "__main__":
+    cache_path = Path(sys.argv[1]) if len(sys.argv) > 1 else ANSWER_CACHE_PATH
+    if not cache_path.exists():
+        print(f"⚠️  Chưa có answer cache: {cache_path}")
+        sys.exit(0)
+
+    conn = sqlite3.connect(str(cache_path))
+    entries, hits, saved, avg_llm = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(hits * llm_seconds), 0), "
+        "COALESCE(AVG(llm_seconds), 0) FROM answers"
+    ).fetchone()
+    print(f"📦 {entries} câu trả lời đã cache (thời gian gọi LLM trung bình {avg_llm:.2f}s)")
+    # Mỗi entry là 1 lần gọi LLM, mỗi hit là 1 lần không cần gọi
+    total = entries + hits
+    print(f"🎯 Hit rate: {hits}/{total} ({hits / total if total else 0:.1%})")
+    print(f"⏱️  Tiết kiệm: {saved:.1f}s gọi LLM")
+    for question, entry_hits in conn.execute(
+        "SELECT question, hits FROM answers WHERE hits > 0 ORDER BY hits DESC LIMIT 10"
+    ):
+        print(f"   {entry_hits:>4}× {question}")
@@ -0,0 +1,213 @@
+"""
+BENCHMARK - Domain gate: vòng lặp substring cũ vs Aho-Corasick nguyên từ (+ centroid)
+
+Trên 1 bộ câu hỏi có nhãn (khác bộ câu mẫu dựng centroid trong domain_gate.py),
+đo µs / query và đếm:
+- từ chối nhầm : câu trong lĩnh vực bị chặn
+- bỏ sót       : câu ngoài lĩnh vực lọt qua gate (vẫn có thể bị chặn ở bước relevance)
+
+Centroid (thử nghiệm, chưa bật trong chain): bộ câu có nhãn chia đôi xen kẽ (split_fit_eval).
+Margin fit trên nửa "fit" (nhỏ nhất mà không từ chối nhầm câu trong lĩnh vực nào của nửa đó,
+cộng CENTROID_MARGIN_SLACK); từ chối nhầm / chặn của centroid chỉ đếm trên nửa "eval".
+Margin + số liệu trên nửa eval được lưu vào domain_gate.CENTROID_MARGIN_PATH.
+
+Chạy (từ thư mục gốc repo):
+    python step/4_generation/benchmark_domain_gate.py
+    python step/4_generation/benchmark_domain_gate.py --keywords-only   # không load embedding model
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR.parent / "2_ingestion"))
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import domain_gate as gate_module
+from domain_gate import (
+    CENTROID_IN_DOMAIN_EXAMPLES, CENTROID_MARGIN_PATH, CENTROID_OUT_OF_DOMAIN_EXAMPLES,
+    DomainGate, KeywordMatcher, OUT_OF_DOMAIN_KEYWORDS, save_centroid_margin
+)
+
+# Cộng thêm vào margin lớn nhất của câu trong lĩnh vực (câu hỏi thật đa dạng hơn bộ test)
+CENTROID_MARGIN_SLACK = 0.02
+
+
+# Danh sách + cách kiểm tra trước đây trong query_rag (để so sánh)
+LEGACY_KEYWORDS = [
+    "who are you", "ai la ai", "ban la ai", "maye la ai", "mai la ai",
+    "ban ten la gi", "ban la gì", "ai la ban", "tim ban",
+    "what is your name", "who built you", "tu tien huy",
+    "reckon", "recipe", "nau an", "nan", "anh la ai", "chi la ai",
+    "me la ai", "cha la ai", "con la gì",
+    "love", "dating", "em la ai", "yeu", "hen ho",
+    "joke", "tro chuyen", "tao la ai", "co la ai",
+    "xau", "xin", "van phong", "cong ty", "di lam"
+]
+
+# Câu trong lĩnh vực, nhiều câu chứa từ dễ khớp nhầm (nạn, xin, yêu cầu, công ty, văn phòng...)
+TEST_IN_DOMAIN = [
+    "Thủ tục xin giấy phép xả nước thải vào công trình thủy lợi",
+    "Yêu cầu đối với trạm quan trắc khí tượng thủy văn",
+    "Công ty khai thác công trình thủy lợi có trách nhiệm gì?",
+    "Xử lý tai nạn, sự cố đê điều trong mùa lũ",
+    "Văn phòng Ban chỉ đạo phòng chống thiên tai có nhiệm vụ gì?",
+    "Nan giải trong việc di dời dân khỏi vùng thiên tai được hỗ trợ thế nào?",
+    "Xin cấp phép hoạt động trong phạm vi bảo vệ đê điều",
+    "Người dân có nghĩa vụ gì khi có cảnh báo lũ quét?",
+    "Thẩm quyền phê duyệt quy hoạch thủy lợi",
+    "Điều 12 Luật Thủy lợi",
+    "khoản 2 Điều 5 Luật Đê điều",
+    "Mức xử phạt khi lấn chiếm hành lang thoát lũ",
+    "Dự báo, cảnh báo khí tượng thủy văn được cung cấp cho ai?",
+    "Trách nhiệm của Bộ Nông nghiệp trong quản lý đê điều",
+    "Kinh phí tu bổ đê lấy từ đâu?",
+    "Chính sách hỗ trợ người dân bị thiệt hại do thiên tai",
+    "Những hành vi nào bị cấm trong vùng phụ cận công trình thủy lợi?",
+    "Ai có quyền huy động lực lượng hộ đê?",
+    "Tiêu chuẩn an toàn đập, hồ chứa nước",
+    "Đi làm nhiệm vụ hộ đê có được hưởng chế độ gì không?",
+]
+
+TEST_OUT_OF_DOMAIN = [
+    "Who are you?",
+    "Bạn là ai vậy?",
+    "Ai là người tạo ra bạn, bạn tên là gì?",
+    "Kể chuyện cười đi",
+    "Công thức nấu ăn món gà rán",
+    "Tell me a joke",
+    "Tìm bạn hẹn hò ở Hà Nội",
+    "Thủ tục đăng ký xe máy mới mua",
+    "Tiền thai sản nhận được bao nhiêu tháng?",
+    "Phạt bao nhiêu khi vượt đèn đỏ?",
+    "Cách viết đơn xin nghỉ việc",
+    "Lãi suất ngân hàng hôm nay",
+    "Điều kiện vay mua nhà ở xã hội",
+    "Làm sao để giảm cân nhanh?",
+    "Thủ tục sang tên sổ đỏ",
+    "Cách đăng ký học bằng lái ô tô",
+    "Cho thuê nhà phải nộp thuế gì?",
+    "Hướng dẫn cài đặt Windows 11",
+    "Thời tiết Đà Lạt có đẹp không để đi du lịch?",
+    "Chia tài sản khi ly hôn như thế nào?",
+]
+
+
+def legacy_check(question: str) -> bool:
+    question_lower = question.lower()
+    return any(keyword in question_lower for keyword in LEGACY_KEYWORDS)
+
+
+def time_per_query(func: Callable, items: List, repeats: int) -> float:
+    """µs / lần gọi (trung bình trên repeats lượt cả bộ)"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) * 1e6 / (repeats * len(items))
+
+
+def split_fit_eval(queries: List[str]) -> tuple:
+    """(nửa fit margin, nửa eval để báo cáo): xen kẽ chẵn / lẻ"""
+    return queries[0::2], queries[1::2]
+
+
+def report(
+    name: str,
+    blocked_in: List[str],
+    blocked_out: int,
+    us: float,
+    n_in: int = len(TEST_IN_DOMAIN),
+    n_out: int = len(TEST_OUT_OF_DOMAIN)
+):
+    print(f"{name:<34} {us:>8.2f} µs   từ chối nhầm {len(blocked_in):>2}/{n_in}   "
+          f"chặn {blocked_out:>2}/{n_out}")
+    for question in blocked_in:
+        print(f"{'':<36}✗ {question}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark domain gate")
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--keywords-only", action="store_true", help="Bỏ qua centroid (không load model)")
+    args = parser.parse_args()
+
+    queries = TEST_IN_DOMAIN + TEST_OUT_OF_DOMAIN
+    matcher = KeywordMatcher(OUT_OF_DOMAIN_KEYWORDS)
+    backend = "pyahocorasick" if gate_module.ahocorasick is not None else "regex"
+
+    print(f"📋 {len(TEST_IN_DOMAIN)} câu trong lĩnh vực, {len(TEST_OUT_OF_DOMAIN)} câu ngoài lĩnh vực\n")
+
+    report(
+        "Substring loop (cũ)",
+        [q for q in TEST_IN_DOMAIN if legacy_check(q)],
+        sum(legacy_check(q) for q in TEST_OUT_OF_DOMAIN),
+        time_per_query(legacy_check, queries, args.repeats)
+    )
+    keyword_out = [matcher.find(q) is not None for q in TEST_OUT_OF_DOMAIN]
+    report(
+        f"Từ khóa nguyên từ ({backend})",
+        [q for q in TEST_IN_DOMAIN if matcher.find(q) is not None],
+        sum(keyword_out),
+        time_per_query(matcher.find, queries, args.repeats)
+    )
+
+    if args.keywords_only:
+        return
+
+    from embedding_cache import create_cached_embeddings
+    from rag_chain import EMBEDDING_MODEL
+
+    embeddings = create_cached_embeddings(model_name=EMBEDDING_MODEL, normalize=False)
+    gate = DomainGate.from_examples(embeddings, CENTROID_IN_DOMAIN_EXAMPLES, CENTROID_OUT_OF_DOMAIN_EXAMPLES)
+
+    # Embedding query có sẵn từ bước retrieval → chỉ đo phần so sánh centroid
+    vectors = embeddings.embed_documents(queries)
+    pairs = list(zip(queries, vectors))
+    centroid_us = time_per_query(lambda pair: gate.centroid_margin(pair[1]), pairs, args.repeats)
+
+    # Fit margin trên nửa fit: câu trong lĩnh vực đã qua được từ khóa không được bị centroid chặn
+    fit_in, eval_in = split_fit_eval(TEST_IN_DOMAIN)
+    _, eval_out = split_fit_eval(TEST_OUT_OF_DOMAIN)
+    vector_of = dict(pairs)
+    margin_of = {q: gate.centroid_margin(v) for q, v in pairs}
+    gate.margin = max(margin_of[q] for q in fit_in if matcher.find(q) is None) + CENTROID_MARGIN_SLACK
+
+    # Báo cáo chỉ trên nửa eval (không dùng để fit)
+    blocked_in = [q for q in eval_in if gate.is_out_of_domain(q, vector_of[q])]
+    blocked_out = sum(gate.is_out_of_domain(q, vector_of[q]) for q in eval_out)
+    keyword_eval_out = sum(matcher.find(q) is not None for q in eval_out)
+
+    print(f"\n🧪 Centroid: margin fit trên {len(fit_in)} câu trong lĩnh vực, "
+          f"báo cáo trên nửa eval ({len(eval_in)} + {len(eval_out)} câu)")
+    report(
+        f"Từ khóa + centroid (margin {gate.margin:.4f})",
+        blocked_in,
+        blocked_out,
+        time_per_query(lambda pair: gate.is_out_of_domain(*pair), pairs, args.repeats),
+        n_in=len(eval_in),
+        n_out=len(eval_out)
+    )
+    print(f"\n(centroid riêng: {centroid_us:.2f} µs / query, không tính thời gian encode)")
+    print(f"margin trong lĩnh vực (eval) : {min(margin_of[q] for q in eval_in):.4f} - "
+          f"{max(margin_of[q] for q in eval_in):.4f}")
+    print(f"margin ngoài lĩnh vực (eval) : {min(margin_of[q] for q in eval_out):.4f} - "
+          f"{max(margin_of[q] for q in eval_out):.4f}")
+    print(f"🚫 Centroid chặn thêm         : {blocked_out - keyword_eval_out}/{len(eval_out)} "
+          f"câu ngoài lĩnh vực mà từ khóa bỏ sót")
+
+    save_centroid_margin(gate.margin, EMBEDDING_MODEL, {
+        "n_fit_in_domain": len(fit_in),
+        "eval_false_refusals": len(blocked_in),
+        "eval_blocked": blocked_out,
+        "eval_keyword_blocked": keyword_eval_out,
+        "n_eval_in_domain": len(eval_in),
+        "n_eval_out_of_domain": len(eval_out),
+    })
+    print(f"💾 Đã lưu: {CENTROID_MARGIN_PATH} (xem số liệu eval trước khi bật DOMAIN_GATE_CENTROID)")
+
+if __name__ == "__main__":
+    main()
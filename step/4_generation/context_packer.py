@@ -0,0 +1,354 @@
+"""
+Context packer - Ghép context cho prompt trong giới hạn token
+
+Trước đây mọi page_content được nối bằng "\\n\\n" không giới hạn: 5 điều luật dài
+(có điều gần 10.000 ký tự) làm prompt phình to và LLM chậm. Packer:
+1. Bỏ document trùng (cùng id) hoặc chồng lấn (shingle 5 từ, Jaccard ≥ OVERLAP_THRESHOLD,
+   ví dụ cùng 1 điều trong 2 văn bản hợp nhất)
+2. Sắp theo điểm fused (fused_score → score, dùng key đầu tiên mọi document đều có)
+3. Chia ngân sách token theo kiểu water-filling: document ngắn giữ nguyên, phần dư chia cho
+   document dài
+4. Document dài hơn phần được chia: giữ các câu / khoản liên quan nhất tới query, theo thứ tự
+   gốc, chỗ bị lược đánh dấu "…". Mức liên quan = cosine giữa embedding query (có sẵn từ
+   retrieval) và embedding câu tính sẵn lúc ingestion (sentence_index.py, memory-mapped)
+   + trùng từ / cụm 2 từ (không dấu); chưa có sentence index → chỉ dùng trùng từ
+5. Mỗi đoạn luôn bắt đầu bằng citation: [Điều 6, Luật Đê điều (VBHN 05/VBHN-VPQH)]
+
+Token được ước lượng (không có tokenizer của Gemini offline): mỗi âm tiết / số / dấu câu = 1 token.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from article_index import fold_text
+from sentence_index import split_sentences
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+CONTEXT_TOKEN_BUDGET = 1500
+
+# Jaccard (shingle 5 từ) từ mức này trở lên → coi là cùng nội dung, bỏ document điểm thấp hơn
+OVERLAP_THRESHOLD = 0.8
+SHINGLE_SIZE = 5
+
+# Thứ tự ưu tiên của điểm dùng để sắp xếp (fused_score: fusion.py giai đoạn 3)
+SCORE_KEYS = ["fused_score", "score"]
+
+# Từ quá phổ biến, không dùng để chấm mức liên quan của câu (không dấu)
+STOPWORDS = {
+    "cua", "va", "cac", "duoc", "la", "co", "trong", "cho", "nhung", "khi", "nao", "gi",
+    "the", "nhu", "ve", "voi", "de", "bao", "nhieu", "thi", "mot", "theo", "tai", "hoac",
+}
+
+# Nội dung tối thiểu của 1 document trong context (ít hơn thì bỏ cả document thay vì
+# gửi mỗi citation + "…"); document ngắn hơn mức này chỉ cần đủ chỗ cho chính nó
+MIN_DOC_TOKENS = 16
+
+# Điểm câu = cosine(query, câu) + LEXICAL_WEIGHT * (tỉ lệ từ / cụm từ của query có trong câu)
+LEXICAL_WEIGHT = 0.3
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Câu mở đầu tiêu đề điều / khoản / điểm
+ARTICLE_START = re.compile(r"^Điều\s+\d+")
+CLAUSE_START = re.compile(r"^\d+[a-zđ]?\.\s")
+POINT_START = re.compile(r"^[a-zđ]\)\s")
+
+ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """Số token ước lượng: mỗi âm tiết / số / dấu câu = 1"""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def _ancestors(sentences: List[str]) -> List[List[int]]:
+    """
+    Các câu cần giữ kèm mỗi câu để còn hiểu được: tiêu đề điều, và với điểm "a) ..." là
+    câu mở đầu khoản chứa nó ("3. Bộ ... có trách nhiệm:")
+    """
+    title = 0 if sentences and ARTICLE_START.match(sentences[0]) else None
+    clause = None
+    ancestors = []
+    for i, sentence in enumerate(sentences):
+        parents = []
+        if CLAUSE_START.match(sentence):
+            clause = i
+        elif POINT_START.match(sentence) and clause is not None:
+            parents.append(clause)
+        if title is not None and i != title:
+            parents.insert(0, title)
+        ancestors.append(parents)
+    return ancestors
+
+
+def _terms(text: str) -> set:
+    """Từ (bỏ stopword) + cụm 2 từ liên tiếp của text đã bỏ dấu"""
+    words = fold_text(text).split()
+    terms = {word for word in words if word not in STOPWORDS and len(word) > 1}
+    terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+def _shingles(words: List[str]) -> set:
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def order_by_score(docs: List[Document]) -> List[Document]:
+    """Sắp giảm dần theo key điểm đầu tiên mà mọi document đều có (không có → giữ thứ tự retrieval)"""
+    for key in SCORE_KEYS:
+        if docs and all(key in doc.metadata for doc in docs):
+            return sorted(docs, key=lambda doc: doc.metadata[key], reverse=True)
+    return list(docs)
+
+
+def dedupe(docs: List[Document], threshold: float = OVERLAP_THRESHOLD) -> List[Document]:
+    """
+    Bỏ document trùng id hoặc chồng lấn với 1 document đứng trước
+
+    Jaccard ≥ threshold cần tỉ lệ độ dài ≥ threshold → chỉ tính shingle cho các cặp dài gần bằng nhau
+    """
+    kept, kept_ids, kept_words, kept_shingles = [], set(), [], []
+    for doc in docs:
+        doc_id = doc.metadata.get("id")
+        if doc_id and doc_id in kept_ids:
+            continue
+        words = fold_text(doc.page_content).split()
+        shingles = None
+        overlapping = False
+        for k, other_words in enumerate(kept_words):
+            if min(len(words), len(other_words)) < threshold * max(len(words), len(other_words)):
+                continue
+            if shingles is None:
+                shingles = _shingles(words)
+            if kept_shingles[k] is None:
+                kept_shingles[k] = _shingles(other_words)
+            if len(shingles & kept_shingles[k]) / len(shingles | kept_shingles[k]) >= threshold:
+                overlapping = True
+                break
+        if overlapping:
+            continue
+        kept.append(doc)
+        kept_words.append(words)
+        kept_shingles.append(shingles)
+        if doc_id:
+            kept_ids.add(doc_id)
+    return kept
+
+
+def allocate(
+    costs: List[int],
+    budget: int,
+    overheads: Optional[List[int]] = None,
+    min_tokens: int = MIN_DOC_TOKENS
+) -> List[Optional[int]]:
+    """
+    Water-filling: mỗi phần được min(cost, cap), cap lớn nhất sao cho tổng ≤ budget
+    → phần ngắn giữ nguyên, phần dài chia đều phần còn lại
+
+    Args:
+        costs: Số token của từng phần, theo thứ tự ưu tiên
+        overheads: Chi phí cố định của từng phần nếu được giữ (citation)
+        min_tokens: Phần được giữ phải có ít nhất min(cost, min_tokens) token
+
+    Returns:
+        Số token cho từng phần (không tính overhead); None = bỏ cả phần vì overhead +
+        phần tối thiểu không còn vừa ngân sách
+    """
+    overheads = overheads or [0] * len(costs)
+    allowances = [None] * len(costs)
+    budget = max(budget, 0)
+    remaining = budget
+    reserved = 0
+    pending = []
+    for i, cost in enumerate(costs):
+        need = overheads[i] + min(cost, min_tokens)
+        if reserved + need > budget:
+            continue
+        reserved += need
+        remaining -= overheads[i]
+        pending.append(i)
+
+    pending.sort(key=lambda i: costs[i])
+    while pending:
+        share = remaining // len(pending)
+        i = pending[0]
+        if costs[i] <= share:
+            allowances[i] = costs[i]
+            remaining -= costs[i]
+            pending.pop(0)
+            continue
+        for i in pending:
+            allowances[i] = share
+        break
+    return allowances
+
+
+def truncate_to_query(
+    sentences: List[str],
+    costs: List[int],
+    query_terms: set,
+    max_tokens: int,
+    similarities: Optional[np.ndarray] = None
+) -> str:
+    """
+    Giữ các câu liên quan nhất tới query trong max_tokens token, theo thứ tự gốc
+
+    Không câu nào vừa → cắt câu liên quan nhất theo token.
+
+    Args:
+        sentences: split_sentences của document
+        costs: Số token của từng câu
+        similarities: cosine(query, từng câu), None = chỉ chấm theo trùng từ
+    """
+    # Số từ / cụm từ của query có trong câu (tìm chuỗi con trên câu đã bỏ dấu, bọc dấu cách
+    # = khớp nguyên từ) - nhanh hơn dựng tập từ cho từng câu
+    padded = [f" {fold_text(sentence)} " for sentence in sentences]
+    patterns = [f" {term} " for term in query_terms]
+    scores = [sum(pattern in sentence for pattern in patterns) for sentence in padded]
+    if similarities is not None:
+        scores = [
+            float(similarity) + LEXICAL_WEIGHT * score / max(len(query_terms), 1)
+            for similarity, score in zip(similarities, scores)
+        ]
+    ancestors = _ancestors(sentences)
+    # Điểm bằng nhau → câu đứng trước (tiêu đề điều, khoản đầu) được ưu tiên
+    ranked = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))
+
+    selected, used = set(), 0
+    for i in ranked:
+        group = [j for j in ancestors[i] + [i] if j not in selected]
+        cost = sum(costs[j] + 1 for j in group)
+        if group and used + cost <= max_tokens:
+            selected.update(group)
+            used += cost
+
+    if not selected:
+        words, used = [], 0
+        for word in sentences[ranked[0]].split():
+            used += estimate_tokens(word)
+            if used > max_tokens - 1:
+                break
+            words.append(word)
+        return " ".join(words + [ELLIPSIS])
+
+    parts = []
+    for i in range(len(sentences)):
+        if i in selected:
+            parts.append(sentences[i])
+        elif not parts or parts[-1] != ELLIPSIS:
+            parts.append(ELLIPSIS)
+    return " ".join(parts)
+
+
+# ============================================================================
+# PACKER
+# ============================================================================
+
+class ContextPacker:
+    """Dedupe + sắp xếp + cắt theo ngân sách token, đếm token prompt trước / sau khi pack"""
+
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        overlap_threshold: float = OVERLAP_THRESHOLD,
+        sentence_index=None
+    ):
+        self.token_budget = token_budget
+        self.overlap_threshold = overlap_threshold
+        self.sentence_index = sentence_index
+
+        # Token của context: nối toàn bộ documents (cũ) / đã pack
+        self.prompts = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        # Số document bị cắt, chấm câu bằng embedding / chỉ bằng trùng từ
+        self.semantic_truncations = 0
+        self.lexical_truncations = 0
+
+    def pack(self, query: str, docs: List[Document], embedding=None) -> Tuple[str, List[Document]]:
+        """
+        Args:
+            embedding: Embedding của query đã có (None = chấm câu chỉ bằng trùng từ)
+
+        Returns:
+            (context, documents có trong context theo thứ tự: sau dedupe, bỏ document
+            không còn chỗ cho cả citation)
+        """
+        retrieved = docs
+        docs = dedupe(order_by_score(docs), self.overlap_threshold)
+        headers = [f"[{doc.metadata.get('citation') or doc.metadata.get('id', '')}]" for doc in docs]
+        header_costs = [estimate_tokens(header) for header in headers]
+        # Token không vắt qua khoảng trắng → tổng token các câu = token của cả document
+        sentences = [split_sentences(doc.page_content) for doc in docs]
+        costs = [[estimate_tokens(sentence) for sentence in doc_sentences] for doc_sentences in sentences]
+        doc_costs_total = [sum(doc_costs) for doc_costs in costs]
+        allowances = allocate(doc_costs_total, self.token_budget, header_costs)
+
+        # Thống kê từ số token đã đếm (chỉ đếm thêm document bị dedupe bỏ)
+        kept_ids = {id(doc) for doc in docs}
+        self.prompts += 1
+        self.tokens_before += sum(doc_costs_total) + sum(
+            estimate_tokens(doc.page_content) for doc in retrieved if id(doc) not in kept_ids
+        )
+
+        query_terms = _terms(query)
+        query_vector = None
+        if embedding is not None and self.sentence_index is not None:
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        chunks, packed = [], []
+        for header, header_cost, doc, doc_sentences, doc_costs, allowance in zip(
+            headers, header_costs, docs, sentences, costs, allowances
+        ):
+            if allowance is None:
+                continue
+            text = doc.page_content
+            tokens = sum(doc_costs)
+            if tokens > allowance:
+                similarities = None
+                if query_vector is not None:
+                    vectors = self.sentence_index.vectors_for(doc, len(doc_sentences))
+                    if vectors is not None:
+                        similarities = vectors @ query_vector
+                if similarities is None:
+                    self.lexical_truncations += 1
+                else:
+                    self.semantic_truncations += 1
+                text = truncate_to_query(doc_sentences, doc_costs, query_terms, allowance, similarities)
+                tokens = estimate_tokens(text)
+            chunks.append(f"{header}\n{text}")
+            packed.append(doc)
+            self.tokens_after += header_cost + tokens
+        return "\n\n".join(chunks), packed
+
+    def stats(self) -> Dict:
+        saved = self.tokens_before - self.tokens_after
+        return {
+            "prompts": self.prompts,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "saved_ratio": saved / self.tokens_before if self.tokens_before else 0.0,
+            "semantic_truncations": self.semantic_truncations,
+            "lexical_truncations": self.lexical_truncations,
+        }
+
+
+def print_context_packer_stats(packer):
+    """In số token context trước / sau khi pack (nếu chain có packer)"""
+    if packer is None:
+        return
+    stats = packer.stats()
+    if not stats["prompts"]:
+        return
+    print(f"📏 Context tokens (ước lượng, {stats['prompts']} prompt): {stats['tokens_before']} → "
+          f"{stats['tokens_after']} ({-stats['saved_ratio']:+.1%}), ngân sách context {packer.token_budget}/prompt | "
+          f"điều bị cắt: {stats['semantic_truncations']} theo embedding câu, {stats['lexical_truncations']} theo trùng từ")
@@ -0,0 +1,211 @@
+"""
+Domain gate - Chặn câu hỏi ngoài lĩnh vực trước khi retrieval / gọi LLM
+
+2 tầng, đều rẻ:
+1. Từ khóa: 1 automaton Aho-Corasick (pyahocorasick, không có thì 1 regex đã compile)
+   trên query đã bỏ dấu, chỉ khớp nguyên từ → "nạn" trong "tai nạn" hay "yêu" trong
+   "yêu cầu" không còn bị coi là ngoài lĩnh vực
+2. Centroid (thử nghiệm, chưa bật - rag_chain.DOMAIN_GATE_CENTROID = False): so cosine của
+   embedding query (dùng lại vector của bước retrieval) với centroid câu hỏi trong lĩnh vực
+   và centroid câu hỏi ngoài lĩnh vực
+
+Centroid dựng từ bộ câu mẫu riêng ở dưới (không dùng chung bộ câu của
+relevance_calibration.py hay bộ test của benchmark). Margin không đặt tay:
+benchmark_domain_gate.py fit trên 1 nửa bộ test của nó, báo cáo trên nửa còn lại và lưu
+vào CENTROID_MARGIN_PATH. Repo chưa có file margin (cần chạy với embedding model) → chain
+chỉ dùng tầng từ khóa.
+
+Benchmark + số câu bị từ chối nhầm: python step/4_generation/benchmark_domain_gate.py
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from article_index import fold_text
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Cụm từ (không dấu, khớp nguyên từ) cho biết câu hỏi chắc chắn không về pháp luật.
+# Không dùng từ ngắn dễ trùng với văn bản luật ("nan", "xin", "yeu", "cong ty", ...)
+OUT_OF_DOMAIN_KEYWORDS = [
+    "who are you", "what is your name", "who built you",
+    "ai la ai", "ban la ai", "ban ten la gi", "ban la gi", "ai la ban",
+    "anh la ai", "chi la ai", "em la ai", "tao la ai", "co la ai",
+    "me la ai", "cha la ai", "maye la ai", "mai la ai", "con la gi",
+    "tim ban", "tu tien huy",
+    "recipe", "nau an", "cong thuc nau",
+    "love", "dating", "hen ho",
+    "joke", "ke chuyen cuoi", "tro chuyen",
+]
+
+SCRIPT_DIR = Path(__file__).parent
+# Margin đã fit (benchmark_domain_gate.py): từ chối khi cos(query, ngoài) - cos(query, trong) > margin
+CENTROID_MARGIN_PATH = SCRIPT_DIR / "domain_gate_margin.json"
+
+# Câu mẫu dựng centroid trong lĩnh vực (4 luật trong index)
+CENTROID_IN_DOMAIN_EXAMPLES = [
+    "Hành lang bảo vệ đê được quy định bao nhiêu mét?",
+    "Ai chịu trách nhiệm tổ chức hộ đê khi có lũ lớn?",
+    "Nguyên tắc quản lý, khai thác công trình thủy lợi",
+    "Phương án ứng phó thiên tai theo cấp độ rủi ro",
+    "Mạng lưới trạm khí tượng thủy văn quốc gia gồm những gì?",
+    "Tu bổ, nâng cấp đê điều phải tuân thủ quy định nào?",
+    "Hoạt động nào phải có giấy phép trong phạm vi bảo vệ công trình thủy lợi?",
+    "Nghĩa vụ của người dân trong phòng, chống thiên tai",
+    "Thủy lợi phí được miễn trong trường hợp nào?",
+    "Tin dự báo bão, áp thấp nhiệt đới được ban hành ra sao?",
+    "Vi phạm hành lang thoát lũ bị xử lý thế nào?",
+    "Kế hoạch phòng chống thiên tai cấp xã gồm nội dung gì?",
+    "Điều kiện xây dựng nhà ở trên bãi sông",
+    "Quan trắc khí tượng thủy văn của công trình hồ chứa",
+    "Khôi phục, tái thiết sau thiên tai được thực hiện như thế nào?",
+    "Vận hành hồ chứa thủy lợi trong mùa mưa lũ",
+]
+
+# Câu mẫu dựng centroid ngoài lĩnh vực: trò chuyện, đời sống, công nghệ...
+# Không đưa câu hỏi về luật khác vào đây - centroid chỉ để chặn câu rõ ràng không
+# liên quan, câu hỏi pháp luật ngoài index để retrieval + LLM từ chối
+CENTROID_OUT_OF_DOMAIN_EXAMPLES = [
+    "Xin chào, hôm nay bạn thế nào?",
+    "Bạn có thể hát một bài không?",
+    "Cách làm bánh flan tại nhà",
+    "Món ăn ngon nhất ở Huế là gì?",
+    "Đội tuyển Việt Nam đá trận tiếp theo khi nào?",
+    "Phim chiếu rạp hay tuần này",
+    "Gợi ý quà sinh nhật cho bạn gái",
+    "Điện thoại nào chụp ảnh đẹp nhất?",
+    "Máy tính bị chậm phải làm sao?",
+    "Cách viết hàm đệ quy trong JavaScript",
+    "Giá bitcoin hôm nay bao nhiêu?",
+    "Đi Phú Quốc mùa nào đẹp nhất?",
+    "Bài tập thể dục buổi sáng cho người mới",
+    "Trẻ bị sốt nên ăn gì?",
+    "Dịch câu này sang tiếng Anh giúp tôi",
+    "Kể cho tôi nghe một câu chuyện cổ tích",
+]
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class KeywordMatcher:
+    """Khớp nhiều cụm từ cùng lúc, nguyên từ, trên text đã bỏ dấu"""
+
+    def __init__(self, keywords: List[str]):
+        # fold_text đã gom mọi dấu câu / khoảng trắng thành 1 dấu cách
+        # → bọc 2 đầu bằng dấu cách = ranh giới từ
+        self.keywords = sorted({fold_text(keyword) for keyword in keywords if fold_text(keyword)})
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword in self.keywords:
+                self._automaton.add_word(f" {keyword} ", keyword)
+            self._automaton.make_automaton()
+            self._regex = None
+        else:
+            self._automaton = None
+            self._regex = re.compile(" (?:" + "|".join(map(re.escape, self.keywords)) + ") ")
+
+    def find(self, text: str, folded: bool = False) -> Optional[str]:
+        """Cụm từ đầu tiên tìm thấy trong text, None nếu không có"""
+        if not self.keywords:
+            return None
+        padded = f" {text if folded else fold_text(text)} "
+        if self._automaton is not None:
+            for _, keyword in self._automaton.iter(padded):
+                return keyword
+            return None
+        match = self._regex.search(padded)
+        return match.group(0).strip() if match else None
+
+
+class DomainGate:
+    """Từ khóa + (tùy chọn) centroid embedding"""
+
+    def __init__(
+        self,
+        keywords: List[str] = OUT_OF_DOMAIN_KEYWORDS,
+        in_centroid=None,
+        out_centroid=None,
+        margin: float = 0.0
+    ):
+        self.matcher = KeywordMatcher(keywords)
+        self.in_centroid = None if in_centroid is None else _unit(in_centroid)
+        self.out_centroid = None if out_centroid is None else _unit(out_centroid)
+        self.margin = margin
+
+    @classmethod
+    def from_examples(
+        cls,
+        embeddings,
+        in_domain: List[str],
+        out_of_domain: List[str],
+        **kwargs
+    ) -> "DomainGate":
+        """Centroid = trung bình embedding (đã chuẩn hóa) của các câu hỏi mẫu"""
+        vectors = np.asarray(embeddings.embed_documents(list(in_domain) + list(out_of_domain)), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return cls(
+            in_centroid=vectors[:len(in_domain)].mean(axis=0),
+            out_centroid=vectors[len(in_domain):].mean(axis=0),
+            **kwargs
+        )
+
+    @property
+    def has_centroids(self) -> bool:
+        return self.in_centroid is not None and self.out_centroid is not None
+
+    def keyword_match(self, query: str) -> Optional[str]:
+        return self.matcher.find(query)
+
+    def centroid_margin(self, embedding) -> float:
+        """cos(query, ngoài lĩnh vực) - cos(query, trong lĩnh vực); > margin → ngoài lĩnh vực"""
+        query = _unit(embedding)
+        return float(query @ self.out_centroid - query @ self.in_centroid)
+
+    def is_out_of_domain(self, query: str, embedding=None) -> bool:
+        """Từ khóa trước; có embedding + centroid thì kiểm tra thêm centroid"""
+        if self.keyword_match(query) is not None:
+            return True
+        if embedding is None or not self.has_centroids:
+            return False
+        return self.centroid_margin(embedding) > self.margin
+
+
+def save_centroid_margin(margin: float, embedding_model: str, report: Dict, path: Path = CENTROID_MARGIN_PATH):
+    """Lưu margin đã fit + số liệu đo trên bộ test (để commit cùng code)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"margin": margin, "embedding_model": embedding_model, **report}, f, indent=2, ensure_ascii=False)
+
+
+def load_centroid_margin(path: Path = CENTROID_MARGIN_PATH, embedding_model: str = "") -> Optional[float]:
+    """
+    Load margin đã fit
+
+    Returns:
+        None nếu chưa fit hoặc fit cho embedding model khác
+        (khi đó chain chỉ dùng từ khóa)
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    if embedding_model and saved.get("embedding_model") and saved["embedding_model"] != embedding_model:
+        print(f"⚠️  Margin domain gate dành cho {saved['embedding_model']}, không dùng cho {embedding_model}")
+        return None
+    return float(saved["margin"])
@@ -13,8 +13,11 @@ print("=" * 70)
 print("[FINAL TEST - RAG CHAIN WITH GEMINI 2.5 FLASH]")
 print("=" * 70)
 
+# Backend khác Gemini hoặc phát lại cassette (LLM_CASSETTE=replay) không cần API key
+needs_api_key = os.getenv("LLM_BACKEND", "gemini") == "gemini" and os.getenv("LLM_CASSETTE", "") != "replay"
+
 # Check API key
-api_key = os.getenv("GOOGLE_API_KEY")
+api_key = os.getenv("GOOGLE_API_KEY") if needs_api_key else "(không cần API key)"
 if not api_key:
     print("ERROR: API key not found in .env")
     sys.exit(1)
@@ -26,7 +29,7 @@ if api_key.startswith("GOOGLE_API_KEY="):
     print(f"Got: {api_key[:40]}...")
     sys.exit(1)
 
-if not api_key.startswith("AIzaSy"):
+if needs_api_key and not api_key.startswith("AIzaSy"):
     print("WARNING: API key format looks unusual (should start with AIzaSy)")
 
 print(f"[API Key validated: {api_key[:15]}...]")
@@ -39,10 +42,11 @@ try:
     sys.path.insert(0, 'step/4_generation')
     
     from rag_chain import build_rag_chain, query_rag, format_output, get_api_key
+    from llm_cassette import print_cassette_stats
     
     # Build initial chain
     qa_chain = build_rag_chain(temperature=0.1, top_k=5)
-    last_api_key = get_api_key()
+    last_api_key = get_api_key() if needs_api_key else None
     
     print("\n" + "=" * 70)
     print("[RAG CHAIN READY - Enter your questions below]")
@@ -67,7 +71,7 @@ try:
             if test_query.lower() == 'reload':
                 print("\n[Reloading RAG chain...]")
                 try:
-                    new_api_key = get_api_key()
+                    new_api_key = get_api_key() if needs_api_key else None
                     if new_api_key != last_api_key:
                         print(f"[API key changed: {last_api_key[:15]}... -> {new_api_key[:15]}...]")
                         last_api_key = new_api_key
@@ -80,7 +84,7 @@ try:
             print("\n[Processing...]")
             
             # Check if API key changed since last query
-            current_api_key = get_api_key()
+            current_api_key = get_api_key() if needs_api_key else None
             if current_api_key != last_api_key:
                 print(f"[API key changed - rebuilding chain]")
                 qa_chain = build_rag_chain(temperature=0.1, top_k=5, rebuild_llm=True)
@@ -89,6 +93,7 @@ try:
             # Query with retry logic
             result = query_rag(qa_chain, test_query, max_retries=3)
             print(format_output(result))
+            print_cassette_stats(qa_chain.llm)
             
         except KeyboardInterrupt:
             print("\n\n[Interrupted by user - Exiting...]")
@@ -0,0 +1,303 @@
+"""
+LLM BACKENDS - Chọn LLM cho RAG chain theo cấu hình
+Hỗ trợ: gemini, openai_compat, fake
+
+- gemini        : Google Gemini (cần GOOGLE_API_KEY trong .env)
+- openai_compat : server tương thích OpenAI Chat Completions (vLLM, llama.cpp server,
+                  Ollama, LM Studio, ...), mặc định http://localhost:8000/v1
+- fake          : không cần mạng / API key, câu trả lời xác định (cùng prompt → cùng câu trả lời),
+                  độ trễ token đầu + tốc độ token cấu hình được → load test / profile
+                  retrieval và orchestration trên máy không có mạng (CI)
+
+Mọi backend là 1 LangChain chat model (invoke / ainvoke / stream / astream).
+
+Chọn backend:
+    LLM_BACKEND=fake python step/4_generation/test_rag.py
+    LLM_BACKEND=openai_compat LLM_BASE_URL=http://localhost:11434/v1 LLM_MODEL=qwen2.5 python ...
+
+Ghi / phát lại câu trả lời của backend bất kỳ: LLM_CASSETTE=record|replay (llm_cassette.py)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from llm_cassette import CASSETTE_MODES, DEFAULT_CASSETTE_PATH, CassetteChatModel, CassetteStore
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Cấu hình LLM đọc từ biến môi trường / .env
+load_dotenv(override=True)
+
+LLM_BACKENDS = ["gemini", "openai_compat", "fake"]
+
+# Tham số mặc định cho từng backend (có thể ghi đè qua params)
+DEFAULT_LLM_PARAMS = {
+    "gemini": {"model": "gemini-2.5-flash", "top_p": 0.95, "top_k": 40, "request_timeout": 60},
+    "openai_compat": {
+        "base_url": os.getenv("LLM_BASE_URL", "http://localhost:8000/v1"),
+        "model": os.getenv("LLM_MODEL", "local-model"),
+        "api_key": os.getenv("LLM_API_KEY", ""),
+        "top_p": 0.95,
+        "request_timeout": 60,
+    },
+    # Độ trễ tới token đầu (giây) + tốc độ sinh (token/giây), số token mỗi câu trả lời
+    "fake": {"first_token_latency": 0.5, "tokens_per_second": 50.0, "answer_tokens": 60},
+}
+
+# Cassette: "" (tắt) | record | replay, realtime = replay chờ đúng độ trễ đã ghi
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "")
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", str(DEFAULT_CASSETTE_PATH))
+LLM_CASSETTE_REALTIME = os.getenv("LLM_CASSETTE_REALTIME", "") not in ("", "0")
+
+
+def get_api_key():
+    """Get API key from environment, reload from .env if needed"""
+    # Reload .env to pick up any changes
+    load_dotenv(override=True)
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key or api_key.startswith("GOOGLE_API_KEY="):
+        raise ValueError("API key not found or invalid in .env file")
+    return api_key
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+# ============================================================================
+# OPENAI-COMPATIBLE HTTP
+# ============================================================================
+
+class OpenAICompatChatModel(BaseChatModel):
+    """POST {base_url}/chat/completions, stream qua Server-Sent Events"""
+
+    base_url: str
+    model: str
+    api_key: str = ""
+    temperature: float = 0.1
+    top_p: float = 0.95
+    request_timeout: float = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "openai_compat"
+
+    def _request(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool) -> Dict:
+        roles = {"human": "user", "ai": "assistant", "system": "system"}
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": roles.get(message.type, "user"), "content": str(message.content)}
+                for message in messages
+            ],
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "stream": stream,
+        }
+        if stop:
+            payload["stop"] = stop
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return {
+            "url": f"{self.base_url.rstrip('/')}/chat/completions",
+            "json": payload,
+            "headers": headers,
+        }
+
+    @staticmethod
+    def _sse_delta(line: str) -> Optional[str]:
+        """Text trong 1 dòng SSE ("data: {...}"), None nếu không có"""
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        import httpx
+
+        response = httpx.post(**self._request(messages, stop, stream=False), timeout=self.request_timeout)
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"] or ""
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        import httpx
+
+        async with httpx.AsyncClient(timeout=self.request_timeout) as client:
+            response = await client.post(**self._request(messages, stop, stream=False))
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"] or ""
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        import httpx
+
+        with httpx.stream("POST", **self._request(messages, stop, stream=True), timeout=self.request_timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                text = self._sse_delta(line)
+                if text:
+                    if run_manager:
+                        run_manager.on_llm_new_token(text)
+                    yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        import httpx
+
+        async with httpx.AsyncClient(timeout=self.request_timeout) as client:
+            async with client.stream("POST", **self._request(messages, stop, stream=True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = self._sse_delta(line)
+                    if text:
+                        if run_manager:
+                            await run_manager.on_llm_new_token(text)
+                        yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+
+# ============================================================================
+# FAKE (OFFLINE)
+# ============================================================================
+
+class FakeLegalChatModel(BaseChatModel):
+    """
+    LLM giả lập, không gọi mạng
+
+    Câu trả lời ghép từ các từ của prompt (chọn theo sha256 của prompt) → xác định,
+    dài answer_tokens token. Thời gian: first_token_latency + answer_tokens / tokens_per_second,
+    chờ bằng asyncio.sleep ở các lời gọi async (không chiếm thread).
+    """
+
+    first_token_latency: float = 0.5
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+    temperature: float = 0.1
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake_legal"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = _prompt_text(messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        words = prompt.split() or ["..."]
+        tokens = [
+            words[(digest[i % len(digest)] * 31 + i) % len(words)]
+            for i in range(max(self.answer_tokens - 1, 0))
+        ]
+        tokens.insert(0, f"[fake {digest[:4].hex()}]")
+        return [token + " " for token in tokens[:-1]] + tokens[-1:]
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.first_token_latency + len(tokens) * self._token_delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.first_token_latency + len(tokens) * self._token_delay())
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                time.sleep(self._token_delay())
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(messages)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# ============================================================================
+# FACTORY
+# ============================================================================
+
+def create_llm(
+    backend: str = "gemini",
+    temperature: float = 0.1,
+    params: Optional[Dict[str, Any]] = None,
+    cassette: str = LLM_CASSETTE,
+    cassette_path: str = LLM_CASSETTE_PATH,
+    realtime: bool = LLM_CASSETTE_REALTIME
+) -> BaseChatModel:
+    """
+    Tạo chat model cho backend
+
+    Args:
+        backend: Một trong LLM_BACKENDS
+        temperature: LLM temperature (0.0-1.0)
+        params: Ghi đè DEFAULT_LLM_PARAMS[backend]
+        cassette: "" | "record" | "replay" (xem llm_cassette.py)
+        cassette_path: File cassette
+        realtime: Replay chờ đúng độ trễ đã ghi
+
+    Returns:
+        LangChain chat model
+    """
+    if backend not in DEFAULT_LLM_PARAMS:
+        raise ValueError(f"LLM backend không hỗ trợ: {backend} (chọn trong {LLM_BACKENDS})")
+    if cassette and cassette not in CASSETTE_MODES:
+        raise ValueError(f"LLM_CASSETTE không hỗ trợ: {cassette} (chọn trong {CASSETTE_MODES})")
+
+    resolved = {**DEFAULT_LLM_PARAMS[backend], **(params or {})}
+    if not cassette:
+        return _create_backend(backend, temperature, resolved)
+
+    # Replay không tạo backend thật → không cần API key / mạng
+    inner = _create_backend(backend, temperature, resolved) if cassette == "record" else None
+    store = CassetteStore(cassette_path)
+    print(f"[LLM cassette: {cassette} {'(realtime) ' if realtime and cassette == 'replay' else ''}"
+          f"- {len(store)} câu trả lời trong {store.cassette_path}]")
+    return CassetteChatModel(
+        store=store,
+        mode=cassette,
+        backend=backend,
+        params={**resolved, "temperature": temperature},
+        inner=inner,
+        realtime=realtime
+    )
+
+
+def _create_backend(backend: str, temperature: float, resolved: Dict[str, Any]) -> BaseChatModel:
+    resolved = dict(resolved)
+    if backend == "gemini":
+        # Import khi dùng: backend khác không cần langchain-google-genai
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        api_key = resolved.pop("api_key", None) or get_api_key()
+        print(f"[Using API Key: {api_key[:15]}...]")
+        return ChatGoogleGenerativeAI(google_api_key=api_key, temperature=temperature, **resolved)
+
+    if backend == "openai_compat":
+        print(f"[LLM: {resolved['model']} @ {resolved['base_url']}]")
+        return OpenAICompatChatModel(temperature=temperature, **resolved)
+
+    print(f"[LLM: fake, {resolved['first_token_latency']}s + {resolved['answer_tokens']} token "
+          f"@ {resolved['tokens_per_second']} token/s]")
+    return FakeLegalChatModel(temperature=temperature, **resolved)
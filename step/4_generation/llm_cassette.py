@@ -0,0 +1,263 @@
+"""
+LLM CASSETTE - Ghi / phát lại câu trả lời LLM cho các lần chạy regression + đo hiệu năng
+
+- record : gọi LLM thật, lưu (prompt → câu trả lời, độ trễ) vào cassette
+- replay : trả câu trả lời đã ghi ngay lập tức, không gọi mạng; prompt chưa ghi → LookupError.
+           Tùy chọn realtime: chờ đúng độ trễ đã ghi (token đầu + phần còn lại rải đều
+           trên các chunk khi stream) để số đo thời gian end-to-end vẫn thực tế và lặp lại được
+
+Key = sha256(backend + tham số model + prompt) → đổi model / temperature / prompt template
+là 1 key mới. Cassette là 1 file SQLite, câu trả lời nén zlib.
+
+Dùng (test_rag.py, final_test.py, desktop app - mọi thứ gọi build_rag_chain):
+    LLM_CASSETTE=record python step/4_generation/test_rag.py
+    LLM_CASSETTE=replay python step/4_generation/test_rag.py                          # tức thì
+    LLM_CASSETTE=replay LLM_CASSETTE_REALTIME=1 python step/4_generation/test_rag.py  # độ trễ đã ghi
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_CASSETTE_PATH = SCRIPT_DIR / "output" / "llm_cassette.sqlite"
+
+CASSETTE_MODES = ["record", "replay"]
+
+# Tham số không ảnh hưởng câu trả lời → không đưa vào key
+NON_KEY_PARAMS = {"api_key", "base_url", "request_timeout"}
+
+
+def cassette_key(backend: str, params: Dict[str, Any], prompt: str) -> str:
+    """sha256 hex của (backend, tham số model, prompt)"""
+    model_params = {name: value for name, value in params.items() if name not in NON_KEY_PARAMS}
+    payload = json.dumps([backend, model_params, prompt], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(f"{message.type}: {message.content}" for message in messages)
+
+
+def _chunk_text(chunk) -> str:
+    content = chunk.content
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    return str(content)
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class CassetteStore:
+    """
+    Bảng SQLite: key → (câu trả lời nén zlib, độ trễ token đầu, tổng độ trễ)
+
+    Dùng chung được giữa nhiều thread (aquery_rag chạy song song nhiều câu hỏi)
+    """
+
+    def __init__(self, cassette_path: Path = DEFAULT_CASSETTE_PATH):
+        self.cassette_path = Path(cassette_path)
+        self.cassette_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.cassette_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response BLOB NOT NULL,
+                first_token_seconds REAL NOT NULL,
+                total_seconds REAL NOT NULL,
+                recorded_at REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def get(self, key: str) -> Optional[Tuple[str, float, float]]:
+        """(câu trả lời, giây tới token đầu, tổng số giây) hoặc None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, first_token_seconds, total_seconds FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return zlib.decompress(row[0]).decode("utf-8"), row[1], row[2]
+
+    def put(self, key: str, response: str, first_token_seconds: float, total_seconds: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, zlib.compress(response.encode("utf-8"), 9),
+                 float(first_token_seconds), float(total_seconds), time.time())
+            )
+            self._conn.commit()
+            self.recorded += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================================
+# CHAT MODEL
+# ============================================================================
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Bọc 1 chat model: record → gọi inner và ghi lại, replay → đọc từ cassette
+
+    Ở chế độ replay inner có thể là None (không cần API key / mạng).
+    """
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    store: CassetteStore
+    mode: str = "replay"
+    backend: str = ""
+    params: Dict[str, Any] = {}
+    inner: Optional[BaseChatModel] = None
+    realtime: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette_{self.mode}"
+
+    def _key(self, messages: List[BaseMessage]) -> str:
+        return cassette_key(self.backend, self.params, _prompt_text(messages))
+
+    def _replay(self, key: str) -> Tuple[str, float, float]:
+        entry = self.store.get(key)
+        if entry is None:
+            raise LookupError(
+                f"Cassette {self.store.cassette_path.name} chưa có câu trả lời cho prompt này "
+                f"(key {key[:12]}) - chạy lại với LLM_CASSETTE=record"
+            )
+        return entry
+
+    @staticmethod
+    def _replay_chunks(response: str, first_token_seconds: float, total_seconds: float):
+        """Chia câu trả lời thành các chunk theo từ, kèm thời gian chờ trước mỗi chunk"""
+        words = response.split(" ")
+        chunks = [word + " " for word in words[:-1]] + words[-1:]
+        rest = max(total_seconds - first_token_seconds, 0.0) / max(len(chunks) - 1, 1)
+        return [(chunk, first_token_seconds if i == 0 else rest) for i, chunk in enumerate(chunks)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages)
+        if self.mode == "replay":
+            response, _, total_seconds = self._replay(key)
+            if self.realtime:
+                time.sleep(total_seconds)
+        else:
+            start = time.perf_counter()
+            response = _chunk_text(self.inner.invoke(messages, stop=stop, **kwargs))
+            total_seconds = time.perf_counter() - start
+            self.store.put(key, response, total_seconds, total_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key = self._key(messages)
+        if self.mode == "replay":
+            response, _, total_seconds = self._replay(key)
+            if self.realtime:
+                await asyncio.sleep(total_seconds)
+        else:
+            start = time.perf_counter()
+            response = _chunk_text(await self.inner.ainvoke(messages, stop=stop, **kwargs))
+            total_seconds = time.perf_counter() - start
+            self.store.put(key, response, total_seconds, total_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages)
+        if self.mode == "replay":
+            for text, delay in self._replay_chunks(*self._replay(key)):
+                if self.realtime and delay > 0:
+                    time.sleep(delay)
+                if run_manager:
+                    run_manager.on_llm_new_token(text)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+            return
+
+        parts = []
+        first_token_seconds = None
+        start = time.perf_counter()
+        for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if first_token_seconds is None:
+                first_token_seconds = time.perf_counter() - start
+            parts.append(text)
+            if run_manager:
+                run_manager.on_llm_new_token(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        total_seconds = time.perf_counter() - start
+        self.store.put(key, "".join(parts), first_token_seconds or total_seconds, total_seconds)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._key(messages)
+        if self.mode == "replay":
+            for text, delay in self._replay_chunks(*self._replay(key)):
+                if self.realtime and delay > 0:
+                    await asyncio.sleep(delay)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+            return
+
+        parts = []
+        first_token_seconds = None
+        start = time.perf_counter()
+        async for chunk in self.inner.astream(messages, stop=stop, **kwargs):
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if first_token_seconds is None:
+                first_token_seconds = time.perf_counter() - start
+            parts.append(text)
+            if run_manager:
+                await run_manager.on_llm_new_token(text)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        total_seconds = time.perf_counter() - start
+        self.store.put(key, "".join(parts), first_token_seconds or total_seconds, total_seconds)
+
+
+def print_cassette_stats(llm):
+    """In số câu trả lời phát lại / ghi mới (nếu LLM là cassette)"""
+    if not isinstance(llm, CassetteChatModel):
+        return
+    store = llm.store
+    print(f"📼 LLM cassette ({llm.mode}{', realtime' if llm.realtime else ''}): "
+          f"{store.hits} phát lại / {store.misses} thiếu / {store.recorded} ghi mới | "
+          f"{len(store)} câu trả lời trong {store.cassette_path}")
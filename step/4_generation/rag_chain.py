@@ -2,15 +2,30 @@
 Bước 3: RAG Chain - Tích hợp LLM + Retriever + Prompts
 """
 
+import asyncio
 import os
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_core.runnables import RunnablePassthrough
 
+# Dùng chung các module của giai đoạn 2 (embedding cache, ...)
+sys.path.insert(0, str(Path(__file__).parent.parent / "2_ingestion"))
+
+from answer_cache import ANSWER_CACHE_PATH, SemanticAnswerCache
+from article_index import ArticleIndex
+from context_packer import CONTEXT_TOKEN_BUDGET, ContextPacker
+from doc_store import index_version, load_vector_store
+from sentence_index import SentenceIndex
+from embedding_cache import create_cached_embeddings
+from domain_gate import (
+    CENTROID_IN_DOMAIN_EXAMPLES, CENTROID_OUT_OF_DOMAIN_EXAMPLES, DomainGate, load_centroid_margin
+)
+from llm_backends import LLM_CASSETTE, create_llm, get_api_key
 from system_prompt import SYSTEM_PROMPT, PROMPT_TEMPLATE, REFUSAL_RESPONSE
 from refusal_and_citations import REFUSAL_MESSAGES
 
@@ -18,44 +33,73 @@ from refusal_and_citations import REFUSAL_MESSAGES
 load_dotenv(override=True)
 
 # Confidence threshold for relevance
+# (hiện chỉ dùng cho báo cáo của relevance_calibration.py - chain chưa từ chối theo relevance)
 RELEVANCE_THRESHOLD = 0.5  # Similarity score must be > 0.5 to answer
 
+# LLM backend (llm_backends.py): gemini | openai_compat | fake (không cần mạng / API key)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+FAISS_INDEX_PATH = "step/2_ingestion/output/law_documents_index"
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+# Query nêu rõ "Điều N Luật ..." → lấy thẳng record của điều đó (article_index.json)
+DIRECT_LOOKUP = True
+# True = bổ sung kết quả semantic sau các điều được trích dẫn (vẫn chạy vector search)
+DIRECT_LOOKUP_MERGE = False
+
+# Domain gate (domain_gate.py): từ khóa luôn bật; True = thêm centroid embedding,
+# chỉ có hiệu lực khi benchmark_domain_gate.py đã fit + lưu margin cho EMBEDDING_MODEL
+DOMAIN_GATE_CENTROID = False
+
+# Gate từ khóa compile 1 lần, dùng khi chain không có gate riêng
+DEFAULT_DOMAIN_GATE = DomainGate()
+
+# Câu hỏi gần trùng câu đã trả lời (cùng tập source) → dùng lại câu trả lời, không gọi LLM
+# (answer_cache.py, lưu trong step/4_generation/output/answer_cache.sqlite)
+ANSWER_CACHE = True
+
+# Ngân sách token (ước lượng) cho phần context của prompt (context_packer.py);
+# None = nối toàn bộ page_content như trước
+CONTEXT_BUDGET = CONTEXT_TOKEN_BUDGET
+
+# Async (aquery_rag): retrieval (encode + FAISS, tốn CPU) chạy trên RETRIEVAL_THREADS thread
+# dùng chung, phần chờ LLM là coroutine → nhiều câu hỏi đồng thời không cần 1 thread / câu
+RETRIEVAL_THREADS = 4
+# Số câu hỏi xử lý cùng lúc trong aquery_rag_many (giới hạn bộ nhớ + số request tới LLM)
+MAX_CONCURRENT_QUERIES = 256
 
-def get_api_key():
-    """Get API key from environment, reload from .env if needed"""
-    # Reload .env to pick up any changes
-    load_dotenv(override=True)
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key or api_key.startswith("GOOGLE_API_KEY="):
-        raise ValueError("API key not found or invalid in .env file")
-    return api_key
+# query_rag / aquery_rag: câu trả lời rỗng / quá ngắn → chờ rồi hỏi lại, hết lượt thì trả NO_ANSWER_MESSAGE
+SHORT_ANSWER_RETRY_SECONDS = 2
+NO_ANSWER_MESSAGE = "Không có câu trả lời phù hợp được tìm thấy."
 
 
 def load_faiss_vectorstore():
     """Load FAISS index từ giai đoạn 2"""
     print("📦 Loading FAISS index...")
     
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    embeddings = create_cached_embeddings(
+        model_name=EMBEDDING_MODEL,
+        normalize=False
     )
     
-    vectorstore = FAISS.load_local(
-        "step/2_ingestion/output/law_documents_index",
-        embeddings,
-        allow_dangerous_deserialization=True
-    )
+    vectorstore = load_vector_store(FAISS_INDEX_PATH, embeddings)
     
     print(f"✅ Loaded {vectorstore.index.ntotal} vectors")
     return vectorstore
 
 
-def build_rag_chain(temperature=0.1, top_k=5, rebuild_llm=False):
+def build_rag_chain(temperature=0.1, top_k=5, rebuild_llm=False, direct_lookup=DIRECT_LOOKUP,
+                    answer_cache=ANSWER_CACHE, llm_backend=LLM_BACKEND, context_budget=CONTEXT_BUDGET):
     """Build RAG chain: Retriever + LLM + Prompt
     
     Args:
         temperature: LLM temperature (0.0-1.0), lower = more factual
         top_k: Number of documents to retrieve in search_kwargs
         rebuild_llm: Force rebuild LLM with fresh API key
+        direct_lookup: Tra cứu trực tiếp khi query trích dẫn "Điều N Luật ..."
+        answer_cache: Dùng lại câu trả lời cho câu hỏi gần trùng (semantic answer cache)
+        llm_backend: Một trong llm_backends.LLM_BACKENDS
+        context_budget: Số token tối đa của context (None = không giới hạn)
     """
     print("🔧 Building RAG chain...")
     
@@ -63,42 +107,170 @@ def build_rag_chain(temperature=0.1, top_k=5, rebuild_llm=False):
     vectorstore = load_faiss_vectorstore()
     retriever = vectorstore.as_retriever(search_kwargs={"k": top_k})
     
-    # 2. Init LLM with fresh API key
-    api_key = get_api_key()
-    print(f"[Using API Key: {api_key[:15]}...]")
-    
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=api_key,
-        temperature=temperature,  # Configurable: Low = more factual
-        top_p=0.95,
-        top_k=40,
-        request_timeout=60  # 60 second timeout
-    )
+    # Index cũ chưa có article_index.json → luôn dùng vector search
+    article_index = ArticleIndex.open(FAISS_INDEX_PATH) if direct_lookup else None
+    
+    # Centroid của câu hỏi mẫu (embedding được cache trên đĩa sau lần đầu), margin đã fit
+    domain_gate = DEFAULT_DOMAIN_GATE
+    if DOMAIN_GATE_CENTROID:
+        margin = load_centroid_margin(embedding_model=EMBEDDING_MODEL)
+        if margin is None:
+            print("⚠️  Chưa có margin cho centroid gate - chỉ dùng từ khóa "
+                  "(chạy: python step/4_generation/benchmark_domain_gate.py)")
+        else:
+            domain_gate = DomainGate.from_examples(
+                vectorstore.embeddings, CENTROID_IN_DOMAIN_EXAMPLES, CENTROID_OUT_OF_DOMAIN_EXAMPLES, margin=margin
+            )
+    
+    # Câu trả lời cache theo version index: ingestion lại → cache cũ bị xóa.
+    # Câu trả lời phụ thuộc temperature → chỉ cache cấu hình mặc định.
+    # Mỗi backend 1 file riêng (câu trả lời của fake / model local không lẫn với Gemini).
+    # Khi ghi / phát lại cassette mọi câu hỏi phải qua LLM → tắt
+    if answer_cache and temperature == 0.1 and not LLM_CASSETTE:
+        cache_path = ANSWER_CACHE_PATH
+        if llm_backend != "gemini":
+            cache_path = ANSWER_CACHE_PATH.with_name(f"answer_cache_{llm_backend}.sqlite")
+        answer_cache = SemanticAnswerCache(index_version(FAISS_INDEX_PATH), cache_path)
+    else:
+        answer_cache = None
+    
+    # Embedding câu tính sẵn lúc ingestion (memory-mapped): chọn câu liên quan khi cắt context.
+    # Index cũ chưa có sentence_index/ → chấm câu bằng trùng từ (có cảnh báo)
+    context_packer = None
+    if context_budget:
+        sentence_index = SentenceIndex.open(FAISS_INDEX_PATH, embedding_model=EMBEDDING_MODEL)
+        if sentence_index is None:
+            print("⚠️  Context packing không có embedding câu → chấm câu bằng trùng từ")
+        context_packer = ContextPacker(context_budget, sentence_index=sentence_index)
+    
+    # 2. Init LLM (Gemini: API key đọc lại từ .env mỗi lần build)
+    llm = create_llm(llm_backend, temperature)  # Configurable: Low = more factual
     
     # 3. Build custom chain
     class CustomRAGChain:
-        def __init__(self, llm, retriever, vectorstore, template):
+        def __init__(self, llm, retriever, vectorstore, template, article_index=None, top_k=5,
+                     domain_gate=None, answer_cache=None, context_packer=None):
             self.llm = llm
             self.retriever = retriever
             self.vectorstore = vectorstore  # Store for query_rag
             self.template = template
+            self.article_index = article_index
+            self.top_k = top_k
+            self.domain_gate = domain_gate or DEFAULT_DOMAIN_GATE
+            self.answer_cache = answer_cache
+            self.context_packer = context_packer
         
-        def __call__(self, inputs):
-            query = inputs.get("query") or inputs.get("input", "")
+        def retrieve(self, query, cited=None, embedding=None):
+            """
+            Documents cho query: điều luật được trích dẫn trực tiếp (nếu có) trước,
+            không có thì vector search như bình thường
+            
+            Args:
+                cited: Kết quả _lookup_articles đã có (None = tra cứu lại)
+                embedding: Embedding của query đã có (None = encode khi cần)
+            """
+            if cited is None:
+                cited = self._lookup_articles(query)
+            if not cited:
+                return self._semantic_search(query, embedding)
+            if not DIRECT_LOOKUP_MERGE:
+                return cited
+            
+            # Bổ sung kết quả semantic, bỏ các điều đã có
+            cited_ids = {doc.metadata.get("id") for doc in cited}
+            semantic = [
+                doc for doc in self._semantic_search(query, embedding)
+                if doc.metadata.get("id") not in cited_ids
+            ]
+            return cited + semantic[:max(self.top_k - len(cited), 0)]
+        
+        def _semantic_search(self, query, embedding=None):
+            """Vector search, gắn metadata["score"] = -L2 distance"""
+            if embedding is None:
+                embedding = self.vectorstore.embeddings.embed_query(query)
+            docs = []
+            for doc, distance in self.vectorstore.similarity_search_with_score_by_vector(embedding, k=self.top_k):
+                docs.append(doc.model_copy(update={"metadata": {**doc.metadata, "score": -float(distance)}}))
+            return docs
+        
+        def _lookup_articles(self, query):
+            if self.article_index is None:
+                return []
+            rows = self.article_index.lookup(query)
+            return [
+                self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[row])
+                for row in rows
+            ]
+        
+        def _prepare(self, query):
+            """
+            Domain gate + retrieval + answer cache + prompt (mọi bước trước LLM)
+            
+            Returns:
+                (docs, full_prompt, None) hoặc (None, None, result dict) nếu đã có kết quả
+                mà không cần LLM (từ chối sớm / câu trả lời đã cache)
+            """
+            # Câu hỏi không trích dẫn điều luật: kiểm tra centroid trên embedding của query,
+            # cùng vector đó dùng cho vector search và answer cache (không encode 2 lần)
+            cited = self._lookup_articles(query)
+            embedding = None
+            if not cited or DIRECT_LOOKUP_MERGE or self.answer_cache is not None:
+                embedding = self.vectorstore.embeddings.embed_query(query)
+            if not cited and self.domain_gate.has_centroids and \
+                    self.domain_gate.centroid_margin(embedding) > self.domain_gate.margin:
+                return None, None, {
+                    "result": REFUSAL_MESSAGES["out_of_scope"],
+                    "source_documents": [],
+                    "refused": True
+                }
             
             # Retrieve documents
-            docs = self.retriever.invoke(query)
+            docs = self.retrieve(query, cited=cited, embedding=embedding)
+            
+            # Bỏ document trùng / chồng lấn, cắt theo ngân sách token
+            # (trước answer cache để 2 bên so cùng 1 tập source)
+            context = None
+            if self.context_packer is not None:
+                context, docs = self.context_packer.pack(query, docs, embedding)
             
-            # Format context
-            context = "\n\n".join([doc.page_content for doc in docs])
+            # Câu hỏi gần trùng câu đã trả lời, cùng các điều luật → dùng lại câu trả lời
+            if self.answer_cache is not None:
+                answer = self.answer_cache.get(embedding, docs)
+                if answer is not None:
+                    return None, None, {
+                        "result": answer,
+                        "source_documents": docs,
+                        "cached": True
+                    }
+            
+            # Format context (không có packer → nối toàn bộ như trước)
+            if context is None:
+                context = "\n\n".join([doc.page_content for doc in docs])
             
             # Create full prompt
             full_prompt = self.template.format(context=context, query=query)
+            return docs, full_prompt, None
+        
+        def _remember(self, query, docs, answer, llm_seconds):
+            """Lưu câu trả lời vừa sinh vào answer cache (bỏ qua câu trả lời rỗng / quá ngắn)"""
+            if self.answer_cache is None or len(answer.strip()) < 5:
+                return
+            # Embedding đã có trong LRU query embeddings từ bước _prepare
+            embedding = self.vectorstore.embeddings.embed_query(query)
+            self.answer_cache.put(query, embedding, docs, answer, llm_seconds)
+        
+        def __call__(self, inputs):
+            query = inputs.get("query") or inputs.get("input", "")
+            
+            docs, full_prompt, early = self._prepare(query)
+            if early is not None:
+                return early
             
             # Get answer from LLM
+            start = time.perf_counter()
             result = self.llm.invoke(full_prompt)
             answer = result.content if hasattr(result, 'content') else str(result)
+            self._remember(query, docs, answer, time.perf_counter() - start)
             
             return {
                 "result": answer,
@@ -108,13 +280,181 @@ def build_rag_chain(temperature=0.1, top_k=5, rebuild_llm=False):
         def invoke(self, inputs):
             """Alias for __call__"""
             return self(inputs)
+        
+        async def ainvoke(self, inputs):
+            """Async của __call__: retrieval trên thread pool, LLM qua llm.ainvoke"""
+            query = inputs.get("query") or inputs.get("input", "")
+            
+            docs, full_prompt, early = await _run_retrieval(self._prepare, query)
+            if early is not None:
+                return early
+            
+            start = time.perf_counter()
+            result = await self.llm.ainvoke(full_prompt)
+            answer = result.content if hasattr(result, 'content') else str(result)
+            await _run_retrieval(self._remember, query, docs, answer, time.perf_counter() - start)
+            
+            return {
+                "result": answer,
+                "source_documents": docs
+            }
+        
+        def stream(self, inputs):
+            """
+            Như __call__ nhưng trả kết quả dần dần, token LLM được yield ngay khi tới
+            
+            Yields (dict):
+                {"type": "sources", "source_documents": [...], "refused": bool}  # luôn đầu tiên
+                {"type": "token", "text": str}                                    # 0..n lần
+                {"type": "end", "result": str, "refused": bool}                   # câu trả lời đầy đủ
+            """
+            query = inputs.get("query") or inputs.get("input", "")
+            
+            docs, full_prompt, early = self._prepare(query)
+            if early is not None:
+                yield from _early_events(early)
+                return
+            
+            yield {"type": "sources", "source_documents": docs, "refused": False}
+            parts = []
+            start = time.perf_counter()
+            for chunk in self.llm.stream(full_prompt):
+                text = _chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield {"type": "token", "text": text}
+            answer = "".join(parts)
+            self._remember(query, docs, answer, time.perf_counter() - start)
+            yield {"type": "end", "result": answer, "refused": False}
+        
+        async def astream(self, inputs):
+            """Async của stream(): retrieval chạy trong thread, token từ llm.astream"""
+            query = inputs.get("query") or inputs.get("input", "")
+            
+            docs, full_prompt, early = await _run_retrieval(self._prepare, query)
+            if early is not None:
+                for event in _early_events(early):
+                    yield event
+                return
+            
+            yield {"type": "sources", "source_documents": docs, "refused": False}
+            parts = []
+            start = time.perf_counter()
+            async for chunk in self.llm.astream(full_prompt):
+                text = _chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield {"type": "token", "text": text}
+            answer = "".join(parts)
+            await _run_retrieval(self._remember, query, docs, answer, time.perf_counter() - start)
+            yield {"type": "end", "result": answer, "refused": False}
     
-    qa_chain = CustomRAGChain(llm, retriever, vectorstore, PROMPT_TEMPLATE)
+    qa_chain = CustomRAGChain(
+        llm, retriever, vectorstore, PROMPT_TEMPLATE, article_index, top_k, domain_gate,
+        answer_cache, context_packer
+    )
     
     print("✅ RAG chain built successfully")
     return qa_chain
 
 
+# Thread pool cho retrieval của các lời gọi async (tạo 1 lần, dùng chung)
+_RETRIEVAL_EXECUTOR = None
+
+
+def _run_retrieval(func, *args):
+    """Chạy phần retrieval (đồng bộ) trên thread pool riêng, trả về awaitable"""
+    global _RETRIEVAL_EXECUTOR
+    if _RETRIEVAL_EXECUTOR is None:
+        _RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=RETRIEVAL_THREADS, thread_name_prefix="rag-retrieval")
+    return asyncio.get_running_loop().run_in_executor(_RETRIEVAL_EXECUTOR, func, *args)
+
+
+def _chunk_text(chunk) -> str:
+    """Text của 1 chunk khi stream (content có thể là str hoặc list các phần)"""
+    content = chunk.content if hasattr(chunk, 'content') else chunk
+    if isinstance(content, list):
+        return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    return str(content)
+
+
+def _early_events(result: dict):
+    """Các event stream cho kết quả có sẵn không qua LLM (từ chối sớm / câu trả lời đã cache)"""
+    refused = result.get("refused", False)
+    yield {"type": "sources", "source_documents": result.get("source_documents", []), "refused": refused}
+    yield {"type": "token", "text": result["result"]}
+    yield {"type": "end", "result": result["result"], "refused": refused}
+
+
+def _extract_source_citations(sources) -> list:
+    """Citation (không trùng, giữ thứ tự) từ metadata của source documents"""
+    citations = []
+    for doc in sources:
+        citation = doc.metadata.get("citation", "")
+        if citation and citation not in citations:
+            citations.append(citation)
+    return citations
+
+
+def _refused(answer: str) -> dict:
+    """Kết quả từ chối (không có sources)"""
+    return {
+        "answer": answer,
+        "sources": [],
+        "source_citations": [],
+        "refused": True
+    }
+
+
+def _keyword_refusal(qa_chain, question: str):
+    """
+    STEP 0: Pre-check for obviously out-of-domain questions
+    (từ khóa nguyên từ, 1 lần quét Aho-Corasick - xem domain_gate.py)
+    
+    Returns:
+        dict từ chối, hoặc None nếu câu hỏi qua được gate
+    """
+    domain_gate = getattr(qa_chain, "domain_gate", None) or DEFAULT_DOMAIN_GATE
+    if domain_gate.keyword_match(question) is not None:
+        return _refused(REFUSAL_MESSAGES["out_of_scope"])
+    return None
+
+
+def _shape_result(result: dict, last_attempt: bool):
+    """
+    Output của chain → kết quả của query_rag
+    
+    Returns:
+        dict, hoặc None nếu câu trả lời rỗng / quá ngắn và còn lượt thử lại
+    """
+    answer = result.get("result", "").strip()
+    
+    # Chain đã từ chối trước khi gọi LLM (điểm liên quan thấp)
+    if result.get("refused"):
+        return _refused(answer)
+    
+    # Basic validation - answer should not be empty
+    if not answer or len(answer) < 5:
+        return _refused(NO_ANSWER_MESSAGE) if last_attempt else None
+    
+    sources = result.get("source_documents", [])
+    return {
+        "answer": answer,
+        "sources": sources,
+        "source_citations": _extract_source_citations(sources),
+        "refused": False
+    }
+
+
+def _backoff_seconds(attempt: int, max_retries: int, error: Exception):
+    """Thời gian chờ trước lần thử tiếp theo (2^attempt giây), None nếu hết lượt"""
+    if attempt < max_retries - 1:
+        print(f"[Attempt {attempt + 1}/{max_retries}] Error: {str(error)[:60]}...")
+        return 2 ** attempt
+    print(f"[Failed after {max_retries} attempts]")
+    return None
+
+
 def query_rag(qa_chain, question: str, max_retries=3) -> dict:
     """
     Query RAG chain with CONFIDENCE CHECKING to prevent hallucination
@@ -133,82 +473,113 @@ def query_rag(qa_chain, question: str, max_retries=3) -> dict:
         }
     
     Raises:
+        LookupError: Cassette replay không có prompt này (không retry)
         Exception: If all retries fail
     """
-    
-    # STEP 0: Pre-check for obviously out-of-domain questions
-    question_lower = question.lower()
-    
-    # Keywords that indicate question is definitely NOT about laws
-    out_of_domain_keywords = [
-        "who are you", "ai la ai", "ban la ai", "maye la ai", "mai la ai", 
-        "ban ten la gi", "ban la gì", "ai la ban", "tim ban",
-        "what is your name", "who built you", "tu tien huy",
-        "reckon", "recipe", "nau an", "nan", "anh la ai", "chi la ai",
-        "me la ai", "cha la ai", "con la gì",  
-        "love", "dating", "em la ai", "yeu", "hen ho",
-        "joke", "tro chuyen", "tao la ai", "co la ai",
-        "xau", "xin", "van phong", "cong ty", "di lam"
-    ]
-    
-    # Check if question contains any out-of-domain keywords
-    if any(keyword in question_lower for keyword in out_of_domain_keywords):
-        return {
-            "answer": REFUSAL_MESSAGES["out_of_scope"],
-            "sources": [],
-            "source_citations": [],
-            "refused": True
-        }
+    refusal = _keyword_refusal(qa_chain, question)
+    if refusal is not None:
+        return refusal
     
     last_error = None
     
     for attempt in range(max_retries):
         try:
-            # STEP 1: Query RAG chain
-            result = qa_chain({"query": question})
-            answer = result.get("result", "").strip()
-            
-            # Basic validation - answer should not be empty
-            if not answer or len(answer) < 5:
-                if attempt < max_retries - 1:
-                    time.sleep(2)
-                    continue
-                else:
-                    return {
-                        "answer": "Không có câu trả lời phù hợp được tìm thấy.",
-                        "sources": [],
-                        "source_citations": [],
-                        "refused": True
-                    }
-            
-            # Extract citations from source documents
-            citations = []
-            for doc in result.get("source_documents", []):
-                citation = doc.metadata.get("citation", "")
-                if citation and citation not in citations:
-                    citations.append(citation)
-            
-            return {
-                "answer": answer,
-                "sources": result.get("source_documents", []),
-                "source_citations": citations,
-                "refused": False
-            }
-            
+            result = _shape_result(qa_chain({"query": question}), attempt == max_retries - 1)
+        except LookupError:
+            # Cassette replay thiếu prompt: retry không bao giờ thành công
+            raise
         except Exception as e:
             last_error = e
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"[Attempt {attempt + 1}/{max_retries}] Error: {str(e)[:60]}...")
-                time.sleep(wait_time)
-            else:
-                print(f"[Failed after {max_retries} attempts]")
+            wait_time = _backoff_seconds(attempt, max_retries, e)
+            if wait_time is None:
                 break
+            time.sleep(wait_time)
+            continue
+        
+        if result is not None:
+            return result
+        time.sleep(SHORT_ANSWER_RETRY_SECONDS)
     
     # If we get here, all retries failed
     raise Exception(f"[Query failed after {max_retries} attempts]: {str(last_error)}")
 
 
+async def aquery_rag(qa_chain, question: str, max_retries=3) -> dict:
+    """
+    Async của query_rag (cùng kết quả, cùng cách retry)
+    
+    Retrieval chạy trên thread pool dùng chung (RETRIEVAL_THREADS), LLM qua ainvoke,
+    backoff bằng asyncio.sleep → trong lúc 1 câu chờ LLM, retrieval của câu khác vẫn chạy.
+    
+    Raises:
+        LookupError: Cassette replay không có prompt này (không retry)
+        Exception: If all retries fail
+    """
+    refusal = _keyword_refusal(qa_chain, question)
+    if refusal is not None:
+        return refusal
+    
+    last_error = None
+    
+    for attempt in range(max_retries):
+        try:
+            result = _shape_result(await qa_chain.ainvoke({"query": question}), attempt == max_retries - 1)
+        except LookupError:
+            raise
+        except Exception as e:
+            last_error = e
+            wait_time = _backoff_seconds(attempt, max_retries, e)
+            if wait_time is None:
+                break
+            await asyncio.sleep(wait_time)
+            continue
+        
+        if result is not None:
+            return result
+        await asyncio.sleep(SHORT_ANSWER_RETRY_SECONDS)
+    
+    raise Exception(f"[Query failed after {max_retries} attempts]: {str(last_error)}")
+
+
+async def aquery_rag_many(qa_chain, questions, max_concurrency=MAX_CONCURRENT_QUERIES, max_retries=3) -> list:
+    """
+    Trả lời nhiều câu hỏi đồng thời, tối đa max_concurrency câu đang xử lý cùng lúc
+    
+    Returns:
+        Kết quả theo thứ tự questions; câu thất bại sau max_retries lần → Exception trong list
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def run(question):
+        async with semaphore:
+            return await aquery_rag(qa_chain, question, max_retries)
+    
+    return await asyncio.gather(*(run(question) for question in questions), return_exceptions=True)
+
+
+def stream_rag(qa_chain, question: str):
+    """
+    Streaming của query_rag: sources + citations trước, sau đó từng token của câu trả lời
+    
+    Không retry như query_rag (token đã hiển thị thì không thu hồi được) - lỗi được raise
+    cho caller.
+    
+    Yields (dict): như CustomRAGChain.stream, event "sources" có thêm "source_citations"
+    """
+    # STEP 0: cùng domain gate từ khóa với query_rag
+    domain_gate = getattr(qa_chain, "domain_gate", None) or DEFAULT_DOMAIN_GATE
+    events = (
+        _early_events({"result": REFUSAL_MESSAGES["out_of_scope"], "refused": True})
+        if domain_gate.keyword_match(question) is not None
+        else qa_chain.stream({"query": question})
+    )
+    
+    for event in events:
+        if event["type"] == "sources":
+            event = {**event, "source_citations": _extract_source_citations(event["source_documents"])}
+        yield event
+
+
 def format_output(result: dict) -> str:
     """Format output cho display"""
     output = []
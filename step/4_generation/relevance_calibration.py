@@ -0,0 +1,222 @@
+"""
+Calibration điểm liên quan cho early refusal (từ chối trước khi gọi LLM) - CHƯA nối vào chain
+
+Điểm gốc của retrieval = -L2 distance tới document gần nhất (vector không chuẩn hóa,
+nên không dùng trực tiếp làm xác suất được). Calibration fit 1 logistic (Platt scaling)
+trên nửa bộ câu hỏi có nhãn trong / ngoài lĩnh vực (câu chẵn):
+
+    relevance = sigmoid(a * score + b)  ≈ P(câu hỏi thuộc phạm vi các luật trong index)
+
+Báo cáo trên nửa còn lại (câu lẻ, không dùng để fit): độ chính xác, số câu từ chối nhầm
+và số lần gọi LLM tiết kiệm được nếu từ chối khi relevance của document tốt nhất
+< RELEVANCE_THRESHOLD. Chain (rag_chain.py) chưa dùng calibration này: chỉ nối vào khi
+file JSON + số liệu trên nửa giữ riêng đã được commit.
+
+Chạy lại khi đổi embedding model:
+    python step/4_generation/relevance_calibration.py
+"""
+
+import json
+import math
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SCRIPT_DIR = Path(__file__).parent
+CALIBRATION_PATH = SCRIPT_DIR / "relevance_calibration.json"
+
+# Câu hỏi thuộc phạm vi 4 luật trong index
+IN_DOMAIN_QUERIES = [
+    "Quy định về bảo vệ đê điều như thế nào?",
+    "Trách nhiệm của UBND tỉnh trong quản lý đê điều?",
+    "Nội dung chính của Luật Thủy Lợi?",
+    "Xử phạt vi phạm Luật PCTT bị bao nhiêu?",
+    "Các hành vi bị nghiêm cấm trong phòng, chống thiên tai",
+    "Quỹ phòng, chống thiên tai được sử dụng vào việc gì?",
+    "Cấp độ rủi ro thiên tai được phân loại như thế nào?",
+    "Điều kiện để được cấp giấy phép hoạt động dự báo khí tượng thủy văn",
+    "Trạm khí tượng thủy văn chuyên dùng phải đáp ứng yêu cầu gì?",
+    "Phân loại đê và cấp đê được quy định ra sao?",
+    "Hộ đê trong mùa lũ gồm những hoạt động nào?",
+    "Phạm vi bảo vệ công trình thủy lợi",
+    "Giá sản phẩm, dịch vụ thủy lợi do ai quyết định?",
+    "Trách nhiệm của tổ chức, cá nhân khai thác công trình thủy lợi",
+    "Cảnh báo thiên tai được truyền tin như thế nào?",
+    "Quy hoạch đê điều phải bảo đảm những yêu cầu gì?",
+    "Sử dụng bãi sông để xây dựng công trình có được không?",
+    "Quyền và nghĩa vụ của lực lượng xung kích phòng chống thiên tai",
+    "Thông tin, dữ liệu khí tượng thủy văn được khai thác ra sao?",
+    "Cứu trợ khẩn cấp sau thiên tai",
+]
+
+# Câu hỏi ngoài phạm vi (index không chứa câu trả lời)
+OUT_OF_DOMAIN_QUERIES = [
+    "Luật giao thông có quy định gì về xe máy?",
+    "Thủ tục ly hôn đơn phương cần giấy tờ gì?",
+    "Mức lương tối thiểu vùng năm nay là bao nhiêu?",
+    "Cách nấu phở bò ngon",
+    "Bạn là ai?",
+    "Thuế thu nhập cá nhân tính như thế nào?",
+    "Điều kiện thành lập công ty trách nhiệm hữu hạn",
+    "Hợp đồng lao động thử việc tối đa bao lâu?",
+    "Quy định về nồng độ cồn khi lái xe ô tô",
+    "Thủ tục đăng ký kết hôn với người nước ngoài",
+    "Giá vàng hôm nay",
+    "Làm sao để học lập trình Python?",
+    "Thời hạn sử dụng đất nông nghiệp",
+    "Quyền thừa kế của con riêng",
+    "Bảo hiểm xã hội một lần được nhận bao nhiêu?",
+    "Kết quả bóng đá tối qua",
+    "Hồ sơ xin visa du lịch Nhật Bản",
+    "Tội trộm cắp tài sản bị phạt tù bao nhiêu năm?",
+    "Cách chăm sóc cây cảnh trong nhà",
+    "Thủ tục cấp lại căn cước công dân",
+]
+
+
+@dataclass
+class RelevanceCalibrator:
+    """relevance = sigmoid(a * score + b), score = -L2 distance"""
+    a: float
+    b: float
+    embedding_model: str = ""
+
+    def relevance(self, score: float) -> float:
+        z = self.a * score + self.b
+        # sigmoid ổn định số học cho z lớn / nhỏ
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        return math.exp(z) / (1.0 + math.exp(z))
+
+    def score_at(self, relevance: float) -> float:
+        """Điểm gốc tương ứng với 1 mức relevance (để in ngưỡng ra dạng distance)"""
+        return (math.log(relevance / (1.0 - relevance)) - self.b) / self.a
+
+    def save(self, path: Path = CALIBRATION_PATH):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self), f, indent=2, ensure_ascii=False)
+
+
+def load_calibrator(path: Path = CALIBRATION_PATH, embedding_model: str = "") -> Optional[RelevanceCalibrator]:
+    """
+    Load calibration đã lưu
+
+    Returns:
+        None nếu chưa calibrate hoặc calibrate cho embedding model khác
+        (khi đó chain không từ chối sớm)
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        calibrator = RelevanceCalibrator(**json.load(f))
+    if embedding_model and calibrator.embedding_model and calibrator.embedding_model != embedding_model:
+        print(f"⚠️  Calibration dành cho {calibrator.embedding_model}, không dùng cho {embedding_model}")
+        return None
+    return calibrator
+
+
+def fit_platt(scores: List[float], labels: List[int], iterations: int = 100) -> tuple:
+    """
+    Logistic regression 1 biến (Newton-Raphson), nhãn làm mượt theo Platt (1999)
+    để không bị quá tự tin khi 2 lớp tách rời hoàn toàn
+
+    Returns:
+        (a, b)
+    """
+    x = np.asarray(scores, dtype=np.float64)
+    y = np.asarray(labels, dtype=np.float64)
+    n_pos, n_neg = y.sum(), len(y) - y.sum()
+    target = np.where(y > 0, (n_pos + 1) / (n_pos + 2), 1 / (n_neg + 2))
+
+    # Chuẩn hóa x cho Newton ổn định, đổi lại hệ số ở cuối
+    mean, std = x.mean(), x.std() or 1.0
+    xs = (x - mean) / std
+    X = np.column_stack([xs, np.ones_like(xs)])
+    w = np.zeros(2)
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(X @ w)))
+        gradient = X.T @ (p - target)
+        hessian = X.T @ (X * (p * (1 - p))[:, None]) + 1e-9 * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        w -= step
+        if np.abs(step).max() < 1e-10:
+            break
+
+    a = w[0] / std
+    b = w[1] - w[0] * mean / std
+    return float(a), float(b)
+
+
+def split_holdout(queries: List[str]) -> tuple:
+    """(câu để fit, câu giữ riêng để báo cáo): xen kẽ chẵn / lẻ"""
+    return queries[0::2], queries[1::2]
+
+
+def top_scores(vectorstore, queries: List[str]) -> List[float]:
+    """Điểm gốc (-L2 distance) của document gần nhất cho từng query"""
+    scores = []
+    for query in queries:
+        results = vectorstore.similarity_search_with_score(query, k=1)
+        scores.append(-float(results[0][1]) if results else float("-inf"))
+    return scores
+
+
+# ============================================================================
+# CALIBRATE + BÁO CÁO
+# ============================================================================
+
+def main():
+    sys.path.insert(0, str(SCRIPT_DIR))
+    from rag_chain import EMBEDDING_MODEL, RELEVANCE_THRESHOLD, load_faiss_vectorstore
+
+    vectorstore = load_faiss_vectorstore()
+
+    fit_in, eval_in = split_holdout(IN_DOMAIN_QUERIES)
+    fit_out, eval_out = split_holdout(OUT_OF_DOMAIN_QUERIES)
+    print(f"\n📏 Đang tính điểm cho {len(IN_DOMAIN_QUERIES)} câu trong lĩnh vực, "
+          f"{len(OUT_OF_DOMAIN_QUERIES)} câu ngoài lĩnh vực (fit {len(fit_in)} + {len(fit_out)}, "
+          f"báo cáo trên {len(eval_in)} + {len(eval_out)} câu còn lại)...")
+    fit_in_scores = top_scores(vectorstore, fit_in)
+    fit_out_scores = top_scores(vectorstore, fit_out)
+    in_scores = top_scores(vectorstore, eval_in)
+    out_scores = top_scores(vectorstore, eval_out)
+
+    a, b = fit_platt(fit_in_scores + fit_out_scores, [1] * len(fit_in_scores) + [0] * len(fit_out_scores))
+    if a <= 0:
+        # Câu ngoài lĩnh vực lại gần index hơn → model / bộ câu hỏi không dùng để chặn được
+        print(f"⚠️  Điểm không tách được 2 nhóm (a = {a:.4f}) - không lưu calibration")
+        return
+    calibrator = RelevanceCalibrator(a=a, b=b, embedding_model=EMBEDDING_MODEL)
+    calibrator.save()
+
+    # Báo cáo tại ngưỡng đang cấu hình, chỉ trên nửa giữ riêng
+    in_refused = sum(calibrator.relevance(score) < RELEVANCE_THRESHOLD for score in in_scores)
+    out_refused = sum(calibrator.relevance(score) < RELEVANCE_THRESHOLD for score in out_scores)
+    total = len(in_scores) + len(out_scores)
+    correct = (len(in_scores) - in_refused) + out_refused
+
+    print(f"\n{'='*70}")
+    print("📊 CALIBRATION REPORT (nửa giữ riêng)")
+    print(f"{'='*70}")
+    print(f"relevance = sigmoid({a:.4f} * score + {b:.4f})")
+    print(f"Ngưỡng RELEVANCE_THRESHOLD = {RELEVANCE_THRESHOLD} "
+          f"↔ L2 distance ≤ {-calibrator.score_at(RELEVANCE_THRESHOLD):.4f}")
+    print(f"L2 distance trong lĩnh vực : {-max(in_scores):.4f} - {-min(in_scores):.4f}")
+    print(f"L2 distance ngoài lĩnh vực : {-max(out_scores):.4f} - {-min(out_scores):.4f}")
+    print(f"✅ Độ chính xác                : {correct}/{total} ({correct / total:.1%})")
+    print(f"🚫 Ngoài lĩnh vực bị chặn      : {out_refused}/{len(out_scores)} "
+          f"→ tiết kiệm {out_refused} lần gọi LLM")
+    print(f"⚠️  Trong lĩnh vực bị chặn nhầm : {in_refused}/{len(in_scores)}")
+    print(f"💾 Đã lưu: {CALIBRATION_PATH}")
+
+if __name__ == "__main__":
+    main()
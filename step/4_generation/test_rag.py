@@ -3,6 +3,10 @@ Bước 6: Testing và Validation - Test 5 câu hỏi đa dạng
 """
 
 from rag_chain import build_rag_chain, query_rag, format_output
+from answer_cache import print_answer_cache_stats
+from context_packer import print_context_packer_stats
+from embedding_cache import print_query_cache_stats
+from llm_cassette import print_cassette_stats
 from refusal_and_citations import (
     check_should_refuse, 
     extract_citations, 
@@ -111,6 +115,10 @@ def run_tests():
         print(f"⏱️  Avg response time: {avg_time:.2f}s")
         print(f"📊 Avg confidence: {avg_confidence:.1%}")
         print(f"📚 Total sources: {sum(r['source_count'] for r in results)}")
+        print_query_cache_stats(qa_chain.vectorstore.embeddings)
+        print_answer_cache_stats(qa_chain.answer_cache)
+        print_cassette_stats(qa_chain.llm)
+        print_context_packer_stats(qa_chain.context_packer)
         
         print("\nDetailed results:")
         print(f"{'No':<3} {'Category':<15} {'Valid':<7} {'Confidence':<12} {'Time':<7}")
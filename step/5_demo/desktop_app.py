@@ -7,13 +7,18 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import sys
 import os
+import queue
+import time
 from datetime import datetime
 import threading
 
 # Add path to import rag_chain
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '4_generation'))
 
-from rag_chain import build_rag_chain, query_rag
+from rag_chain import build_rag_chain, stream_rag
+
+# Chu kỳ (ms) main thread lấy token từ queue để hiển thị
+STREAM_POLL_MS = 30
 
 # ============================================================================
 # APP CLASS
@@ -28,9 +33,16 @@ class LegalAssistantApp:
         
         # State
         self.qa_chain = None
+        self.chain_settings = None  # (temperature, top_k) của qa_chain hiện tại
         self.query_history = []
         self.is_loading = False
         
+        # Worker thread chỉ put event vào queue, main thread cập nhật widget (Tkinter không thread-safe)
+        self.stream_queue = queue.Queue()
+        self.current_sources = []
+        self.search_started = 0.0
+        self.first_token_at = None
+        
         # Colors
         self.bg_color = "#1e1e1e"
         self.fg_color = "#ffffff"
@@ -276,6 +288,7 @@ class LegalAssistantApp:
                 self.root.update()
                 
                 self.qa_chain = build_rag_chain(temperature=0.1, top_k=5)
+                self.chain_settings = (0.1, 5)
                 
                 self.status_label.config(text="✅ Sẵn sàng", fg="#60d66d")
             except Exception as e:
@@ -304,58 +317,106 @@ class LegalAssistantApp:
         # Add to history
         self.query_history.insert(0, f"[{datetime.now().strftime('%H:%M:%S')}] {question[:50]}...")
         
-        # Search in background
+        temperature = self.temperature_var.get()
+        top_k = self.topk_var.get()
+        
+        self.is_loading = True
+        self.search_btn.config(state=tk.DISABLED)
+        self.status_label.config(text="⏳ Đang xử lý...", fg="#ffc107")
+        self._set_text(self.answer_output, "")
+        self._set_text(self.sources_output, "")
+        self.search_started = time.perf_counter()
+        self.first_token_at = None
+        
+        # Search in background, kết quả (sources rồi từng token) đi qua stream_queue
         def _search():
             try:
-                self.is_loading = True
-                self.search_btn.config(state=tk.DISABLED)
-                self.status_label.config(text="⏳ Đang xử lý...", fg="#ffc107")
-                self.root.update()
-                
-                temperature = self.temperature_var.get()
-                top_k = self.topk_var.get()
+                # Chỉ build lại chain khi đổi cài đặt (load lại index mỗi lần hỏi rất chậm)
+                if self.chain_settings != (temperature, top_k):
+                    self.qa_chain = build_rag_chain(temperature=temperature, top_k=top_k)
+                    self.chain_settings = (temperature, top_k)
                 
-                # Rebuild chain with new settings
-                qa_chain = build_rag_chain(temperature=temperature, top_k=top_k)
+                for event in stream_rag(self.qa_chain, question):
+                    self.stream_queue.put(event)
                 
-                # Query
-                result = query_rag(qa_chain, question)
+            except Exception as e:
+                self.stream_queue.put({"type": "error", "error": str(e)})
+            
+            finally:
+                self.stream_queue.put({"type": "done"})
+        
+        thread = threading.Thread(target=_search, daemon=True)
+        thread.start()
+        self.root.after(STREAM_POLL_MS, self._poll_stream)
+    
+    def _poll_stream(self):
+        """Main thread: hiển thị các event đã có trong queue, hẹn lần poll tiếp theo"""
+        try:
+            while True:
+                event = self.stream_queue.get_nowait()
                 
-                # Display answer
-                answer_text = result.get('answer', 'Không có câu trả lời')
-                self.answer_output.config(state=tk.NORMAL)
-                self.answer_output.delete(1.0, tk.END)
-                self.answer_output.insert(1.0, answer_text)
-                self.answer_output.config(state=tk.DISABLED)
+                if event["type"] == "sources":
+                    self._show_sources(event)
                 
-                # Display sources
-                sources_text = ""
-                for i, doc in enumerate(result.get("sources", []), 1):
-                    content = doc.page_content[:150].replace('\n', ' ')
-                    metadata_str = ""
-                    if doc.metadata:
-                        for key, value in doc.metadata.items():
-                            metadata_str += f" | {key}: {value}"
-                    
-                    sources_text += f"[{i}] {content}...\n{metadata_str}\n\n"
+                elif event["type"] == "token":
+                    if self.first_token_at is None:
+                        self.first_token_at = time.perf_counter()
+                        self.status_label.config(text="✍️ Đang trả lời...", fg="#ffc107")
+                    self._append_text(self.answer_output, event["text"])
                 
-                self.sources_output.config(state=tk.NORMAL)
-                self.sources_output.delete(1.0, tk.END)
-                self.sources_output.insert(1.0, sources_text)
-                self.sources_output.config(state=tk.DISABLED)
+                elif event["type"] == "end":
+                    n_sources = len(self.current_sources)
+                    ttfb = (self.first_token_at or time.perf_counter()) - self.search_started
+                    self.status_label.config(
+                        text=f"✅ Tìm được {n_sources} tài liệu | phản hồi sau {ttfb:.1f}s",
+                        fg="#60d66d"
+                    )
                 
-                self.status_label.config(text=f"✅ Tìm được {len(result.get('sources', []))} tài liệu", fg="#60d66d")
+                elif event["type"] == "error":
+                    messagebox.showerror("Lỗi", f"Lỗi khi tìm kiếm:\n\n{event['error']}")
+                    self.status_label.config(text="❌ Lỗi", fg="#d9534f")
                 
-            except Exception as e:
-                messagebox.showerror("Lỗi", f"Lỗi khi tìm kiếm:\n\n{str(e)}")
-                self.status_label.config(text="❌ Lỗi", fg="#d9534f")
+                elif event["type"] == "done":
+                    self.is_loading = False
+                    self.search_btn.config(state=tk.NORMAL)
+                    return
+        
+        except queue.Empty:
+            pass
+        
+        self.root.after(STREAM_POLL_MS, self._poll_stream)
+    
+    def _show_sources(self, event):
+        """Sources + citations hiển thị trước token đầu tiên của câu trả lời"""
+        self.current_sources = event.get("source_documents", [])
+        
+        citations = event.get("source_citations", [])
+        if citations:
+            self._append_text(self.answer_output, "📚 Căn cứ: " + "; ".join(citations) + "\n\n")
+        
+        sources_text = ""
+        for i, doc in enumerate(self.current_sources, 1):
+            content = doc.page_content[:150].replace('\n', ' ')
+            metadata_str = ""
+            if doc.metadata:
+                for key, value in doc.metadata.items():
+                    metadata_str += f" | {key}: {value}"
             
-            finally:
-                self.is_loading = False
-                self.search_btn.config(state=tk.NORMAL)
+            sources_text += f"[{i}] {content}...\n{metadata_str}\n\n"
         
-        thread = threading.Thread(target=_search, daemon=True)
-        thread.start()
+        self._set_text(self.sources_output, sources_text)
+    
+    def _set_text(self, widget, text):
+        widget.config(state=tk.NORMAL)
+        widget.delete(1.0, tk.END)
+        widget.insert(1.0, text)
+        widget.config(state=tk.DISABLED)
+    
+    def _append_text(self, widget, text):
+        widget.config(state=tk.NORMAL)
+        widget.insert(tk.END, text)
+        widget.see(tk.END)
+        widget.config(state=tk.DISABLED)
     
     def clear(self):
         """Clear inputs and outputs"""